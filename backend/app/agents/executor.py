@@ -0,0 +1,201 @@
+import os
+import time
+import asyncio
+import weakref
+from typing import Dict, List, Optional
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool
+
+from app.agents.state import AgentState
+from app.agents.tools import SERVER_TOOLS, CLIENT_TOOL_NAMES, TOOL_ENTITIES, get_user_id
+from utils.metrics import metrics
+
+# Replaces the prebuilt ToolNode: Kimi may emit several server calls in one turn
+# ("log water AND add expense"), which we run concurrently within a per-user cap.
+# Calls that touch the same entity keep Kimi's order; every call has its own timeout.
+
+MAX_CONCURRENCY = int(os.getenv("SERVER_TOOL_CONCURRENCY", "4"))
+DEFAULT_TIMEOUT = float(os.getenv("SERVER_TOOL_TIMEOUT", "10"))
+
+TOOL_SUMMARY_CHARS = 300
+
+# Tools that call third-party APIs get a tighter budget so they can't hold up DB writes
+TOOL_TIMEOUTS: Dict[str, float] = {
+    "get_dev_profile": float(os.getenv("DEV_PROFILE_TIMEOUT", "6")),
+}
+
+def _arg_value(tool: Optional[BaseTool], args: dict, arg: str):
+    if arg in args:
+        return args[arg]
+    # Fall back to the schema default (create_task's section_name defaults to "General")
+    schema = getattr(tool, "args_schema", None)
+    field = getattr(schema, "__fields__", {}).get(arg)
+    return getattr(field, "default", None)
+
+def entity_keys(tool_call: dict, tool: Optional[BaseTool] = None) -> List[str]:
+    keys = []
+    for entity, arg in TOOL_ENTITIES.get(tool_call["name"], []):
+        if arg is None:
+            keys.append(entity)
+            continue
+        value = _arg_value(tool, tool_call.get("args") or {}, arg)
+        if value is not None:
+            keys.append(f"{entity}:{str(value).strip().lower()}")
+    return keys
+
+def plan_chains(tool_calls: List[dict], tools_by_name: Dict[str, BaseTool]) -> List[List[int]]:
+    """
+    Groups call indices into chains: calls sharing an entity key (transitively) end up
+    in the same chain, in their original order. Chains are independent of each other.
+    """
+    parent = list(range(len(tool_calls)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    owner: Dict[str, int] = {}
+    for i, call in enumerate(tool_calls):
+        for key in entity_keys(call, tools_by_name.get(call["name"])):
+            if key in owner:
+                parent[find(i)] = find(owner[key])
+            else:
+                owner[key] = i
+
+    chains: Dict[int, List[int]] = {}
+    for i in range(len(tool_calls)):
+        chains.setdefault(find(i), []).append(i)
+    return list(chains.values())
+
+class ServerToolExecutor:
+    def __init__(self, tools: List[BaseTool], max_concurrency: int = MAX_CONCURRENCY):
+        self.tools_by_name = {t.name: t for t in tools}
+        self.max_concurrency = max_concurrency
+        # Shared across concurrent requests of the same user; dropped once no turn holds them
+        self._user_slots: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = weakref.WeakValueDictionary()
+        self._entity_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _slots(self, user_id: str) -> asyncio.Semaphore:
+        slots = self._user_slots.get(user_id)
+        if slots is None:
+            slots = asyncio.Semaphore(self.max_concurrency)
+            self._user_slots[user_id] = slots
+        return slots
+
+    def _lock(self, user_id: str, key: str) -> asyncio.Lock:
+        name = f"{user_id}:{key}"
+        lock = self._entity_locks.get(name)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._entity_locks[name] = lock
+        return lock
+
+    async def _invoke(self, call: dict, config: RunnableConfig, slots: asyncio.Semaphore) -> ToolMessage:
+        name = call["name"]
+        tool = self.tools_by_name.get(name)
+        if tool is None:
+            return ToolMessage(
+                content=f"Error: {name} is not a valid tool, try one of [{', '.join(self.tools_by_name)}].",
+                name=name, tool_call_id=call["id"], status="error"
+            )
+
+        timeout = TOOL_TIMEOUTS.get(name, DEFAULT_TIMEOUT)
+        async with slots:
+            started_at = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(tool.ainvoke({**call, "type": "tool_call"}, config), timeout)
+                metrics.incr("execute_server.ok")
+                return result
+            except asyncio.TimeoutError:
+                print(f"⏱️ Tool {name} timed out after {timeout}s")
+                metrics.incr("execute_server.timeout")
+                return ToolMessage(
+                    content=f"⚠️ {name} timed out after {timeout:g}s. Tell the user it didn't go through.",
+                    name=name, tool_call_id=call["id"], status="error"
+                )
+            except Exception as e:
+                print(f"❌ Tool {name} failed: {e}")
+                metrics.incr("execute_server.error")
+                return ToolMessage(
+                    content=f"Error: {repr(e)}\n Please fix your mistakes.",
+                    name=name, tool_call_id=call["id"], status="error"
+                )
+            finally:
+                metrics.observe(f"execute_server.{name}_ms", (time.perf_counter() - started_at) * 1000)
+
+    async def _run_chain(self, indices: List[int], tool_calls: List[dict], config: RunnableConfig,
+                         user_id: str, slots: asyncio.Semaphore, results: List[Optional[ToolMessage]]):
+        # Hold entity locks in a stable order so overlapping turns of the same user can't deadlock
+        keys = sorted({
+            key for i in indices
+            for key in entity_keys(tool_calls[i], self.tools_by_name.get(tool_calls[i]["name"]))
+        })
+        locks = [self._lock(user_id, key) for key in keys]
+        for lock in locks:
+            await lock.acquire()
+        try:
+            for i in indices:
+                results[i] = await self._invoke(tool_calls[i], config, slots)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    async def __call__(self, state: AgentState, config: RunnableConfig):
+        # Client calls in the same turn run on the phone afterwards (see await_client)
+        tool_calls = [tc for tc in state["messages"][-1].tool_calls if tc["name"] not in CLIENT_TOOL_NAMES]
+        user_id = get_user_id(config)
+        slots = self._slots(user_id)
+
+        chains = plan_chains(tool_calls, self.tools_by_name)
+        if len(tool_calls) > 1:
+            print(f"⚡ Executing {len(tool_calls)} tool calls in {len(chains)} parallel chain(s)")
+        metrics.incr("execute_server.calls", len(tool_calls))
+
+        results: List[Optional[ToolMessage]] = [None] * len(tool_calls)
+        await asyncio.gather(*(
+            self._run_chain(indices, tool_calls, config, user_id, slots, results)
+            for indices in chains
+        ))
+        # Compact record of what ran, so the next turn can refer back to it
+        summary = "\n".join(f"- {m.name}: {str(m.content)[:TOOL_SUMMARY_CHARS]}" for m in results)
+        return {"messages": results, "history": [AIMessage(content=f"(tool results)\n{summary}")]}
+
+server_executor = ServerToolExecutor(SERVER_TOOLS)
+
+async def execute_server_node(state: AgentState, config: RunnableConfig):
+    """Runs Kimi's server-side tool calls and returns one ToolMessage per call, in call order."""
+    return await server_executor(state, config)
+
+# --- Direct responses (skip the second Brain pass) ---
+
+DIRECT_RESPONSE_ENABLED = os.getenv("DIRECT_RESPONSE_ENABLED", "true").lower() == "true"
+
+# Cheap local templates for outputs that need a lead-in; everything else is shown verbatim
+DIRECT_TEMPLATES: Dict[str, str] = {}
+
+def is_user_ready(messages: List[ToolMessage]) -> bool:
+    """True when every call succeeded and every tool declared its output user-ready."""
+    if not DIRECT_RESPONSE_ENABLED or not messages:
+        return False
+    for msg in messages:
+        if getattr(msg, "status", "success") != "success":
+            return False
+        # The phone reports client actions in its own words ("Alarm set for 7:00 AM")
+        if msg.name in CLIENT_TOOL_NAMES:
+            continue
+        tool = server_executor.tools_by_name.get(msg.name)
+        if not (tool and tool.return_direct):
+            return False
+    return True
+
+def render_direct(messages: List[ToolMessage]) -> str:
+    parts = []
+    for msg in messages:
+        output = str(msg.content).strip()
+        template = DIRECT_TEMPLATES.get(msg.name)
+        parts.append(template.format(output=output) if template else output)
+    return "\n\n".join(parts)
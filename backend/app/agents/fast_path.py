@@ -0,0 +1,402 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Dict, Any, List
+
+from datetime import datetime
+from langchain_core.runnables import RunnableConfig
+from app.agents.tools import SERVER_TOOLS, CLIENT_TOOL_NAMES
+from utils.date_parser import find_dates, DEFAULT_TZ
+from utils.metrics import metrics
+
+# Deterministic intent matcher that runs BEFORE enrich -> brain -> map_action.
+# A hit skips 2-3 LLM round trips; anything ambiguous falls through to the graph.
+
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+MIN_CONFIDENCE = float(os.getenv("FAST_PATH_MIN_CONFIDENCE", "0.9"))
+
+SERVER_TOOL_MAP = {t.name: t for t in SERVER_TOOLS}
+
+AMOUNT = r"(?:rs\.?\s*|₹\s*|inr\s*)?(?P<amount>\d+(?:\.\d+)?)\s*(?:k\b)?\s*(?:rs\.?|rupees|inr|bucks)?"
+
+EXPENSE_CATEGORIES = {
+    "Food": ["food", "lunch", "dinner", "breakfast", "snack", "snacks", "coffee", "tea", "groceries", "grocery", "pizza", "burger", "swiggy", "zomato", "restaurant"],
+    "Transport": ["uber", "ola", "cab", "taxi", "auto", "bus", "metro", "train", "fuel", "petrol", "diesel", "rapido", "parking"],
+    "Shopping": ["shopping", "clothes", "shoes", "amazon", "flipkart", "myntra"],
+    "Bills": ["rent", "electricity", "bill", "bills", "internet", "wifi", "recharge", "gas"],
+    "Entertainment": ["movie", "movies", "netflix", "spotify", "concert", "game", "games"],
+    "Health": ["medicine", "medicines", "doctor", "pharmacy", "gym", "hospital"],
+}
+
+# Free-text slots (contact, app, song, payee) are where ordinary speech slips through:
+# "call it a day", "call mom tomorrow about the rent", "open a new task for groceries".
+# A slot with a temporal or function word is rejected; a long one drops below MIN_CONFIDENCE.
+MAX_SLOT_TOKENS = 3
+LONG_SLOT_CONFIDENCE = 0.6
+TEMPORAL_WORDS = frozenset({
+    "today", "tonight", "tomorrow", "tmrw", "tmr", "yesterday", "now", "later", "soon", "ago",
+    "morning", "afternoon", "evening", "night", "day", "days", "week", "weeks", "month", "months",
+    "year", "years", "last", "next",
+})
+NAME_STOP_WORDS = frozenset({
+    "it", "me", "that", "this", "him", "her", "them", "us", "you", "back", "about", "the", "a", "an",
+    "for", "with", "to", "and", "of", "up", "out", "off", "my", "some", "new", "in", "on", "at",
+})
+# Song titles are full of pronouns ("let it be"), so only words that make it an activity
+PLAY_STOP_WORDS = frozenset({"with", "against", "me", "us"})
+# "play it again", "play some music": no title at all, the LLM has to pick what to play
+PLAY_GENERIC_WORDS = frozenset({
+    "it", "again", "music", "song", "songs", "track", "tracks", "something", "anything", "some", "any",
+    "a", "the", "that", "this", "one", "more", "playlist", "please",
+})
+PLAY_VAGUE_START = frozenset({"some", "something", "anything", "any", "it", "music"})
+# A payee is a name ("Swiggy", "lunch"); "food for mom" is a sentence the LLM should read
+PAYEE_STOP_WORDS = frozenset({
+    "for", "with", "to", "at", "from", "and", "on", "in", "of", "by", "my", "me", "him", "her", "them", "us",
+})
+
+@dataclass
+class FastPathMatch:
+    pattern: str
+    tool_name: str
+    args: Dict[str, Any]
+    confidence: float
+
+    @property
+    def is_client(self) -> bool:
+        return self.tool_name in CLIENT_TOOL_NAMES
+
+@dataclass
+class Rule:
+    """
+    trigger: cheap keyword check. If it fires but the grammar doesn't, we count a miss
+             for this pattern (traffic we *could* absorb with a better grammar).
+    grammar: full-match regex over the normalized query.
+    build:   turns the regex match into (args, confidence). Return None to reject.
+    temporal: build also receives the user's local `now` to resolve dates.
+    """
+    name: str
+    tool_name: str
+    trigger: re.Pattern
+    grammar: List[re.Pattern]
+    build: Callable[..., Optional[tuple]] = field(default=lambda m: ({}, 1.0))
+    temporal: bool = False
+
+
+def _rx(pattern: str) -> re.Pattern:
+    return re.compile(pattern, re.IGNORECASE)
+
+def normalize(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    text = re.sub(r"^(?:hey |hi |ok |okay )?(?:dex[, ]+)?(?:please |can you |could you |pls )?", "", text, flags=re.IGNORECASE)
+    return text.rstrip(" .!?")
+
+def _amount(m: re.Match) -> float:
+    value = float(m.group("amount"))
+    if re.search(r"\d\s*k\b", m.group(0), re.IGNORECASE):
+        value *= 1000
+    return int(value) if value.is_integer() else value
+
+def _category(what: str) -> Optional[str]:
+    words = set(re.findall(r"[a-z]+", what.lower()))
+    for category, keywords in EXPENSE_CATEGORIES.items():
+        if words & set(keywords):
+            return category
+    return None
+
+def _slot_confidence(value: str, confidence: float, now: datetime, stop_words: frozenset = NAME_STOP_WORDS) -> Optional[float]:
+    """confidence for a captured slot, lowered when it runs long. None when it reads like part of a sentence."""
+    tokens = re.findall(r"[a-z0-9']+", value.lower())
+    if not tokens or set(tokens) & (stop_words | TEMPORAL_WORDS) or find_dates(value, now):
+        return None
+    return confidence if len(tokens) <= MAX_SLOT_TOKENS else min(confidence, LONG_SLOT_CONFIDENCE)
+
+# --- Builders ---
+
+def _build_water(m: re.Match):
+    amount = float(m.group("amount"))
+    unit = (m.group("unit") or "").lower()
+    if unit.startswith("l"):
+        amount *= 1000
+    elif unit.startswith("glass"):
+        amount *= 250
+    elif not unit and amount < 50:
+        # "log 2 water" - too vague to guess a unit
+        return None
+    return {"amount": int(amount)}, 1.0
+
+def _build_expense(m: re.Match, now: datetime):
+    what = m.group("what").strip()
+    amount = _amount(m)
+    category = _category(what)
+    # Unknown category -> let the LLM decide rather than guess.
+    # add_transaction has no date, so "lunch yesterday" goes to the LLM instead of becoming the payee
+    confidence = _slot_confidence(what, 1.0 if category else 0.7, now, PAYEE_STOP_WORDS)
+    if confidence is None or not amount:
+        return None
+    return {"amount": amount, "payee": what.title(), "category": category or "Other", "type": "expense"}, confidence
+
+def _build_income(m: re.Match, now: datetime):
+    what = m.group("what").strip()
+    amount = _amount(m)
+    confidence = _slot_confidence(what, 0.9, now, PAYEE_STOP_WORDS)
+    if confidence is None or not amount:
+        return None
+    category = "Salary" if "salary" in what.lower() else "Transfer"
+    return {"amount": amount, "payee": what.title(), "category": category, "type": "income"}, confidence
+
+def _build_play(m: re.Match, now: datetime):
+    song = re.sub(r"\s+on spotify$", "", m.group("song"), flags=re.IGNORECASE).strip()
+    tokens = re.findall(r"[a-z0-9']+", song.lower())
+    if not tokens or tokens[0] in PLAY_VAGUE_START or set(tokens) <= PLAY_GENERIC_WORDS:
+        return None
+    confidence = _slot_confidence(song, 0.9, now, PLAY_STOP_WORDS)
+    return ({"action": "play", "song_name": song}, confidence) if confidence else None
+
+def _build_app(m: re.Match, now: datetime):
+    app = m.group("app").strip()
+    # "open the door": apps are named bare ("open spotify") unless the user says "app"
+    if m.group("article") and not m.group("suffix"):
+        return None
+    confidence = _slot_confidence(app, 1.0, now)
+    return ({"app_name": app}, confidence) if confidence else None
+
+def _build_call(m: re.Match, now: datetime):
+    name = m.group("name").strip()
+    confidence = _slot_confidence(name, 1.0, now)
+    return ({"name": name}, confidence) if confidence else None
+
+def _build_alarm(m: re.Match):
+    hour = int(m.group("hour"))
+    minute = m.group("minute") or "00"
+    meridiem = (m.group("meridiem") or "").replace(".", "").upper()
+    if hour > 23 or int(minute) > 59 or (meridiem and hour > 12):
+        return None
+    time_str = f"{hour}:{minute}" + (f" {meridiem}" if meridiem else "")
+    return {"time": time_str}, 1.0 if meridiem or hour > 12 else 0.9
+
+def _build_timer(m: re.Match):
+    unit = m.group("unit").lower()
+    if unit.startswith(("s", "sec")):
+        unit = "seconds"
+    elif unit.startswith("h"):
+        unit = "hours"
+    else:
+        unit = "minutes"
+    value = m.group("value")
+    if value == "1":
+        unit = unit[:-1]
+    return {"duration": f"{value} {unit}"}, 1.0
+
+def _build_task(m: re.Match, now: datetime):
+    rest = m.group("rest")
+    dates = find_dates(rest, now)
+    # The due date must close the sentence: "add task submit report by friday 5pm"
+    if not dates or rest[dates[-1].end:].strip():
+        return None
+    due = dates[-1]
+    title = re.sub(r"\s+(?:on|by|at|due|for|before)$", "", rest[:due.start].strip(), flags=re.IGNORECASE)
+    if not title:
+        return None
+    return {"title": title[0].upper() + title[1:], "due_date": due.date_str, "due_time": due.time_str}, 1.0
+
+
+RULES: List[Rule] = [
+    # --- HEALTH ---
+    Rule(
+        name="log_water",
+        tool_name="log_water",
+        trigger=_rx(r"\bwater\b"),
+        grammar=[
+            _rx(r"(?:log|add|drank|i drank|i had|had|i just drank)\s+(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>ml|l|litres?|liters?|glass(?:es)?)?\s+(?:of\s+)?water"),
+            _rx(r"log\s+water\s+(?P<amount>\d+(?:\.\d+)?)\s*(?P<unit>ml|l|litres?|liters?|glass(?:es)?)?"),
+        ],
+        build=_build_water,
+    ),
+    Rule(
+        name="health_dashboard",
+        tool_name="get_health_dashboard",
+        trigger=_rx(r"\b(?:water|steps|health)\b"),
+        grammar=[
+            _rx(r"how much water(?: have i (?:had|drunk|drank)| did i drink)?(?: today)?"),
+            _rx(r"how many steps(?: have i (?:walked|done)| did i walk)?(?: today)?"),
+            _rx(r"(?:show |what(?:'s| is|'re| are) )?(?:me )?my (?:health|steps|water intake)(?: dashboard| stats| today)?"),
+        ],
+    ),
+    Rule(
+        name="nutrition_today",
+        tool_name="get_nutrition_today",
+        trigger=_rx(r"\b(?:eat|ate|calories|kcal|meals?|nutrition)\b"),
+        grammar=[
+            _rx(r"what did i eat today"),
+            _rx(r"how many (?:calories|kcal)(?: have i (?:had|eaten)| did i eat)?(?: today)?"),
+            _rx(r"(?:show )?(?:me )?my (?:meals|nutrition|calories)(?: today)?"),
+        ],
+    ),
+    # --- PRODUCTIVITY ---
+    Rule(
+        name="get_tasks",
+        tool_name="get_tasks",
+        trigger=_rx(r"\b(?:tasks?|to-?dos?)\b"),
+        grammar=[
+            _rx(r"(?:what are|show|list|show me|get|what's on|whats on)?\s*(?:all )?my (?:tasks|to-?dos?|to-?do list)(?: today| for today)?"),
+            _rx(r"(?:do i have|what) (?:any )?tasks(?: do i have)?(?: today| for today)?"),
+        ],
+    ),
+    Rule(
+        name="create_task",
+        tool_name="create_task",
+        trigger=_rx(r"\btask\b"),
+        grammar=[_rx(r"(?:add|create|new)(?: a)? task(?: to)?:?\s+(?P<rest>.{3,120})")],
+        build=_build_task,
+        temporal=True,
+    ),
+    # --- FINANCE ---
+    Rule(
+        name="add_expense",
+        tool_name="add_transaction",
+        trigger=_rx(r"\b(?:spent|paid)\b"),
+        grammar=[
+            _rx(rf"(?:i )?(?:spent|paid)\s+{AMOUNT}\s+(?:on|for)\s+(?P<what>[a-z][a-z '&-]{{0,40}})"),
+        ],
+        build=_build_expense,
+        temporal=True,
+    ),
+    Rule(
+        name="add_income",
+        tool_name="add_transaction",
+        trigger=_rx(r"\b(?:received|got|earned)\b"),
+        grammar=[
+            _rx(rf"(?:i )?(?:received|got|earned)\s+{AMOUNT}\s+(?:from|as)\s+(?P<what>[a-z][a-z '&-]{{0,40}})"),
+        ],
+        build=_build_income,
+        temporal=True,
+    ),
+    Rule(
+        name="get_accounts",
+        tool_name="get_accounts",
+        trigger=_rx(r"\b(?:balance|accounts?)\b"),
+        grammar=[
+            _rx(r"what(?:'s| is) my (?:bank |account )?balance"),
+            _rx(r"(?:show |list |show me )?(?:all )?my (?:bank )?(?:accounts|balance)"),
+        ],
+    ),
+    Rule(
+        name="get_transactions",
+        tool_name="get_transactions",
+        trigger=_rx(r"\b(?:transactions?|expenses?|spending)\b"),
+        grammar=[
+            _rx(r"(?:show |list |show me )?(?:all )?my (?:recent |latest )?(?:transactions|expenses|spending)"),
+        ],
+    ),
+    # --- DEVICE ---
+    Rule(
+        name="media_control",
+        tool_name="client_play_media",
+        trigger=_rx(r"\b(?:pause|resume|next|skip|previous)\b"),
+        grammar=[
+            _rx(r"(?P<action>pause)(?: the)?(?: music| song| playback| media)?"),
+            _rx(r"(?P<action>next|skip)(?: the)?(?: song| track)?"),
+            _rx(r"(?P<action>previous)(?: song| track)?"),
+        ],
+        build=lambda m: ({"action": "next" if m.group("action").lower() == "skip" else m.group("action").lower()}, 1.0),
+    ),
+    Rule(
+        name="play_media",
+        tool_name="client_play_media",
+        trigger=_rx(r"\bplay\b"),
+        grammar=[_rx(r"play\s+(?P<song>.{2,60})")],
+        build=_build_play,
+        temporal=True,
+    ),
+    Rule(
+        name="open_app",
+        tool_name="client_open_app",
+        trigger=_rx(r"\b(?:open|launch)\b"),
+        grammar=[_rx(r"(?:open|launch)\s+(?P<article>the\s+)?(?P<app>[a-z0-9][a-z0-9 .+-]{0,30}?)(?P<suffix>\s+app)?")],
+        build=_build_app,
+        temporal=True,
+    ),
+    Rule(
+        name="call_contact",
+        tool_name="client_call_contact",
+        trigger=_rx(r"\bcall\b"),
+        grammar=[_rx(r"call\s+(?P<name>[a-z][a-z .']{0,30})")],
+        build=_build_call,
+        temporal=True,
+    ),
+    Rule(
+        name="set_timer",
+        tool_name="client_set_timer",
+        trigger=_rx(r"\btimer\b"),
+        grammar=[_rx(r"(?:set |start )?(?:a |the )?timer (?:for )?(?P<value>\d+)\s*(?P<unit>seconds?|secs?|minutes?|mins?|hours?|hrs?)")],
+        build=_build_timer,
+    ),
+    Rule(
+        name="set_alarm",
+        tool_name="client_set_alarm",
+        trigger=_rx(r"\b(?:alarm|wake me)\b"),
+        grammar=[_rx(r"(?:set (?:an |the |my )?alarm|wake me up) (?:for |at )?(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>a\.?m\.?|p\.?m\.?)?")],
+        build=_build_alarm,
+    ),
+    Rule(
+        name="sleep_tracking",
+        tool_name="client_sleep_tracking",
+        trigger=_rx(r"\b(?:sleep|bed|woke|awake|night)\b"),
+        grammar=[
+            _rx(r"(?:i'?m |i am )?(?P<start>going to (?:sleep|bed))(?: now)?|(?P<start2>good ?night)"),
+            _rx(r"(?P<stop>i (?:just )?woke up|i'?m awake|i am awake)"),
+        ],
+        build=lambda m: ({"action": "stop" if m.groupdict().get("stop") else "start"}, 1.0),
+    ),
+]
+
+
+def match(query: str, now: Optional[datetime] = None) -> Optional[FastPathMatch]:
+    """
+    Returns the first confident match, or None if the query should go through the graph.
+    Records a per-pattern hit/miss for every rule whose trigger fired.
+    `now` is the user's local time (see utils.date_parser.parse_client_timestamp).
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+    return _match(query, now or datetime.now(DEFAULT_TZ), record=True)
+
+def is_command(query: str) -> bool:
+    """True when the whole utterance is one confident command, nothing else (no metrics recorded)."""
+    return _match(query, datetime.now(DEFAULT_TZ), record=False) is not None
+
+def _match(query: str, now: datetime, record: bool) -> Optional[FastPathMatch]:
+    text = normalize(query)
+    for rule in RULES:
+        if not rule.trigger.search(text):
+            continue
+
+        result = None
+        for grammar in rule.grammar:
+            m = grammar.fullmatch(text)
+            if m:
+                result = rule.build(m, now) if rule.temporal else rule.build(m)
+                if result:
+                    break
+
+        if result and result[1] >= MIN_CONFIDENCE:
+            if record:
+                metrics.incr(f"fast_path.hit.{rule.name}")
+                metrics.incr("fast_path.hit")
+            args, confidence = result
+            return FastPathMatch(pattern=rule.name, tool_name=rule.tool_name, args=args, confidence=confidence)
+
+        if record:
+            metrics.incr(f"fast_path.miss.{rule.name}")
+
+    if record:
+        metrics.incr("fast_path.fallthrough")
+    return None
+
+
+async def execute(hit: FastPathMatch, user_id: str) -> str:
+    """Runs a matched server tool directly with the same config the graph would inject."""
+    tool = SERVER_TOOL_MAP[hit.tool_name]
+    config: RunnableConfig = {"configurable": {"user_id": user_id}}
+    return await tool.ainvoke(hit.args, config=config)
@@ -1,12 +1,25 @@
 from app.agents.state import AgentState
-from app.agents.tools import CLIENT_TOOLS, CLIENT_TOOL_NAMES, SERVER_TOOLS, SERVER_TOOL_NAMES, ALL_TOOLS
+from app.agents.tools import CLIENT_TOOLS, CLIENT_TOOL_NAMES, SERVER_TOOL_NAMES, ALL_TOOLS, DOMAIN_TOOL_NAMES, get_user_id
+from app.agents.response_cache import brain_cache
+from app.prompts import BRAIN, ACTION_ENGINE, SEARCH
+from app.agents.executor import execute_server_node, is_user_ready, render_direct
 from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
+from langgraph.types import interrupt
 from langchain_groq import ChatGroq
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
 from services.tool_registry import tool_retriever
+from services.checkpointer import checkpointer
+from services.llm_scheduler import llm_scheduler
+from services.hedging import hedged_invoke, hedging_enabled, Contender
+from utils.metrics import metrics
+from utils.lru import LRUCache
+from utils.llm_usage import record_usage
+from utils.token_budget import count_tokens, truncate_to_tokens, fit_messages, message_text
 import os
+import re
+import time
 
 # 1. THE BRAIN (Reasoning & Conversation) - Gemini 2.5 Flash
 # Note: We do NOT bind tools to this model.
@@ -14,6 +27,7 @@ brain_llm = ChatGoogleGenerativeAI(
     model="gemini-2.5-flash",
     google_api_key=os.getenv("GOOGLE_API_KEY"),
     temperature=0.3, # Slightly higher for natural conversation
+    max_retries=0, # Retries and 429 backoff happen in services.llm_scheduler
     convert_system_message_to_human=True 
 )
 
@@ -22,78 +36,153 @@ tool_llm = ChatGroq(
     model="moonshotai/kimi-k2-instruct-0905",
     api_key=os.getenv("GROQ_API_KEY"),
     temperature=0.0, # Zero temp for precise JSON generation
-    max_retries=2,
+    max_retries=0,
 )
 
 # 3. THE RESEARCHER - Compound
 search_llm = ChatGroq(
     model="groq/compound",
     api_key=os.getenv("GROQ_API_KEY"),
-    temperature=0.0
+    temperature=0.0,
+    max_retries=0,
 )
 
-# LangGraph Node for Server-Side Execution
-tool_execution_node = ToolNode(SERVER_TOOLS)
+# 4. HEDGE FALLBACKS - only called for nodes listed in HEDGE_NODES (services/hedging.py)
+brain_fallback_llm = ChatGroq(
+    model=os.getenv("BRAIN_FALLBACK_MODEL", "llama-3.3-70b-versatile"),
+    api_key=os.getenv("GROQ_API_KEY"),
+    temperature=0.3,
+    max_retries=0,
+)
+
+tool_fallback_llm = ChatGroq(
+    model=os.getenv("TOOL_FALLBACK_MODEL", "openai/gpt-oss-120b"),
+    api_key=os.getenv("GROQ_API_KEY"),
+    temperature=0.0,
+    max_retries=0,
+)
+
+# bind_tools() converts every args_schema to JSON schema; do it once per tool set
+bound_tool_llms = LRUCache(max_size=int(os.getenv("BOUND_TOOL_CACHE_SIZE", "256")))
 
-async def brain_node(state: AgentState):
+def get_tool_llm(tools, llm=tool_llm):
+    key = (llm.model_name, frozenset(t.name for t in tools))
+    llm_with_tools = bound_tool_llms.get(key)
+    if llm_with_tools is None:
+        metrics.incr("tool_llm.bind_miss")
+        llm_with_tools = llm.bind_tools(tools, tool_choice="auto")
+        bound_tool_llms.put(key, llm_with_tools)
+    else:
+        metrics.incr("tool_llm.bind_hit")
+    return llm_with_tools
+
+# Brain prompt size stays bounded however long earlier answers or tool outputs were
+BRAIN_PROMPT_BUDGET = int(os.getenv("BRAIN_PROMPT_BUDGET", "4000"))
+BRAIN_MESSAGE_MAX_TOKENS = int(os.getenv("BRAIN_MESSAGE_MAX_TOKENS", "1000"))
+BRAIN_SUMMARY_MAX_TOKENS = 250
+BRAIN_MEMORY_MAX_TOKENS = 300
+
+def fit_memories(memories: list, budget: int) -> list:
+    """Keeps memories in relevance order until the budget runs out."""
+    kept, used = [], 0
+    for memory in memories:
+        size = count_tokens(memory)
+        if used + size > budget:
+            break
+        kept.append(memory)
+        used += size
+    return kept
+
+def history_entry(content) -> list:
+    """Final answers go into the thread history; routing markers don't."""
+    if not isinstance(content, str):
+        content = "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    if not content.strip() or "||DELEGATE||" in content or "||SEARCH||" in content:
+        return []
+    return [AIMessage(content=content)]
+
+async def brain_node(state: AgentState, config: RunnableConfig):
     profile = state.get("user_profile", "Unknown User")
     memories = state.get("vector_context", [])
-    memory_str = "\n".join([f"- {m}" for m in memories]) if memories else "No relevant memories."
+    prompt_memories = fit_memories(memories, BRAIN_MEMORY_MAX_TOKENS)
+    memory_str = "\n".join([f"- {m}" for m in prompt_memories]) if prompt_memories else "No relevant memories."
+    summary = truncate_to_tokens(state.get("conversation_summary") or "", BRAIN_SUMMARY_MAX_TOKENS)
     
     is_tool_result = len(state["messages"]) > 0 and state["messages"][-1].type == "tool"
 
-    system_prompt = f"""
-    You are DeX, the "Brain" of a Personal Operating System.
-    
+    # Constant prefix first (provider prompt caching), per-user context after it
+    system_prompt = BRAIN.render(f"""
     === USER CONTEXT ===
     • User: {profile}
     • Loaded Memories:
     {memory_str}
-
-    === YOUR SUBSYSTEMS (CAPABILITIES) ===
-    You do not execute actions yourself. Identify the user's intent and delegate to the correct specialist:
-    
-    1. **MEMORY & SEARCH SYS:** - Internal facts, user preferences, past conversations, and Web Search.
-       - *Tools:* search_memory, save_memory, transfer_to_search.
-       
-    2. **PRODUCTIVITY SYS:** - Tasks, To-Do lists, Alarms, Timers, Calendar, and Deadlines.
-       - *Tools:* create_task, get_tasks, set_alarm, set_timer.
-       
-    3. **HEALTH & BIOLOGY SYS:** - Water, Nutrition (Food/Calories), Sleep, Period Tracking, and Health Stats.
-       - *Tools:* log_water, log_meal, log_period, get_health_dashboard, sleep_tracking.
-       
-    4. **FINANCE & ASSETS SYS:** - Expenses, Income, Bank Accounts, and Transactions.
-       - *Tools:* add_transaction, get_accounts, create_account.
-       
-    5. **DEVICE & COMMS SYS:** - Phone Hardware (Apps, Volume), Calls, SMS, WhatsApp, and Music/Media.
-       - *Tools:* open_app, play_media, call_contact, send_whatsapp.
-       
-    6. **LIFESTYLE & GROWTH SYS:** - Journaling, Content Watchlist (Movies/Books), and Developer Stats (GitHub).
-       - *Tools:* save_journal, add_content, get_dev_profile.
-
-    === DELEGATION PROTOCOL ===
-    1. **IF ACTION REQUIRED:** Output `||DELEGATE||: <System Name> - <Instruction>`
-       - *User:* "I spent 500 on food." 
-         *Output:* `||DELEGATE||: FINANCE SYS - Log an expense of 500 for food.`
-       - *User:* "I'm on my period." 
-         *Output:* `||DELEGATE||: HEALTH SYS - Log period start today.`
-       - *User:* "Play Taylor Swift."
-         *Output:* `||DELEGATE||: DEVICE SYS - Play media song Taylor Swift.`
-
-    2. **IF INFORMATION GAP:** Output `||DELEGATE||: MEMORY SYS - Search memory for <topic>.` OR `||SEARCH||: <query>` if it requires the web.
-
-    3. **IF CONVERSATION:** Just reply naturally.
+    • Conversation So Far:
+    {summary or "New conversation."}
     
     { "✅ SYSTEM UPDATE: Tool execution finished. Use the results above to answer." if is_tool_result else "" }
-    """
+    """)
     
-    messages = [SystemMessage(content=system_prompt)] + state["messages"]
-    response = await brain_llm.ainvoke(messages)
-    return {"messages": [response]}
+    # Repeated turns ("what are my tasks") are answered from the per-user cache
+    user_id = get_user_id(config)
+    cached, cache_key = await brain_cache.get(user_id, state["messages"], memories, profile, summary)
+    if cached:
+        print("♻️ [Brain] Cache hit")
+        return {
+            "messages": [AIMessage(content=cached, response_metadata={"cache_hit": True})],
+            "history": history_entry(cached),
+        }
+
+    # Whatever the system prompt leaves goes to the latest turn, newest messages first
+    remaining = BRAIN_PROMPT_BUDGET - count_tokens(system_prompt)
+    turn_messages = fit_messages(state["messages"], remaining, BRAIN_MESSAGE_MAX_TOKENS)
+    trimmed = len(turn_messages) < len(state["messages"]) or any(
+        kept is not original for kept, original in zip(reversed(turn_messages), reversed(state["messages"]))
+    )
+    if trimmed:
+        metrics.incr("brain.prompt_trimmed")
+    messages = [SystemMessage(content=system_prompt)] + turn_messages
+    prompt_tokens = sum(count_tokens(message_text(m)) for m in messages)
+    metrics.observe("brain.prompt_tokens", prompt_tokens)
+    started_at = time.perf_counter()
+    response = await hedged_invoke(
+        "brain", messages,
+        primary=Contender("gemini", brain_llm, prompt_tokens),
+        fallback=Contender("groq", brain_fallback_llm, prompt_tokens),
+    )
+    record_usage(BRAIN, response)
+    await brain_cache.set(cache_key, response.content, (time.perf_counter() - started_at) * 1000)
+    return {"messages": [response], "history": history_entry(response.content)}
+
+# The Brain often shortens subsystem names ("FINANCE SYS", "HEALTH SYS"); any word of the name identifies it
+DOMAIN_ALIASES = {
+    word: domain
+    for domain in DOMAIN_TOOL_NAMES
+    for word in re.findall(r"[A-Z]+", domain) if word != "SYS"
+}
+
+def resolve_domain(instruction: str) -> str:
+    """'FINANCE SYS - Log an expense...' -> 'FINANCE & ASSETS SYS'. Unrecognized -> 'General'."""
+    system_name = instruction.split(" - ", 1)[0].upper()
+    if "SYS" not in system_name:
+        return "General"
+    for word in re.findall(r"[A-Z]+", system_name):
+        if word in DOMAIN_ALIASES:
+            return DOMAIN_ALIASES[word]
+    return "General"
+
+def domain_toolset(domain: str):
+    tools = list(tool_retriever.domain_tools[domain])
+    if not any(t.name == "transfer_to_search" for t in tools):
+        tools.append(tool_retriever.tool_map["transfer_to_search"])
+    return tools
+
+# Warm the bound-runnable cache for every pinned domain at startup
+for _domain in DOMAIN_TOOL_NAMES:
+    get_tool_llm(domain_toolset(_domain))
 
 async def action_mapping_node(state: AgentState):
     """
-    Kimi: Receives the '||DELEGATE||' instruction, expands keywords, and picks the specific tool.
+    Kimi: Receives the '||DELEGATE||' instruction, binds the subsystem's tool set, and picks the specific tool.
     """
     messages = state["messages"]
     last_message = messages[-1]
@@ -101,62 +190,57 @@ async def action_mapping_node(state: AgentState):
     raw_text = last_message.content.replace("||DELEGATE||:", "").strip()
     print(f"🤖 Kimi received instruction: '{raw_text}'")
 
-    search_query = raw_text
-    
-    domain_map = {
-        "MEMORY & SEARCH SYS": "search_memory save_memory retrieve remember fact context web internet",
-        "PRODUCTIVITY SYS": "create_task update_task delete_task get_tasks section list alarm timer deadline schedule remind",
-        "HEALTH & BIOLOGY SYS": "log_water log_meal get_nutrition calories kcal food eat drink log_period cycle menstruation health dashboard sleep steps",
-        "FINANCE SYS": "add_transaction expense income money cost paid rupees bank account balance create_account",
-        "DEVICE & COMMS SYS": "open_app launch play_media music song pause next call_contact phone send_whatsapp sms message text",
-        "LIFESTYLE & GROWTH SYS": "save_journal diary write entry add_content movie book watch read github dev profile stats repo"
-    }
-    
-    active_domain = "General"
-    for domain, keywords in domain_map.items():
-        if domain in raw_text:
-            search_query += f" {keywords}"
-            active_domain = domain
-            print(f"🔹 Unpacking {domain} -> Added keywords")
-            break
+    active_domain = resolve_domain(raw_text)
+    metrics.incr(f"map_action.domain.{active_domain}")
 
-    print(f"🔎 Searching Tools for: '{search_query}'")
+    if active_domain != "General":
+        # Deterministic, precomputed tool subset for the named subsystem
+        relevant_tools = domain_toolset(active_domain)
+        print(f"🔹 Pinned {active_domain} -> {len(relevant_tools)} tools")
+    else:
+        print(f"🔎 Searching Tools for: '{raw_text}'")
+        relevant_tools = await tool_retriever.aquery(raw_text, k=10)
 
-    relevant_tools = tool_retriever.query(search_query, k=10)
-    
-    current_names = {t.name for t in relevant_tools if t}
-    
-    if "create_task" in current_names and "create_section" not in current_names:
-         relevant_tools.append(tool_retriever.tool_map.get("create_section"))
-         
-    if "log_meal" in current_names and "get_health_dashboard" not in current_names:
-        relevant_tools.append(tool_retriever.tool_map.get("get_health_dashboard"))
+        current_names = {t.name for t in relevant_tools if t}
+
+        if "create_task" in current_names and "create_section" not in current_names:
+             relevant_tools.append(tool_retriever.tool_map.get("create_section"))
+
+        if "log_meal" in current_names and "get_health_dashboard" not in current_names:
+            relevant_tools.append(tool_retriever.tool_map.get("get_health_dashboard"))
 
-    if "transfer_to_search" not in current_names:
+    if "transfer_to_search" not in {t.name for t in relevant_tools if t}:
         relevant_tools.append(tool_retriever.tool_map.get("transfer_to_search"))
 
     relevant_tools = [t for t in relevant_tools if t]
 
     print(f"🔧 Kimi Binding Tools: {[t.name for t in relevant_tools]}")
 
-    llm_with_tools = tool_llm.bind_tools(relevant_tools, tool_choice="auto")
+    llm_with_tools = get_tool_llm(relevant_tools)
     
-    kimi_prompt = f"""
-    You are the Action Engine.
+    kimi_prompt = ACTION_ENGINE.render(f"""
     The Brain requested: "{raw_text}"
     
     Domain: {active_domain}
-    
-    YOUR GOAL:
-    1. Select the specific tool that matches the instruction.
-    2. If the user provided specific data (like '500 rupees' or 'ate a burger'), use it in the arguments.
-    3. If multiple actions are needed (e.g., 'Save Journal' AND 'Log Emotion'), call both.
-    """
+    """)
     
     # We send a fresh message to Kimi to avoid polluting it with the whole Gemini chat history
-    response = await llm_with_tools.ainvoke([HumanMessage(content=kimi_prompt)])
-    
-    return {"messages": [response]}
+    kimi_tokens = count_tokens(kimi_prompt)
+    fallback = Contender("groq", get_tool_llm(relevant_tools, tool_fallback_llm), kimi_tokens) if hedging_enabled("map_action") else None
+    response = await hedged_invoke(
+        "map_action", [HumanMessage(content=kimi_prompt)],
+        primary=Contender("groq", llm_with_tools, kimi_tokens),
+        fallback=fallback,
+    )
+    record_usage(ACTION_ENGINE, response)
+
+    # Client actions run on the phone (await_client); remember what we asked it to do
+    client_calls = [tc for tc in response.tool_calls if tc["name"] in CLIENT_TOOL_NAMES]
+    history = [
+        AIMessage(content=f"(asked the phone to {tc['name'].replace('client_', '')}: {tc['args']})")
+        for tc in client_calls
+    ]
+    return {"messages": [response], "history": history, "client_calls": client_calls}
 
 async def search_node(state: AgentState):
     """Compound Model: Handles web searches."""
@@ -166,16 +250,61 @@ async def search_node(state: AgentState):
     query = last_message.content.replace("||SEARCH||:", "").strip()
     print(f"🌍 Routing to Search Node for: {query}")
     
-    search_prompt = "Provide a concise, factual answer. Use markdown links [Title](URL)."
-    
-    response = await search_llm.ainvoke([
-        SystemMessage(content=search_prompt),
+    response = await llm_scheduler.run("groq", lambda: search_llm.ainvoke([
+        SystemMessage(content=SEARCH.text),
         HumanMessage(content=query)
-    ])
+    ]), tokens=count_tokens(SEARCH.text + query))
+    record_usage(SEARCH, response)
     
     print(f"🌍 Search Node Output: {response.content}")
 
-    return {"messages": [response]}
+    return {"messages": [response], "history": history_entry(response.content)}
+
+async def await_client_node(state: AgentState):
+    """
+    Pauses the run (checkpointed) while the phone executes the client actions.
+    POST /query/continue resumes it here with their results, so the turn goes on
+    without re-running enrichment, the Brain and Kimi.
+    """
+    calls = state.get("client_calls") or []
+    results = interrupt({"client_calls": calls}) or []
+
+    by_id = {r.get("tool_call_id"): r for r in results}
+    client_messages = []
+    for call in calls:
+        # A phone that ran a single action may omit its id
+        result = by_id.get(call["id"]) or (by_id.get(None) if len(calls) == 1 else None)
+        if result is None:
+            client_messages.append(ToolMessage(
+                content="The phone did not run this action.",
+                name=call["name"], tool_call_id=call["id"], status="error"
+            ))
+            continue
+        client_messages.append(ToolMessage(
+            content=result.get("result") or "Done.",
+            name=call["name"], tool_call_id=call["id"],
+            status="success" if result.get("success", True) else "error"
+        ))
+    metrics.incr("await_client.resumed")
+
+    # Server results of a mixed turn are still the current messages
+    server_messages = [m for m in state["messages"] if isinstance(m, ToolMessage)]
+    summary = "\n".join(f"- {m.name}: {m.content}" for m in client_messages)
+    return {
+        "messages": server_messages + client_messages,
+        "client_calls": [],
+        "history": [AIMessage(content=f"(phone results)\n{summary}")],
+    }
+
+async def direct_response_node(state: AgentState):
+    """Ends a tool turn with the tools' own (user-ready) output instead of a second Gemini call."""
+    content = render_direct(state["messages"])
+    print(f"⏩ Direct response from {[m.name for m in state['messages']]}")
+    metrics.incr("direct_response.used")
+    return {
+        "messages": [AIMessage(content=content, response_metadata={"direct_response": True})],
+        "history": history_entry(content),
+    }
 
 # --- ROUTING LOGIC ---
 
@@ -208,12 +337,22 @@ def router_action(state: AgentState):
     has_client = any(tc["name"] in CLIENT_TOOL_NAMES for tc in tool_calls)
 
     if has_server:
-        return "execute_server" # Go to ToolNode
+        return "execute_server" # Go to the server tool executor
     if has_client:
-        return "end" # Return to React Native to execute
+        return "await_client" # Pause until React Native has executed them
         
     return "end"
 
+def router_execute(state: AgentState):
+    """Decides whether tool output needs the Brain to phrase it."""
+    if state.get("client_calls"):
+        # Mixed turn: the phone still has to run its part
+        return "await_client"
+    if is_user_ready(state["messages"]):
+        return "respond"
+    metrics.incr("direct_response.skipped")
+    return "brain"
+
 # --- GRAPH CONSTRUCTION ---
 
 graph = StateGraph(AgentState)
@@ -222,7 +361,9 @@ graph = StateGraph(AgentState)
 graph.add_node("brain", brain_node)
 graph.add_node("map_action", action_mapping_node)
 graph.add_node("search", search_node)
-graph.add_node("execute_server", tool_execution_node)
+graph.add_node("execute_server", execute_server_node)
+graph.add_node("respond", direct_response_node)
+graph.add_node("await_client", await_client_node)
 
 # Edges
 graph.add_edge(START, "brain")
@@ -244,15 +385,36 @@ graph.add_conditional_edges(
     router_action,
     {
         "execute_server": "execute_server",
+        "await_client": "await_client",
         "search": "search",
         "end": END
     }
 )
 
-# After Server Tools execute, feed result back to Brain for final confirmation
-graph.add_edge("execute_server", "brain") 
+# After Server Tools execute, user-ready output ends the turn; anything else goes back to Brain
+graph.add_conditional_edges(
+    "execute_server",
+    router_execute,
+    {
+        "await_client": "await_client",
+        "respond": "respond",
+        "brain": "brain"
+    }
+)
+
+# Resumed with the phone's results: same choice between a direct answer and the Brain
+graph.add_conditional_edges(
+    "await_client",
+    router_execute,
+    {
+        "respond": "respond",
+        "brain": "brain"
+    }
+)
+graph.add_edge("respond", END)
 
 # Search ends the turn
 graph.add_edge("search", END)
 
-app = graph.compile()
\ No newline at end of file
+# Per-user thread state lives in Redis (write-through to Postgres), keyed by configurable.user_id
+app = graph.compile(checkpointer=checkpointer)
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import re
+import json
+import time
+import hashlib
+from typing import Optional, List
+
+from langchain_core.messages import BaseMessage
+from core.lifespan import redis
+from utils.metrics import metrics
+
+# Per-user cache in front of brain_llm. Any write tool bumps the user's generation,
+# which orphans every cached answer for that user (they then age out via TTL).
+# A missing generation (expired or evicted) is replaced by a fresh one, never a default,
+# so entries from before an invalidation can't match again.
+
+CACHE_TTL = int(os.getenv("BRAIN_CACHE_TTL", "300"))
+# Outlives every entry; even if it is evicted early, _generation starts a new one
+GENERATION_TTL = max(CACHE_TTL * 2, 24 * 3600)
+CACHE_ENABLED = os.getenv("BRAIN_CACHE_ENABLED", "true").lower() == "true"
+
+CACHE_PREFIX = "brain_cache:"
+GENERATION_PREFIX = "brain_cache:gen:"
+
+# Answers that depend on the wall clock are never cached
+UNCACHEABLE = re.compile(r"\b(?:time|now|clock|date)\b")
+CLOCK = re.compile(r"\d{1,2}:\d{2}(?::\d{2})?")
+
+def normalize_query(text: str) -> str:
+    text = re.sub(r"[^\w\s'₹]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+
+class BrainResponseCache:
+    async def _generation(self, user_id: str) -> str:
+        key = f"{GENERATION_PREFIX}{user_id}"
+        generation = await redis.get(key)
+        if generation is None:
+            # NX: concurrent readers agree on one new generation
+            await redis.set(key, str(time.time_ns()), nx=True, ex=GENERATION_TTL)
+            generation = await redis.get(key)
+        return generation
+
+    def _key(self, user_id: str, generation: str, messages: List[BaseMessage], memories: List[str],
+             profile: str, summary: str) -> Optional[str]:
+        if not messages:
+            return None
+
+        query = normalize_query(str(messages[-1].content))
+        if messages[-1].type == "human" and UNCACHEABLE.search(query):
+            return None
+
+        payload = {
+            "turn": messages[-1].type,
+            "query": query,
+            "memories": _digest(sorted(memories)),
+            "history": _digest([(m.type, str(m.content)) for m in messages[:-1]]),
+            # The rolling summary is what "and the second one?" resolves against
+            "summary": _digest(summary),
+            # Local time changes every request; keep only the date part
+            "profile": CLOCK.sub("", profile),
+        }
+        return f"{CACHE_PREFIX}{user_id}:{generation}:{_digest(payload)}"
+
+    async def get(self, user_id: str, messages: List[BaseMessage], memories: List[str], profile: str, summary: str = "") -> tuple:
+        """
+        Returns (content or None, key). The key is handed back to set() on a miss.
+        summary is the conversation summary as it goes into the prompt.
+        """
+        if not CACHE_ENABLED or not user_id:
+            return None, None
+
+        try:
+            key = self._key(user_id, await self._generation(user_id), messages, memories, profile, summary)
+            if not key:
+                return None, None
+
+            cached = await redis.get(key)
+        except Exception as e:
+            print(f"⚠️ [BrainCache] Lookup failed: {e}")
+            return None, None
+
+        if cached:
+            entry = json.loads(cached)
+            metrics.incr("brain_cache.hit")
+            metrics.incr("brain_cache.saved_ms", entry.get("latency_ms", 0))
+            content = entry["content"]
+        else:
+            metrics.incr("brain_cache.miss")
+            content = None
+
+        metrics.gauge("brain_cache.hit_rate", metrics.ratio("brain_cache.hit", "brain_cache.miss"))
+        return content, key
+
+    async def set(self, key: Optional[str], content: str, latency_ms: float) -> None:
+        if not key or not content:
+            return
+        try:
+            await redis.set(key, json.dumps({"content": content, "latency_ms": round(latency_ms, 1)}), ex=CACHE_TTL)
+        except Exception as e:
+            print(f"⚠️ [BrainCache] Store failed: {e}")
+
+    async def invalidate(self, user_id: str) -> None:
+        """Called by every write tool. A fresh, unique generation can never collide with old entries."""
+        if not user_id:
+            return
+        try:
+            await redis.set(f"{GENERATION_PREFIX}{user_id}", str(time.time_ns()), ex=GENERATION_TTL)
+        except Exception as e:
+            print(f"⚠️ [BrainCache] Invalidate failed: {e}")
+
+brain_cache = BrainResponseCache()
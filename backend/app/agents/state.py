@@ -1,7 +1,18 @@
+import os
 from typing import TypedDict, Annotated, List
 from langchain_core.messages import BaseMessage
 
+# Compact conversation kept in the checkpointed thread (user turns, answers, tool summaries)
+HISTORY_LIMIT = int(os.getenv("CHECKPOINT_HISTORY_MESSAGES", "16"))
+
+def merge_history(left: List[BaseMessage], right: List[BaseMessage]) -> List[BaseMessage]:
+    return ((left or []) + (right or []))[-HISTORY_LIMIT:]
+
 class AgentState(TypedDict):
     messages: List[BaseMessage]
     user_profile: str 
-    vector_context: List[str]
\ No newline at end of file
+    vector_context: List[str]
+    conversation_summary: str
+    history: Annotated[List[BaseMessage], merge_history]
+    # Client tool calls of the current turn, waiting for the phone's results
+    client_calls: List[dict]
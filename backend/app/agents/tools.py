@@ -4,6 +4,7 @@ from langchain_core.runnables import RunnableConfig
 from typing import Optional, Literal, List
 from core.lifespan import db
 from app.services.memory_store import memory_store
+from app.agents.response_cache import brain_cache
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
@@ -119,6 +120,10 @@ CLIENT_TOOL_NAMES = [t.name for t in CLIENT_TOOLS]
 # ============================================
 # SERVER TOOLS (Executed on backend)
 # User ID is injected via RunnableConfig
+# return_direct=True: the output is already user-ready, so the turn can end
+# after execution without a second Brain pass. Only write confirmations and
+# single-value lookups; list reads go back to the Brain, which has to filter
+# or reason over them ("what's due tomorrow?", "am I late this cycle?")
 # ============================================
 
 # --- Helper to extract user_id from config ---
@@ -247,7 +252,7 @@ async def get_tasks(config: RunnableConfig) -> str:
     
     return "\n\n".join(result)
 
-@tool(args_schema=CreateSectionArgs)
+@tool(args_schema=CreateSectionArgs, return_direct=True)
 async def create_section(title: str, icon: Optional[str] = "📋", color: Optional[str] = "#4285F4", *, config: RunnableConfig) -> str:
     """Create a new task section/category. Use when user wants to organize tasks into a new category."""
     user_id = get_user_id(config)
@@ -267,9 +272,10 @@ async def create_section(title: str, icon: Optional[str] = "📋", color: Option
             "color": color
         }
     )
+    await brain_cache.invalidate(user_id)
     return f"📁 Created section: '{title}'"
 
-@tool(args_schema=CreateTaskArgs)
+@tool(args_schema=CreateTaskArgs, return_direct=True)
 async def create_task(title: str, section_name: str = "General", due_date: Optional[str] = None, due_time: Optional[str] = None, *, config: RunnableConfig) -> str:
     """
     Create a formal 'Task Manager' style to-do item. MUST have a deadline or be part of a project.
@@ -290,10 +296,11 @@ async def create_task(title: str, section_name: str = "General", due_date: Optio
     await db.task.create(
         data={"sectionId": section.id, "title": title, "status": "todo", "dueDate": due_date, "dueTime": due_time}
     )
+    await brain_cache.invalidate(user_id)
     return f"✅ Created Task: '{title}' in {section.title} (Due: {due_date or 'No Date'})"
 
 
-@tool(args_schema=UpdateTaskArgs)
+@tool(args_schema=UpdateTaskArgs, return_direct=True)
 async def update_task(task_title: str, new_title: Optional[str] = None, new_due_date: Optional[str] = None, new_due_time: Optional[str] = None, status: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Update an existing task. Use when user wants to modify a task's title, due date, or status."""
     user_id = get_user_id(config)
@@ -327,9 +334,10 @@ async def update_task(task_title: str, new_title: Optional[str] = None, new_due_
         return "No updates specified."
     
     await db.task.update(where={"id": found_task.id}, data=update_data)
+    await brain_cache.invalidate(user_id)
     return f"✅ Updated task: '{found_task.title}'"
 
-@tool(args_schema=CompleteTaskArgs)
+@tool(args_schema=CompleteTaskArgs, return_direct=True)
 async def complete_task(task_title: str, *, config: RunnableConfig) -> str:
     """Mark a task as complete/done. Use when user says they finished a task."""
     user_id = get_user_id(config)
@@ -350,9 +358,10 @@ async def complete_task(task_title: str, *, config: RunnableConfig) -> str:
         return f"❌ Task containing '{task_title}' not found."
     
     await db.task.update(where={"id": found_task.id}, data={"status": "done"})
+    await brain_cache.invalidate(user_id)
     return f"✅ Marked '{found_task.title}' as complete!"
 
-@tool(args_schema=DeleteTaskArgs)
+@tool(args_schema=DeleteTaskArgs, return_direct=True)
 async def delete_task(task_title: str, *, config: RunnableConfig) -> str:
     """Delete a task. Use when user wants to remove a task."""
     user_id = get_user_id(config)
@@ -373,9 +382,10 @@ async def delete_task(task_title: str, *, config: RunnableConfig) -> str:
         return f"❌ Task containing '{task_title}' not found."
     
     await db.task.delete(where={"id": found_task.id})
+    await brain_cache.invalidate(user_id)
     return f"🗑️ Deleted task: '{found_task.title}'"
 
-@tool(args_schema=RescheduleTaskArgs)
+@tool(args_schema=RescheduleTaskArgs, return_direct=True)
 async def reschedule_task(task_title: str, new_due_date: str, new_due_time: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Reschedule a task to a new date/time. Use when user wants to move a task to a different time."""
     user_id = get_user_id(config)
@@ -402,6 +412,7 @@ async def reschedule_task(task_title: str, new_due_date: str, new_due_time: Opti
             where={"id": found_task.id},
             data={"dueDate": new_due_date, "dueTime": new_due_time}
         )
+        await brain_cache.invalidate(user_id)
         return f"📅 Rescheduled '{found_task.title}' to {new_due_date}" + (f" at {new_due_time}" if new_due_time else "")
     except Exception:
         await db.task.delete(where={"id": found_task.id})
@@ -414,6 +425,7 @@ async def reschedule_task(task_title: str, new_due_date: str, new_due_time: Opti
                 "dueTime": new_due_time
             }
         )
+        await brain_cache.invalidate(user_id)
         return f"📅 Rescheduled '{found_task.title}' to {new_due_date}" + (f" at {new_due_time}" if new_due_time else "")
 
 
@@ -421,7 +433,7 @@ async def reschedule_task(task_title: str, new_due_date: str, new_due_time: Opti
 # JOURNAL TOOLS
 # ============================================
 
-@tool
+@tool(return_direct=True)
 async def get_journal_today(config: RunnableConfig) -> str:
     """Get today's journal entry. Use when user asks about their journal or what they wrote today."""
     user_id = get_user_id(config)
@@ -435,7 +447,7 @@ async def get_journal_today(config: RunnableConfig) -> str:
     
     return f"📖 Today's Journal ({today}):\n{journal.content}"
 
-@tool(args_schema=SaveJournalArgs)
+@tool(args_schema=SaveJournalArgs, return_direct=True)
 async def save_journal(content: str, date: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Save or update a journal entry. Use when user wants to write in their journal."""
     user_id = get_user_id(config)
@@ -448,6 +460,7 @@ async def save_journal(content: str, date: Optional[str] = None, *, config: Runn
             "update": {"content": content}
         }
     )
+    await brain_cache.invalidate(user_id)
     return f"📝 Journal saved for {target_date}"
 
 
@@ -491,7 +504,7 @@ async def get_health_dashboard(config: RunnableConfig) -> str:
 • Water: {water_val}ml / {water_target}ml
 • Goal Progress: Check the app for details"""
 
-@tool(args_schema=LogWaterArgs)
+@tool(args_schema=LogWaterArgs, return_direct=True)
 async def log_water(amount: int, *, config: RunnableConfig) -> str:
     """Log water intake. Use when user says they drank water."""
     user_id = get_user_id(config)
@@ -537,6 +550,7 @@ async def log_water(amount: int, *, config: RunnableConfig) -> str:
             }
         )
 
+    await brain_cache.invalidate(user_id)
     return f"💧 Logged {amount}ml water. Total today: {new_val}ml / {water_goal.target}ml"
 
 
@@ -564,7 +578,7 @@ async def get_transactions(config: RunnableConfig) -> str:
     
     return "\n".join(result)
 
-@tool(args_schema=AddTransactionArgs)
+@tool(args_schema=AddTransactionArgs, return_direct=True)
 async def add_transaction(amount: float, payee: str, category: str, type: str, *, config: RunnableConfig) -> str:
     """Log a financial transaction, expense, or income. Use this when the user spent money, paid for something, or received money. Keywords: cost, price, rupees, paid."""
     user_id = get_user_id(config)
@@ -579,6 +593,7 @@ async def add_transaction(amount: float, payee: str, category: str, type: str, *
             "iconBg": "#000000"
         }
     )
+    await brain_cache.invalidate(user_id)
     sign = "+" if type == "income" else "-"
     return f"💵 Added {type}: {sign}₹{amount} - {payee} ({category})"
 
@@ -608,6 +623,8 @@ async def get_memories(config: RunnableConfig) -> str:
 
 
 
+# Not return_direct: a critical reminder needs the Brain to follow up with
+# client_schedule_critical_memory, and the output carries an alarm timestamp meant for it
 @tool(args_schema=SaveMemoryArgs)
 async def save_memory(title: str, content: str, tags: Optional[str] = None, repeat_pattern: Optional[str] = None, is_critical: Optional[bool] = False, due_date: Optional[str] = None, due_time: Optional[str] = None, *, config: RunnableConfig) -> str:
     """
@@ -637,6 +654,7 @@ async def save_memory(title: str, content: str, tags: Optional[str] = None, repe
         }
     )
     
+    await brain_cache.invalidate(user_id)
     reminder_str = f" (Reminder: {due_date} {due_time})" if due_date or due_time else ""
     
     # Calculate IST timestamp if critical and time is provided
@@ -685,7 +703,7 @@ async def get_accounts(config: RunnableConfig) -> str:
     
     return "\n".join(result)
 
-@tool(args_schema=CreateAccountArgs)
+@tool(args_schema=CreateAccountArgs, return_direct=True)
 async def create_account(name: str, balance: float, account_number: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Create a new bank account. Use when user wants to add a bank account."""
     user_id = get_user_id(config)
@@ -698,9 +716,10 @@ async def create_account(name: str, balance: float, account_number: Optional[str
             "color": "#4285F4"
         }
     )
+    await brain_cache.invalidate(user_id)
     return f"🏦 Created account: '{name}' with ₹{balance}"
 
-@tool(args_schema=UpdateAccountArgs)
+@tool(args_schema=UpdateAccountArgs, return_direct=True)
 async def update_account(account_name: str, new_balance: Optional[float] = None, new_name: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Update a bank account. Use when user wants to change account balance or name."""
     user_id = get_user_id(config)
@@ -721,6 +740,7 @@ async def update_account(account_name: str, new_balance: Optional[float] = None,
         return "No updates specified."
     
     await db.bankaccount.update(where={"id": account.id}, data=update_data)
+    await brain_cache.invalidate(user_id)
     return f"✅ Updated account: '{account.name}'"
 
 
@@ -764,7 +784,7 @@ async def get_dev_profile(config: RunnableConfig) -> str:
 # PERIOD TRACKING TOOLS
 # ============================================
 
-@tool(args_schema=LogPeriodArgs)
+@tool(args_schema=LogPeriodArgs, return_direct=True)
 async def log_period(date: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Log period start date. Use when user says their period started."""
     user_id = get_user_id(config)
@@ -780,6 +800,7 @@ async def log_period(date: Optional[str] = None, *, config: RunnableConfig) -> s
     await db.periodcycle.create(
         data={"userId": user_id, "startDate": target_date}
     )
+    await brain_cache.invalidate(user_id)
     return f"🩸 Logged period start: {target_date}"
 
 @tool
@@ -825,7 +846,7 @@ Days Until: {days_until if days_until > 0 else 'Overdue'}"""
 # NUTRITION/MEALS TOOLS
 # ============================================
 
-@tool(args_schema=LogMealArgs)
+@tool(args_schema=LogMealArgs, return_direct=True)
 async def log_meal(name: str, kcal: int, meal_type: str, date: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Log nutritional intake and food consumption for health tracking. Use ONLY when the user is eating or tracking calories. Do NOT use for buying food."""
     user_id = get_user_id(config)
@@ -849,6 +870,7 @@ async def log_meal(name: str, kcal: int, meal_type: str, date: Optional[str] = N
             "time": datetime.now().strftime("%H:%M")
         }
     )
+    await brain_cache.invalidate(user_id)
     return f"🍽️ Logged {meal_type}: {name} ({kcal} kcal)"
 
 @tool
@@ -876,7 +898,7 @@ async def get_nutrition_today(config: RunnableConfig) -> str:
 📊 Total: {total_kcal} / {log.goal} kcal
 {"✅ " + str(remaining) + " kcal remaining" if remaining > 0 else "⚠️ Over by " + str(abs(remaining)) + " kcal"}"""
 
-@tool(args_schema=DeleteMealArgs)
+@tool(args_schema=DeleteMealArgs, return_direct=True)
 async def delete_meal(meal_name: str, *, config: RunnableConfig) -> str:
     """Delete a logged meal. Use when user wants to remove a meal entry."""
     user_id = get_user_id(config)
@@ -900,6 +922,7 @@ async def delete_meal(meal_name: str, *, config: RunnableConfig) -> str:
         return f"❌ Meal '{meal_name}' not found."
     
     await db.mealitem.delete(where={"id": found_meal.id})
+    await brain_cache.invalidate(user_id)
     return f"🗑️ Deleted meal: {found_meal.name}"
 
 
@@ -927,7 +950,7 @@ async def get_content(config: RunnableConfig) -> str:
     
     return "\n".join(result)
 
-@tool(args_schema=AddContentArgs)
+@tool(args_schema=AddContentArgs, return_direct=True)
 async def add_content(type: str, title: str, subtitle: Optional[str] = None, platform: Optional[str] = None, url: Optional[str] = None, *, config: RunnableConfig) -> str:
     """Save a movie, video, book, or article to watch/read later."""
     user_id = get_user_id(config)
@@ -943,6 +966,7 @@ async def add_content(type: str, title: str, subtitle: Optional[str] = None, pla
             "image": "https://placehold.co/100"
         }
     )
+    await brain_cache.invalidate(user_id)
     return f"✅ Added to {type} list: {title}"
 
 @tool(args_schema=TransferToSearchArgs)
@@ -1033,3 +1057,50 @@ SERVER_TOOL_NAMES = [t.name for t in SERVER_TOOLS]
 
 # All tools combined
 ALL_TOOLS = CLIENT_TOOLS + SERVER_TOOLS
+
+# Subsystems named in the Brain prompt -> the tools Kimi gets for them.
+# Used as-is when the delegation names a domain; vector search only for "General".
+DOMAIN_TOOL_NAMES = {
+    "MEMORY & SEARCH SYS": [
+        "search_memory", "save_memory", "get_memories", "client_schedule_critical_memory",
+    ],
+    "PRODUCTIVITY SYS": [
+        "get_tasks", "create_task", "create_section", "update_task", "complete_task", "delete_task", "reschedule_task",
+        "client_set_alarm", "client_set_timer", "save_memory", "client_schedule_critical_memory",
+    ],
+    "HEALTH & BIOLOGY SYS": [
+        "log_water", "get_health_dashboard", "log_meal", "get_nutrition_today", "delete_meal",
+        "log_period", "get_period_info", "client_sleep_tracking",
+    ],
+    "FINANCE & ASSETS SYS": [
+        "add_transaction", "get_transactions", "get_accounts", "create_account", "update_account",
+    ],
+    "DEVICE & COMMS SYS": [
+        "client_open_app", "client_play_media", "client_call_contact", "client_send_whatsapp", "client_send_sms",
+        "client_set_alarm", "client_set_timer",
+    ],
+    "LIFESTYLE & GROWTH SYS": [
+        "save_journal", "get_journal_today", "add_content", "get_content", "get_dev_profile",
+    ],
+}
+
+# Write tools -> the entities they touch, as (entity, identifying arg) pairs. Calls sharing an
+# entity are executed one after another in the order Kimi emitted them; the rest may run concurrently.
+# An arg of None means the tool mutates a single per-user record (e.g. today's water log).
+TOOL_ENTITIES = {
+    "create_task": [("task", "title"), ("section", "section_name")],
+    "update_task": [("task", "task_title"), ("task", "new_title")],
+    "complete_task": [("task", "task_title")],
+    "delete_task": [("task", "task_title")],
+    "reschedule_task": [("task", "task_title")],
+    "create_section": [("section", "title")],
+    "save_journal": [("journal", "date")],
+    "log_water": [("water", None)],
+    "create_account": [("account", "name")],
+    "update_account": [("account", "account_name"), ("account", "new_name")],
+    "log_period": [("period", "date")],
+    "log_meal": [("meal", "name")],
+    "delete_meal": [("meal", "meal_name")],
+    "add_content": [("content", "title")],
+    "save_memory": [("memory", "title")],
+}
@@ -0,0 +1,140 @@
+import os
+import time
+import asyncio
+import weakref
+from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_groq import ChatGroq
+from prisma.errors import UniqueViolationError
+from core.lifespan import db, redis
+from utils.metrics import metrics
+from utils.token_budget import truncate_to_tokens, count_tokens
+from services.llm_scheduler import llm_scheduler, BACKGROUND
+from utils.llm_usage import record_usage
+from app.prompts import CONVERSATION_SUMMARY
+
+# Rolling per-user conversation summary. Every finished turn is folded into it in the
+# background, so prompts carry this bounded summary plus the latest turn instead of N raw exchanges.
+# Redis serves reads; Postgres keeps a copy so the summary survives Redis eviction.
+# Postgres also records the last turn folded in (lastTurnAt, the turn's log time in ms). A fold
+# only commits if that marker hasn't moved since it was read, so a retried job never folds its
+# turn twice and workers racing on one user never fold out of order: a turn older than the
+# marker is skipped, and a lost race re-reads and folds again.
+
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "200"))
+SUMMARY_TTL = int(os.getenv("SUMMARY_TTL", str(7 * 24 * 3600)))
+TURN_MAX_TOKENS = 400 # per side of the exchange fed to the summarizer
+
+SUMMARY_PREFIX = "conversation_summary:"
+TURN_SUFFIX = ":turn"
+COMMIT_ATTEMPTS = 3
+
+# Caches a summary unless Redis already holds a later one
+_CACHE_IF_NEWER = redis.register_script("""
+local current = tonumber(redis.call('GET', KEYS[2]) or '-1')
+if tonumber(ARGV[2]) >= current then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[3])
+    redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+""")
+
+llm = ChatGroq(
+    model="llama-3.1-8b-instant",
+    api_key=os.getenv("GROQ_API_KEY"),
+    temperature=0.0,
+    max_retries=0, # Retries and 429 backoff happen in services.llm_scheduler
+)
+
+# One update at a time per user, so back-to-back turns fold in order
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _lock(user_id: str) -> asyncio.Lock:
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+async def get_summary(user_id: str) -> str:
+    key = f"{SUMMARY_PREFIX}{user_id}"
+    cached = await redis.get(key)
+    if cached is not None:
+        metrics.incr("summary.redis_hit")
+        return cached
+
+    row = await db.conversationsummary.find_unique(where={"userId": user_id})
+    if not row:
+        metrics.incr("summary.miss")
+        return ""
+    metrics.incr("summary.postgres_hit")
+    await _cache(user_id, row.summary, row.lastTurnAt or 0)
+    return row.summary
+
+async def _cache(user_id: str, summary: str, turn_at: int):
+    key = f"{SUMMARY_PREFIX}{user_id}"
+    await _CACHE_IF_NEWER(keys=[key, f"{key}{TURN_SUFFIX}"], args=[summary, turn_at, SUMMARY_TTL])
+
+async def _fold(current: str, user_raw: str, ai_response: str) -> str:
+    exchange = f"""
+    === CURRENT SUMMARY ===
+    {current or "(empty)"}
+
+    === NEW EXCHANGE ===
+    User: "{truncate_to_tokens(user_raw, TURN_MAX_TOKENS)}"
+    AI: "{truncate_to_tokens(ai_response, TURN_MAX_TOKENS)}"
+
+    At most {SUMMARY_MAX_TOKENS * 3 // 4} words.
+    """
+    result = await llm_scheduler.run("groq", lambda: llm.ainvoke([
+        SystemMessage(content=CONVERSATION_SUMMARY.text),
+        HumanMessage(content=exchange)
+    ]), priority=BACKGROUND, tokens=count_tokens(CONVERSATION_SUMMARY.text + exchange))
+    record_usage(CONVERSATION_SUMMARY, result)
+    return truncate_to_tokens(result.content.strip(), SUMMARY_MAX_TOKENS)
+
+async def _commit(user_id: str, row, summary: str, turn_at: int) -> bool:
+    """Writes the summary only if no other turn was folded in since `row` was read."""
+    if row is None:
+        try:
+            await db.conversationsummary.create(data={"userId": user_id, "summary": summary, "lastTurnAt": turn_at})
+            return True
+        except UniqueViolationError:
+            return False
+    updated = await db.conversationsummary.update_many(
+        where={"userId": user_id, "lastTurnAt": row.lastTurnAt},
+        data={"summary": summary, "lastTurnAt": turn_at},
+    )
+    return updated > 0
+
+async def update_summary(user_raw: str, ai_response: str, user_id: str, turn_at: int = 0):
+    """
+    Folds one exchange into the user's rolling summary. Runs in the job worker, which retries on error.
+    turn_at orders the user's turns (0 for jobs enqueued without one: folded unconditionally).
+    """
+    async with _lock(user_id):
+        started_at = time.perf_counter()
+        try:
+            for _ in range(COMMIT_ATTEMPTS):
+                row = await db.conversationsummary.find_unique(where={"userId": user_id})
+                last_turn_at = (row.lastTurnAt or 0) if row else 0
+                if turn_at and turn_at <= last_turn_at:
+                    # A retry of a turn already folded in, or one a later turn overtook
+                    metrics.incr("summary.already_folded")
+                    return
+
+                summary = await _fold(row.summary if row else "", user_raw, ai_response)
+                folded_at = max(turn_at, last_turn_at)
+                if await _commit(user_id, row, summary, folded_at):
+                    await _cache(user_id, summary, folded_at)
+                    metrics.incr("summary.updated")
+                    return
+                # Another worker folded a turn for this user meanwhile; fold on top of it
+                metrics.incr("summary.conflict")
+            raise RuntimeError(f"summary kept changing during {COMMIT_ATTEMPTS} attempts")
+        except Exception as e:
+            print(f"⚠️ [Summary] Could not update conversation summary for {user_id}: {e}")
+            metrics.incr("summary.error")
+            raise
+        finally:
+            metrics.observe("summary.update_ms", (time.perf_counter() - started_at) * 1000)
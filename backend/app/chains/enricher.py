@@ -1,50 +1,107 @@
-from typing import List
+from typing import List, Optional
 from langchain_core.messages import SystemMessage, HumanMessage, BaseMessage
 from langchain_groq import ChatGroq
+from utils.metrics import metrics
+from utils.token_budget import truncate_to_tokens, count_tokens
+from services.llm_scheduler import llm_scheduler
+from utils.llm_usage import record_usage
+from app.prompts import ENRICHER
 import os
+import re
+import time
 
 llm = ChatGroq(
     model="llama-3.3-70b-versatile",
     api_key=os.getenv("GROQ_API_KEY"),
     temperature=0.1,
-    max_retries=2,
+    max_retries=0, # Retries and 429 backoff happen in services.llm_scheduler
 )
 
-async def enrich_query(raw_query: str, history_messages: List[BaseMessage]) -> str:
+SKIP_ENABLED = os.getenv("ENRICH_SKIP_ENABLED", "true").lower() == "true"
+# Long answers (task lists, dashboards) only need their gist for pronoun resolution
+HISTORY_MESSAGE_TOKENS = 150
+
+# --- Local ambiguity detector: only ambiguous queries pay for the LLM call ---
+# Words that point back into the conversation; meaningless without history
+ANAPHORA = re.compile(
+    r"\b(?:it|its|that|this|these|those|them|they|their|he|him|his|she|her|there|"
+    r"same|again|another|other|one|also|too|instead|then)\b"
+    r"(?! (?:morning|afternoon|evening|night|week|weekend|month|year)\b)"
+)
+# Follow-ups that continue the previous turn ("and the other one?", "what about tomorrow")
+ELLIPSIS = re.compile(r"(?:\.\.\.|…)|^(?:and|or|but|also|what about|how about|same for)\b")
+# Vague times the date parser can't pin down; the enricher turns them into explicit ones.
+# A word the parser did resolve is followed by its "(YYYY-MM-DD ...)" annotation ("2 days later (...)")
+RELATIVE_DATE = re.compile(
+    r"\b(?:later|soon|sometime|someday|eventually|in a (?:bit|while)|next time|"
+    r"this (?:week|month|year))\b(?! \()"
+)
+MIN_WORDS = 3
+
+def ambiguity_reason(raw_query: str, history_messages: List[BaseMessage]) -> Optional[str]:
+    """Returns why a query needs enrichment, or None when it is already self-contained."""
+    if not history_messages:
+        # Nothing to resolve against: a first-turn fragment or "later" goes to the Brain as is
+        # (dates the parser can pin down are already annotated by utils.date_parser)
+        return None
+    if RELATIVE_DATE.search(raw_query.lower()):
+        return "relative_date"
+    # Relative dates are resolved locally (utils.date_parser) before this runs; ignore those annotations
+    text = re.sub(r"\s*\([\d :-]+\)", "", raw_query).lower().strip()
+    if len(re.findall(r"\w+", text)) < MIN_WORDS:
+        return "fragment"
+    if ELLIPSIS.search(text):
+        return "ellipsis"
+    if ANAPHORA.search(text):
+        return "pronoun"
+    return None
+
+def _record_skip(skipped: bool) -> None:
+    metrics.incr("enricher.skipped" if skipped else "enricher.called")
+    metrics.gauge("enricher.skip_rate", round(metrics.ratio("enricher.skipped", "enricher.called"), 4))
+    if skipped:
+        # Each skip saves roughly one median enricher call
+        saved = metrics.percentile("enricher.llm_ms", 50)
+        metrics.incr("enricher.saved_ms", saved)
+        metrics.gauge("enricher.saved_ms_p50", round(saved, 2))
+
+async def enrich_query(raw_query: str, history_messages: List[BaseMessage], summary: str = "") -> str:
     """
     Expands the query using conversation history to resolve pronouns and ambiguity.
+    Self-contained queries are returned as-is without an LLM call.
     """
+    reason = ambiguity_reason(raw_query, history_messages)
+    if SKIP_ENABLED and reason is None:
+        _record_skip(True)
+        print(f"⏭️ [Enricher] Skipped, query is unambiguous: '{raw_query}'")
+        return raw_query
+    _record_skip(False)
+    if reason:
+        metrics.incr(f"enricher.reason.{reason}")
+
     # Convert history objects to a simple string for the prompt
-    history_text = "\n".join([f"{m.type}: {m.content}" for m in history_messages[-3:]]) # Keep last 3 turns
+    history_text = "\n".join([f"{m.type}: {truncate_to_tokens(str(m.content), HISTORY_MESSAGE_TOKENS)}" for m in history_messages[-3:]]) # Latest turn
     
-    system_prompt = f"""
-    You are an Intent Enricher for a Personal OS.
+    # Constant rules first (provider prompt caching), then this turn's context
+    system_prompt = ENRICHER.render(f"""
+    === CONVERSATION SUMMARY ===
+    {summary or "None"}
     
     === CONVERSATION HISTORY ===
     {history_text}
     
     === CURRENT USER INPUT ===
     "{raw_query}"
-    
-    === YOUR TASK ===
-    Clarify the user's input for the Agent, BUT preserve the core intent (Action vs. Search).
-    
-    RULES:
-    1. **If it is a Command (Task/Reminder):** Keep it as a command. specificy the date/time if implied.
-       - "study dva tomorrow" -> "Create a task to study DVA tomorrow by 11pm"
-       - "remind me to call mom" -> "Set a reminder to call Mom"
-    2. **If it is a Search/Question:** Expand it for clarity.
-       - "gym code" -> "What is the passcode for my gym locker?"
-    3. **Resolve Pronouns:** Use history to replace "he", "it", "that".
-    
-    Output the refined string only.
-    """
+    """)
     
     try:
-        response = await llm.ainvoke([
+        started_at = time.perf_counter()
+        response = await llm_scheduler.run("groq", lambda: llm.ainvoke([
             SystemMessage(content=system_prompt),
             HumanMessage(content="Output search query only:")
-        ])
+        ]), tokens=count_tokens(system_prompt))
+        metrics.observe("enricher.llm_ms", (time.perf_counter() - started_at) * 1000)
+        record_usage(ENRICHER, response)
         enriched = response.content.strip().replace('"', '')
         print(f"✨ [Enricher] '{raw_query}' -> '{enriched}'")
         return enriched
@@ -4,6 +4,12 @@ from pydantic import BaseModel, Field
 from langchain_groq import ChatGroq
 from langchain_core.messages import HumanMessage
 from langchain_core.output_parsers import JsonOutputParser
+from app.prompts import FOOD_ANALYZER
+from utils.llm_usage import record_usage
+from services.llm_scheduler import llm_scheduler, BACKGROUND
+
+# Rough prompt size of one image for the TPM bucket
+IMAGE_TOKENS = 1500
 
 class FoodAnalysis(BaseModel):
     name: str = Field(description="Concise name of the food item(s), e.g., 'Avocado Toast with Egg'")
@@ -16,7 +22,8 @@ async def analyze_food_image(base64_image: str) -> Optional[dict]:
         llm = ChatGroq(
             model="meta-llama/llama-4-scout-17b-16e-instruct", 
             api_key=os.getenv("GROQ_API_KEY"),
-            temperature=0.1
+            temperature=0.1,
+            max_retries=0, # Retries and 429 backoff happen in services.llm_scheduler
         )
         
         parser = JsonOutputParser(pydantic_object=FoodAnalysis)
@@ -24,7 +31,7 @@ async def analyze_food_image(base64_image: str) -> Optional[dict]:
         
         msg = HumanMessage(
             content=[
-                {"type": "text", "text": "Analyze this food image. Identify the meal and estimate the calories. Return ONLY valid JSON."},
+                {"type": "text", "text": FOOD_ANALYZER.text},
                 {
                     "type": "image_url", 
                     "image_url": {
@@ -36,7 +43,8 @@ async def analyze_food_image(base64_image: str) -> Optional[dict]:
         )
         
         # Invoke
-        response = await llm.ainvoke([msg])
+        response = await llm_scheduler.run("groq", lambda: llm.ainvoke([msg]), priority=BACKGROUND, tokens=IMAGE_TOKENS)
+        record_usage(FOOD_ANALYZER, response)
         
         # Parse
         parsed = parser.parse(response.content)
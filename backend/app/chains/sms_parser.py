@@ -3,6 +3,10 @@ from typing import Optional, List, Literal
 from pydantic import BaseModel, Field
 from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
+from app.prompts import SMS_PARSER
+from utils.llm_usage import record_usage
+from utils.token_budget import count_tokens
+from services.llm_scheduler import llm_scheduler, BACKGROUND
 
 class SMSExtraction(BaseModel):
     """Schema for extracting financial transaction details from SMS."""
@@ -34,18 +38,15 @@ llm = ChatGroq(
     model="llama-3.3-70b-versatile",
     api_key=os.getenv("GROQ_API_KEY"),
     temperature=0.0,
-    max_retries=2,
+    max_retries=0, # Retries and 429 backoff happen in services.llm_scheduler
 )
 
-structured_llm = llm.with_structured_output(SMSExtraction)
+# include_raw keeps the AIMessage around for token accounting
+structured_llm = llm.with_structured_output(SMSExtraction, include_raw=True)
 
+# Constant instructions first (provider prompt caching); the account list is the dynamic suffix
 prompt_template = ChatPromptTemplate.from_messages([
-    ("system", """You are an expert financial parser. 
-    Analyze the incoming SMS against the user's known accounts: {account_numbers}.
-    
-    If the SMS mentions an account number NOT in the list, extract it anyway.
-    Focus on accuracy for the 'amount' and 'merchant' fields.
-    """),
+    ("system", SMS_PARSER.render("Known accounts: {account_numbers}")),
     ("human", "{sms_body}"),
 ])
 
@@ -61,10 +62,14 @@ async def parse_sms(
         account_map = {acc.get("accountNumber"): acc.get("id") for acc in user_accounts}
         account_numbers_str = ", ".join(account_map.keys()) or "None registered"
 
-        result: SMSExtraction = await chain.ainvoke({
+        output = await llm_scheduler.run("groq", lambda: chain.ainvoke({
             "sms_body": sms_body,
             "account_numbers": account_numbers_str
-        })
+        }), priority=BACKGROUND, tokens=count_tokens(SMS_PARSER.text + sms_body))
+        record_usage(SMS_PARSER, output["raw"])
+        result: SMSExtraction = output["parsed"]
+        if result is None:
+            raise ValueError(output.get("parsing_error") or "SMS extraction returned nothing")
 
         if not result.is_transaction:
             print(f"Skipping: marked as non-transaction.")
@@ -1,41 +1,95 @@
 from app.services.memory_store import memory_store
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_groq import ChatGroq
+from app.prompts import MEMORY_ARCHIVIST
+from app.agents.fast_path import is_command
+from utils.llm_usage import record_usage
+from utils.token_budget import count_tokens
+from services.llm_scheduler import llm_scheduler, BACKGROUND
+from utils.metrics import metrics
+from typing import List, Optional
 import os
+import re
 
 llm = ChatGroq(
     model="llama-3.3-70b-versatile",
     api_key=os.getenv("GROQ_API_KEY"),
     temperature=0.1,
-    max_retries=2,
+    max_retries=0, # Retries and 429 backoff happen in services.llm_scheduler
 )
 
-async def summarize_and_store(user_query: str, ai_response: str, user_id: str):
+FILTER_ENABLED = os.getenv("SUMMARIZER_FILTER_ENABLED", "true").lower() == "true"
+
+# --- Local trivial-turn filter: turns that can't hold a fact never reach the LLM ---
+# Greetings, acks and small talk; a query made only of these words is skipped
+SMALL_TALK = {
+    "hi", "hii", "hey", "hello", "yo", "sup", "hola", "namaste", "morning", "evening", "night", "gm", "gn",
+    "good", "bye", "goodbye", "cya", "see", "you", "later", "thanks", "thank", "thx", "ty", "tysm",
+    "ok", "okay", "k", "kk", "cool", "nice", "great", "awesome", "perfect", "fine", "alright", "sure",
+    "yes", "yeah", "yep", "no", "nope", "nah", "got", "it", "lol", "haha", "hmm", "wow", "done", "np",
+    "welcome", "much", "so", "a", "lot", "very", "how", "are", "whats", "what's", "up", "dex", "bro",
+}
+# Device commands and read-only lookups: nothing new about the user is learned from them
+FACT_FREE_TOOLS = {
+    "client_open_app", "client_play_media", "client_set_timer", "client_set_alarm", "client_call_contact",
+    "client_sleep_tracking", "get_tasks", "get_journal_today", "get_health_dashboard", "get_transactions",
+    "get_memories", "get_accounts", "get_dev_profile", "get_period_info", "get_nutrition_today", "get_content",
+    "search_memory",
+}
+MIN_CHARS = 4
+
+def trivial_reason(user_query: str, tools: Optional[List[str]] = None) -> Optional[str]:
+    """Returns why a turn is fact-free, or None when the summarizer should look at it."""
+    text = user_query.lower().strip()
+    words = re.findall(r"[\w']+", text)
+    if len(re.sub(r"\W", "", text)) < MIN_CHARS and not re.search(r"\d", text):
+        return "short"
+    if words and all(w in SMALL_TALK for w in words):
+        return "small_talk"
+    # Only when the utterance is just the command: a fact can ride along with one
+    # ("play something calm, I failed my exam", "what's my gym code? btw I moved to Pune last week")
+    if tools and all(t in FACT_FREE_TOOLS for t in tools) and is_command(user_query):
+        return "tools"
+    return None
+
+def _record_skip(reason: Optional[str]) -> None:
+    metrics.incr("summarizer.skipped" if reason else "summarizer.called")
+    if reason:
+        metrics.incr(f"summarizer.reason.{reason}")
+    metrics.gauge("summarizer.skip_rate", round(metrics.ratio("summarizer.skipped", "summarizer.called"), 4))
+
+async def summarize_and_store(user_query: str, ai_response: str, user_id: str, tools: Optional[List[str]] = None):
     """
     Summarizes the interaction and saves ONLY meaningful facts to MemoryStore.
+    tools: names of the tools the turn invoked, for the trivial-turn filter.
     """
-    # 1. Ask LLM to extract facts
-    summary_prompt = f"""
-    Analyze this interaction between User and AI.
+    reason = trivial_reason(user_query, tools) if FILTER_ENABLED else None
+    _record_skip(reason)
+    if reason:
+        print(f"🗑️ [Background] Skipped {reason} turn without calling the summarizer.")
+        return
+
+    # 1. Ask LLM to extract facts (constant instructions first, for provider prompt caching)
+    interaction = f"""
     User: "{user_query}"
     AI: "{ai_response}"
-    
-    Task: Extract any meaningful facts, preferences, plans, or completed actions.
-    - If it's just chit-chat (e.g., "Hi", "Thanks"), return "NO_FACTS".
-    - If it's a specific fact, summarize it concisely.
-    
-    Example Output: "User prefers Python for backend."
     """
     
     # Use a small/fast model for this (e.g., Llama-3-8b or Haiku) to save cost/time
     # Assuming 'llm' is your ChatGroq/OpenAI instance
-    result = await llm.ainvoke([SystemMessage(content="You are a memory archivist."), HumanMessage(content=summary_prompt)])
+    result = await llm_scheduler.run(
+        "groq",
+        lambda: llm.ainvoke([SystemMessage(content=MEMORY_ARCHIVIST.text), HumanMessage(content=interaction)]),
+        priority=BACKGROUND,
+        tokens=count_tokens(MEMORY_ARCHIVIST.text + interaction),
+    )
+    record_usage(MEMORY_ARCHIVIST, result)
     content = result.content.strip()
 
     # 2. Store only if useful
     if content != "NO_FACTS":
-        print(f"🧠 [Background] Saving Memory: {content}")
-        await memory_store.add(
+        # Skipped or merged when the user already has a near-identical memory
+        outcome = await memory_store.remember(
             text=content,
             user_id=user_id,
             metadata={
@@ -43,5 +97,9 @@ async def summarize_and_store(user_query: str, ai_response: str, user_id: str):
                 "type": "automatic_memory"
             }
         )
+        if outcome:
+            print(f"🧠 [Background] Memory {outcome['status']} (similarity {outcome['similarity']:.2f}): {content}")
     else:
+        # What the local filter missed; candidates for new lexicon entries
+        metrics.incr("summarizer.no_facts")
         print(f"🗑️ [Background] Skipped trivial interaction.")
\ No newline at end of file
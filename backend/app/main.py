@@ -20,6 +20,8 @@ from app.auth.github import router as github_router
 from app.auth.slack import router as slack_router
 from app.journal.router import router as journal_router
 import app.core.fcm
+from utils.metrics import metrics
+from services.job_queue import job_queue
 
 app = FastAPI(lifespan=lifespan)
 
@@ -40,4 +42,17 @@ app.include_router(slack_router)
 
 @app.get("/")
 def root():
-    return {"message": "System Online"}
\ No newline at end of file
+    return {"message": "System Online"}
+
+@app.get("/metrics")
+async def get_metrics():
+    snapshot = metrics.snapshot()
+    # The job worker is a separate process; it publishes its own snapshot to Redis
+    try:
+        snapshot["jobs"] = {
+            "queue": await job_queue.stats(),
+            "workers": await job_queue.worker_snapshots(),
+        }
+    except Exception as e:
+        snapshot["jobs"] = {"error": str(e)}
+    return snapshot
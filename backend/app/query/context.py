@@ -0,0 +1,109 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Awaitable, TypeVar
+
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from core.lifespan import db
+from app.chains.enricher import enrich_query
+from app.chains.conversation_summary import get_summary
+from app.services.memory_store import memory_store
+from services.checkpointer import checkpointer, thread_config
+from utils.date_parser import annotate
+from utils.metrics import metrics
+
+# Pre-Brain context assembly. History, enrichment and a speculative memory search
+# run side by side, so time-to-first-token is bounded by the slowest step, not their sum.
+# Every step has its own timeout and a safe fallback; a slow step never fails the turn.
+# Older turns reach the prompt only through the rolling summary (chains/conversation_summary.py).
+
+HISTORY_TIMEOUT = float(os.getenv("CONTEXT_HISTORY_TIMEOUT", "1.0"))
+ENRICH_TIMEOUT = float(os.getenv("CONTEXT_ENRICH_TIMEOUT", "2.5"))
+MEMORY_TIMEOUT = float(os.getenv("CONTEXT_MEMORY_TIMEOUT", "1.5"))
+HISTORY_TURNS = int(os.getenv("CONTEXT_HISTORY_TURNS", "1"))
+MEMORY_LIMIT = int(os.getenv("CONTEXT_MEMORY_LIMIT", "3"))
+
+T = TypeVar("T")
+
+@dataclass
+class TurnContext:
+    history: List[BaseMessage] = field(default_factory=list)
+    summary: str = ""
+    search_query: str = ""
+    vector_context: List[str] = field(default_factory=list)
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        return self.history + [HumanMessage(content=self.search_query)]
+
+async def _step(name: str, coro: Awaitable[T], timeout: float, fallback: T) -> T:
+    started_at = time.perf_counter()
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        print(f"⏱️ [Context] {name} timed out after {timeout}s, continuing without it")
+        metrics.incr(f"context.{name}.timeout")
+        return fallback
+    except Exception as e:
+        print(f"⚠️ [Context] {name} failed: {e}")
+        metrics.incr(f"context.{name}.error")
+        return fallback
+    finally:
+        metrics.observe(f"context.{name}_ms", (time.perf_counter() - started_at) * 1000)
+
+async def fetch_history(uid: str) -> List[BaseMessage]:
+    # Hot path: the checkpointed thread (Redis, Postgres write-through) carries the compact history
+    saved = await checkpointer.aget_tuple(thread_config(uid))
+    history = saved.checkpoint["channel_values"].get("history") if saved else None
+    if history:
+        # A turn starts at its user message and includes tool results and client actions
+        starts = [i for i, m in enumerate(history) if m.type == "human"]
+        return history[starts[-HISTORY_TURNS]:] if len(starts) >= HISTORY_TURNS else history
+
+    # Threads that predate the checkpointer
+    metrics.incr("context.history.conversationlog")
+    recent_logs = await db.conversationlog.find_many(
+        where={"userId": uid},
+        order={"createdAt": "desc"},
+        take=HISTORY_TURNS
+    )
+
+    messages_list = []
+    for log in reversed(recent_logs):
+        messages_list.append(HumanMessage(content=log.userRaw))
+        messages_list.append(AIMessage(content=log.aiResponse))
+    return messages_list
+
+async def search_memories(raw_query: str, uid: str) -> List[str]:
+    results = await memory_store.search(raw_query, uid, limit=MEMORY_LIMIT)
+    return [r["text"] for r in results]
+
+async def assemble_context(raw_query: str, uid: str, now: datetime) -> TurnContext:
+    started_at = time.perf_counter()
+    # Resolve "tomorrow 5pm" locally against the user's clock; the LLMs only copy the result
+    resolved_query = annotate(raw_query, now)
+
+    history_task = asyncio.ensure_future(_step("history", fetch_history(uid), HISTORY_TIMEOUT, []))
+    summary_task = asyncio.ensure_future(_step("summary", get_summary(uid), HISTORY_TIMEOUT, ""))
+
+    async def enrich() -> str:
+        # Enrichment resolves pronouns against history, so it waits on the shared history tasks
+        history, summary = await asyncio.gather(history_task, summary_task)
+        return await _step("enrich", enrich_query(resolved_query, history, summary), ENRICH_TIMEOUT, resolved_query)
+
+    history, summary, search_query, memories = await asyncio.gather(
+        history_task,
+        summary_task,
+        enrich(),
+        _step("memory", search_memories(raw_query, uid), MEMORY_TIMEOUT, []),
+    )
+
+    metrics.observe("context.total_ms", (time.perf_counter() - started_at) * 1000)
+    return TurnContext(
+        history=history,
+        summary=summary,
+        search_query=search_query or resolved_query,
+        vector_context=memories,
+    )
@@ -1,6 +1,6 @@
 from app.query.service import QueryService
 from fastapi import UploadFile
-from app.query.schema import QueryRequest
+from app.query.schema import QueryRequest, ContinueRequest
 
 service = QueryService()
 
@@ -11,6 +11,9 @@ class QueryContoller:
     
     async def query_stream(self, query: QueryRequest, user: dict):
         return service.query_stream(query, user)
+
+    async def continue_stream(self, request: ContinueRequest, user: dict):
+        return service.continue_stream(request, user)
     
     async def voice_query(self, file: UploadFile):
         temp_path = await service.save_query(file)
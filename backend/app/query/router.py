@@ -3,7 +3,7 @@ from fastapi.responses import StreamingResponse
 from fastapi.param_functions import Depends
 from common.security import verify_token
 from app.query.controller import QueryContoller
-from app.query.schema import QueryRequest, QueryResponse, ConversationLogResponse
+from app.query.schema import QueryRequest, QueryResponse, ConversationLogResponse, ContinueRequest
 
 router = APIRouter(prefix="/query")
 
@@ -14,6 +14,11 @@ async def query(query: QueryRequest, user: dict = Depends(verify_token)):
     stream = await controller.query_stream(query, user)
     return StreamingResponse(stream, media_type="text/event-stream")
 
+@router.post("/continue")
+async def continue_query(request: ContinueRequest, user: dict = Depends(verify_token)):
+    stream = await controller.continue_stream(request, user)
+    return StreamingResponse(stream, media_type="text/event-stream")
+
 @router.post("/voice")
 async def voice_query(file: UploadFile = File(...)):
     response = await controller.voice_query(file)
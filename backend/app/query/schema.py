@@ -11,6 +11,15 @@ class QueryRequest(BaseModel):
     conversation_history: Optional[List[ConversationMessage]] = None
     timestamp: Optional[str] = None
 
+class ClientActionResult(BaseModel):
+    tool_call_id: Optional[str] = None
+    result: str
+    success: bool = True
+
+class ContinueRequest(BaseModel):
+    run_id: str
+    results: List[ClientActionResult]
+
 class QueryResponse(BaseModel):
     response: str
 
@@ -5,18 +5,81 @@ from core.lifespan import db
 import os
 from pathlib import Path
 from services.transcribe import voice_to_text
-from app.query.schema import QueryRequest
+from app.query.schema import QueryRequest, ContinueRequest
 from app.agents.master_agent import app as master_agent
 from app.agents.tools import CLIENT_TOOL_NAMES
 from langchain_core.messages import HumanMessage, AIMessage
-from app.chains.summarizer import summarize_and_store
-from app.chains.enricher import enrich_query
-from app.chains.enricher import enrich_query
+from langgraph.types import Command
+from services.job_queue import job_queue
+from app.query.context import assemble_context
+from services.checkpointer import thread_config, thread_lock, ThreadBusyError
+from app.agents import fast_path
+from utils.metrics import metrics
+from utils.date_parser import parse_client_timestamp
 import asyncio
 import json
+import time
+import uuid
 from typing import AsyncGenerator
 from datetime import datetime
 
+BUSY_RESPONSE = "I'm still working on your last message. Try again in a moment."
+
+# Nodes whose model output can be the user-facing answer
+STREAMING_NODES = {"brain", "search"}
+CONTROL_MARKERS = ("||DELEGATE||", "||SEARCH||")
+
+class ControlMarkerFilter:
+    """
+    Filters one model run's token stream.
+    Holds back any tail that could still turn into a control marker, and swallows
+    the rest of the run once a marker shows up (that output is routing, not an answer).
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.suppressed = False
+        self.emitted = False
+
+    def _held_back(self) -> int:
+        # Longest suffix of the buffer that is a prefix of a marker
+        for size in range(min(len(self.buffer), max(map(len, CONTROL_MARKERS))), 0, -1):
+            tail = self.buffer[-size:]
+            if any(m.startswith(tail) for m in CONTROL_MARKERS):
+                return size
+        return 0
+
+    def feed(self, text: str) -> str:
+        if self.suppressed:
+            return ""
+        self.buffer += text
+        if any(m in self.buffer for m in CONTROL_MARKERS):
+            self.suppressed = True
+            self.buffer = ""
+            return ""
+
+        hold = self._held_back()
+        out = self.buffer[:len(self.buffer) - hold]
+        self.buffer = self.buffer[len(self.buffer) - hold:]
+        if not self.emitted:
+            # Don't start the answer with the whitespace that precedes a marker
+            out = out.lstrip()
+            if not out:
+                return ""
+            self.emitted = True
+        return out
+
+    def flush(self) -> str:
+        out = "" if self.suppressed else self.buffer
+        self.buffer = ""
+        return out if self.emitted else out.lstrip()
+
+def _chunk_text(chunk) -> str:
+    content = getattr(chunk, "content", "")
+    if isinstance(content, list):
+        # Gemini can stream content parts
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return content or ""
+
 class QueryService:
     def __init__(self):
         self.download_dir = Path(__file__).resolve().parent.parent.parent / "downloads"
@@ -25,54 +88,68 @@ class QueryService:
 
     async def query(self, query: QueryRequest, user: dict):
         uid = user["uid"]
+        now = parse_client_timestamp(query.timestamp)
+
+        # 0. Fast Path (no LLM) for simple, unambiguous commands
+        hit = fast_path.match(query.query, now)
+        if hit:
+            if hit.is_client:
+                return {
+                    "type": "CLIENT_ACTION",
+                    "action": hit.tool_name.replace("client_", ""),
+                    "data": hit.args
+                }
+            try:
+                ai_text = await fast_path.execute(hit, uid)
+                await self._log_turn(query.query, ai_text, uid, tools=[hit.tool_name])
+                self._remember_turn(uid, query.query, ai_text)
+                return {"type": "TEXT", "response": ai_text}
+            except Exception as e:
+                print(f"⚠️ [FastPath] {hit.pattern} failed, falling back to graph: {e}")
         
         profile_str = "Name: Rishik, Role: Developer, Location: India"
         if query.timestamp:
             profile_str += f"\nUser Local Time: {query.timestamp}"
 
-        recent_logs = await db.conversationlog.find_many(
-            where={"userId": uid},
-            order={"createdAt": "desc"},
-            take=4
-        )
-        
-        messages_list = []
-        for log in reversed(recent_logs):
-            messages_list.append(HumanMessage(content=log.userRaw))
-            messages_list.append(AIMessage(content=log.aiResponse))
-        
-        # Add the current query
-
-        search_query = await enrich_query(query.query, messages_list)
-
-        messages_list.append(HumanMessage(content=search_query))
+        try:
+            # One turn per thread at a time
+            async with thread_lock(uid):
+                # History, enrichment and memory search run concurrently
+                ctx = await assemble_context(query.query, uid, now)
 
-        response = await master_agent.ainvoke(
-            {
-                "messages": messages_list,
-                "user_profile": profile_str,
-            },
-            config={"configurable": {"user_id": uid}}
-        )
+                turn_id = uuid.uuid4().hex
+                response = await master_agent.ainvoke(
+                    {
+                        "messages": ctx.messages,
+                        "user_profile": profile_str,
+                        "vector_context": ctx.vector_context,
+                        "conversation_summary": ctx.summary,
+                        "history": [HumanMessage(content=query.query)],
+                    },
+                    config=thread_config(uid, turn_id)
+                )
+        except ThreadBusyError:
+            return {"type": "TEXT", "response": BUSY_RESPONSE}
         
         ai_response = response['messages'][-1]
         print(ai_response)
-        print(ai_response.tool_calls)
+        print(getattr(ai_response, "tool_calls", None))
         
-        if hasattr(ai_response, 'tool_calls') and ai_response.tool_calls:
-            tool_call = ai_response.tool_calls[0]
-            tool_name = tool_call["name"]
+        # Paused at await_client: hand the first client action to the phone
+        paused = response.get("__interrupt__")
+        if paused:
+            tool_call = paused[0].value["client_calls"][0]
+            action_name = tool_call["name"].replace("client_", "")
             
-            if tool_name in CLIENT_TOOL_NAMES:
-                action_name = tool_name.replace("client_", "")
-                
-                result = {
-                    "type": "CLIENT_ACTION",
-                    "action": action_name,
-                    "data": tool_call["args"]
-                }
-                
-                return result
+            result = {
+                "type": "CLIENT_ACTION",
+                "action": action_name,
+                "data": tool_call["args"],
+                "run_id": turn_id,
+                "tool_call_id": tool_call["id"]
+            }
+            
+            return result
         
         # Normal text response
         ai_text = ai_response.content
@@ -82,77 +159,166 @@ class QueryService:
             "response": ai_text
         }
         
-        await db.conversationlog.create(
-            data={
-                "userRaw": query.query,
-                "aiResponse": ai_text,
-                "userId": uid
-            }
-        )
-        asyncio.create_task(
-            summarize_and_store(query.query, ai_text, uid)
-        )
+        # Only the last node's messages are in the result; an unseen tool just means no skip
+        tools = [m.name for m in response["messages"] if m.type == "tool"]
+        await self._log_turn(query.query, ai_text, uid, tools=tools)
         return result
 
     async def query_stream(self, query: QueryRequest, user: dict) -> AsyncGenerator[str, None]:
         uid = user["uid"]
+        started_at = time.perf_counter()
+        now = parse_client_timestamp(query.timestamp)
+
+        # 0. Fast Path (no LLM) for simple, unambiguous commands
+        hit = fast_path.match(query.query, now)
+        if hit:
+            print(f"⚡ [FastPath] '{query.query}' -> {hit.tool_name} {hit.args}")
+            if hit.is_client:
+                action_name = hit.tool_name.replace("client_", "")
+                yield f"data: {json.dumps({'type': 'CLIENT_ACTION', 'action': action_name, 'data': hit.args})}\n\n"
+                return
+            yield f"data: {json.dumps({'type': 'tool_start', 'tool': hit.tool_name, 'input': hit.args})}\n\n"
+            try:
+                ai_text = await fast_path.execute(hit, uid)
+            except Exception as e:
+                print(f"⚠️ [FastPath] {hit.pattern} failed, falling back to graph: {e}")
+                # Close the tool the client already shows before the graph takes over
+                yield f"data: {json.dumps({'type': 'tool_end', 'tool': hit.tool_name, 'output': f'Failed: {e}'[:200]})}\n\n"
+            else:
+                yield f"data: {json.dumps({'type': 'tool_end', 'tool': hit.tool_name, 'output': ai_text[:200]})}\n\n"
+                yield f"data: {json.dumps({'type': 'response', 'response': ai_text})}\n\n"
+                await self._log_turn(query.query, ai_text, uid, tools=[hit.tool_name])
+                self._remember_turn(uid, query.query, ai_text)
+                return
         
         # 1. Setup Context
         profile_str = "Name: Rishik, Role: Developer, Location: India"
         if query.timestamp:
             profile_str += f"\nUser Local Time: {query.timestamp}"
 
-        recent_logs = await db.conversationlog.find_many(
-            where={"userId": uid},
-            order={"createdAt": "desc"},
-            take=4
-        )
-        
-        messages_list = []
-        for log in reversed(recent_logs):
-            messages_list.append(HumanMessage(content=log.userRaw))
-            messages_list.append(AIMessage(content=log.aiResponse))
-        
-        # 2. Enrich Query (Emit thinking first)
-        yield f"data: {json.dumps({'type': 'status', 'content': 'Thinking...'})}\n\n"
-        search_query = await enrich_query(query.query, messages_list)
-        messages_list.append(HumanMessage(content=search_query))
+        try:
+            # One turn per thread at a time: a second one would overwrite this one's checkpoint
+            async with thread_lock(uid):
+                # 2. Assemble Context (Emit thinking first): history, enrichment and memory search run concurrently
+                yield f"data: {json.dumps({'type': 'status', 'content': 'Thinking...'})}\n\n"
+                ctx = await assemble_context(query.query, uid, now)
+
+                # 3. Stream Execution
+                turn_id = uuid.uuid4().hex
+                graph_input = {
+                    "messages": ctx.messages,
+                    "user_profile": profile_str,
+                    "vector_context": ctx.vector_context,
+                    "conversation_summary": ctx.summary,
+                    "history": [HumanMessage(content=query.query)],
+                }
+                async for chunk in self._stream_graph(graph_input, uid, turn_id, query.query, started_at):
+                    yield chunk
+        except ThreadBusyError:
+            yield f"data: {json.dumps({'type': 'response', 'response': BUSY_RESPONSE})}\n\n"
 
-        # 3. Stream Execution
+    async def continue_stream(self, request: ContinueRequest, user: dict) -> AsyncGenerator[str, None]:
+        """Resumes a turn paused on client actions with the phone's results (POST /query/continue)."""
+        uid = user["uid"]
+        started_at = time.perf_counter()
+
+        try:
+            async with thread_lock(uid):
+                # Only the turn that is actually waiting on the phone can be resumed
+                snapshot = await master_agent.aget_state(thread_config(uid))
+                if "await_client" not in snapshot.next or (snapshot.metadata or {}).get("turn_id") != request.run_id:
+                    print(f"⚠️ [Continue] Run {request.run_id} is not waiting on the phone")
+                    metrics.incr("query_continue.stale")
+                    yield f"data: {json.dumps({'type': 'response', 'response': 'That action is no longer pending.'})}\n\n"
+                    return
+
+                pending = {c["id"] for c in snapshot.values.get("client_calls", [])}
+                missing = pending - {r.tool_call_id for r in request.results}
+                if missing and not (len(pending) == 1 and len(request.results) == 1):
+                    # await_client marks these as not run
+                    print(f"⚠️ [Continue] Run {request.run_id} resumed without results for {sorted(missing)}")
+                    metrics.incr("query_continue.missing_results", len(missing))
+                metrics.incr("query_continue.resumed")
+                user_raw = next((m.content for m in reversed(snapshot.values.get("history", [])) if m.type == "human"), "")
+                resume = Command(resume=[r.model_dump() for r in request.results])
+                # The paused calls were streamed by the first request; count them as this turn's tools too
+                tools = [c["name"] for c in snapshot.values.get("client_calls", [])]
+                async for chunk in self._stream_graph(resume, uid, request.run_id, user_raw, started_at, metric="query_continue", tools=tools):
+                    yield chunk
+        except ThreadBusyError:
+            yield f"data: {json.dumps({'type': 'response', 'response': BUSY_RESPONSE})}\n\n"
+
+    async def _stream_graph(self, graph_input, uid: str, turn_id: str, user_raw: str,
+                            started_at: float, metric: str = "query_stream", tools: list = None) -> AsyncGenerator[str, None]:
         final_response_text = ""
-        is_client_action = False
+        tools_used = list(tools or [])
+        client_actions = []
+        awaiting_phone = False
+        ran_server_tools = False
+        used_direct_response = False
+        stream_filters = {}
+        first_token_at = None
         
         async for event in master_agent.astream_events(
-            {
-                "messages": messages_list,
-                "user_profile": profile_str,
-            },
-            config={"configurable": {"user_id": uid}},
+            graph_input,
+            config=thread_config(uid, turn_id),
             version="v2"
         ):
             kind = event["event"]
             name = event["name"]
-            
+            node = event.get("metadata", {}).get("langgraph_node")
+
+            # --- Token Streaming (Brain / Search answers only) ---
+            delta = ""
+            if kind == "on_chat_model_stream" and node in STREAMING_NODES:
+                run_filter = stream_filters.setdefault(event["run_id"], ControlMarkerFilter())
+                was_suppressed = run_filter.suppressed
+                delta = run_filter.feed(_chunk_text(event["data"].get("chunk")))
+
+                if run_filter.suppressed and not was_suppressed and run_filter.emitted:
+                    # Marker appeared after we already streamed some text
+                    yield f"data: {json.dumps({'type': 'delta_reset'})}\n\n"
+            elif kind == "on_chat_model_end" and event["run_id"] in stream_filters:
+                delta = stream_filters.pop(event["run_id"]).flush()
+
+            if delta:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    metrics.observe(f"{metric}.ttft_ms", (first_token_at - started_at) * 1000)
+                    print(f"⏱️ [Stream] First token after {(first_token_at - started_at) * 1000:.0f}ms")
+                yield f"data: {json.dumps({'type': 'delta', 'content': delta})}\n\n"
+
             # --- Check Intent / Final output ---
             if kind == "on_chat_model_end":
                 output = event["data"].get("output")
                 if output:
-                    # Check for Client Tools
+                    # Check for Client Tools (sent once the graph has paused for them)
                     if hasattr(output, "tool_calls") and output.tool_calls:
-                         for t_call in output.tool_calls:
-                             if t_call["name"] in CLIENT_TOOL_NAMES:
-                                 action_name = t_call["name"].replace("client_", "")
-                                 print(f"[BACKEND] Emitting CLIENT_ACTION: {action_name} at {datetime.now().isoformat()}")
-                                 yield f"data: {json.dumps({'type': 'CLIENT_ACTION', 'action': action_name, 'data': t_call['args']})}\n\n"
-                                 is_client_action = True
+                        client_actions += [t for t in output.tool_calls if t["name"] in CLIENT_TOOL_NAMES]
                     
                     # Capture content (could be from search_llm or master_llm final response)
                     if output.content:
                         final_response_text = output.content
 
+            # --- Cached Brain answers and direct tool responses never reach a model, take them from the node ---
+            if kind == "on_chain_end" and name in ("brain", "respond"):
+                output = event["data"].get("output") or {}
+                for msg in output.get("messages", []) if isinstance(output, dict) else []:
+                    meta = msg.response_metadata
+                    if (meta.get("cache_hit") or meta.get("direct_response")) and not any(m in str(msg.content) for m in CONTROL_MARKERS):
+                        final_response_text = msg.content
+                        used_direct_response = used_direct_response or bool(meta.get("direct_response"))
+
+            if kind == "on_chain_start" and name == "execute_server":
+                ran_server_tools = True
+            if kind == "on_chain_start" and name == "await_client" and client_actions:
+                # A resumed run re-enters await_client first; only a new pause counts
+                awaiting_phone = True
+
             # --- Tool Usage (Visuals) ---
             if kind == "on_tool_start":
                 if name and name not in ["_Exception", "__arg1"]: 
+                     tools_used.append(name)
                      yield f"data: {json.dumps({'type': 'tool_start', 'tool': name, 'input': event['data'].get('input')})}\n\n"
 
             elif kind == "on_tool_end":
@@ -168,27 +334,65 @@ class QueryService:
                  yield f"data: {json.dumps({'type': 'status', 'content': 'Searching the web...'})}\n\n"
 
         # 4. Finalize
-        if not is_client_action:
+        if ran_server_tools:
+            # Compare with DIRECT_RESPONSE_ENABLED=false to see what the skipped Brain pass costs
+            route = "direct" if used_direct_response else "brain"
+            metrics.observe(f"{metric}.tool_turn_ms.{route}", (time.perf_counter() - started_at) * 1000)
+
+        if client_actions:
+            # The run is checkpointed at await_client; the phone resumes it via /query/continue with run_id
+            for t_call in client_actions:
+                action_name = t_call["name"].replace("client_", "")
+                print(f"[BACKEND] Emitting CLIENT_ACTION: {action_name} at {datetime.now().isoformat()}")
+                event = {'type': 'CLIENT_ACTION', 'action': action_name, 'data': t_call['args']}
+                if awaiting_phone:
+                    event.update({'run_id': turn_id, 'tool_call_id': t_call['id']})
+                yield f"data: {json.dumps(event)}\n\n"
+            if awaiting_phone:
+                # Every action is out; the phone runs them all and posts the results in one /query/continue
+                pending = [t_call['id'] for t_call in client_actions]
+                yield f"data: {json.dumps({'type': 'await_client', 'run_id': turn_id, 'tool_call_ids': pending})}\n\n"
+        else:
             if final_response_text:
                 # Yield final text
                 yield f"data: {json.dumps({'type': 'response', 'response': final_response_text})}\n\n"
                 
                 # Save to DB
-                await db.conversationlog.create(
-                    data={
-                        "userRaw": query.query,
-                        "aiResponse": final_response_text,
-                        "userId": uid
-                    }
-                )
-                asyncio.create_task(
-                    summarize_and_store(query.query, final_response_text, uid)
-                )
+                await self._log_turn(user_raw, final_response_text, uid, tools=tools_used)
             else:
                 # Fallback if empty (shouldn't happen usually)
                 yield f"data: {json.dumps({'type': 'response', 'response': 'I processed that, but have nothing to say.'})}\n\n"
 
 
+    def _remember_turn(self, uid: str, user_raw: str, ai_text: str):
+        # Fast-path turns never enter the graph; append them to the checkpointed thread history
+        async def append():
+            try:
+                async with thread_lock(uid):
+                    await master_agent.aupdate_state(
+                        thread_config(uid),
+                        {"history": [HumanMessage(content=user_raw), AIMessage(content=ai_text)]},
+                        as_node="respond"
+                    )
+            except Exception as e:
+                print(f"⚠️ [Checkpoint] Could not append fast-path turn: {e}")
+        asyncio.create_task(append())
+
+    async def _log_turn(self, user_raw: str, ai_text: str, uid: str, tools: list = None):
+        log = await db.conversationlog.create(
+            data={
+                "userRaw": user_raw,
+                "aiResponse": ai_text,
+                "userId": uid
+            }
+        )
+        # Post-response work runs in the job worker (app/worker.py), not in the API process
+        await job_queue.enqueue("summarize_and_store", user_query=user_raw, ai_response=ai_text, user_id=uid, tools=tools or [])
+        # Keeps the rolling summary the next turn's prompt is built from; the log time orders the
+        # user's turns so a retried or overtaken fold is skipped
+        await job_queue.enqueue("update_summary", user_raw=user_raw, ai_response=ai_text, user_id=uid,
+                                turn_at=int(log.createdAt.timestamp() * 1000))
+
     async def save_query(self, file: UploadFile):
         temp_path = self.download_dir / f"temp_{file.filename}"
         
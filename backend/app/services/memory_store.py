@@ -3,18 +3,79 @@ import time
 import uuid
 import logging
 import asyncio
-from typing import Optional, List, Dict, Any
+from dataclasses import dataclass
+from typing import Awaitable, Optional, List, Dict, Any
 
-import chromadb
+import numpy as np
+from chromadb.api.models.AsyncCollection import AsyncCollection
 from chromadb.utils.embedding_functions import VoyageAIEmbeddingFunction
 
-from core.lifespan import chroma_client
+from core.lifespan import get_chroma_client, CHROMA_MAX_CONNECTIONS
+from services.embedding_cache import CachedEmbedder
+from utils.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Automatic memories (remember()) go through a novelty gate: each new fact is compared with
+# the user's nearest stored memories (and the rest of its batch) by cosine similarity.
+#   >= MEMORY_DUPLICATE_SIMILARITY -> skipped, it's already known
+#   >= MEMORY_MERGE_SIMILARITY     -> merged: the newer wording replaces the nearest memory
+#   otherwise                       -> inserted
+# Calls are micro-batched for MEMORY_BATCH_WINDOW_MS, so a burst of turns shares one
+# embedding request, one neighbour query per user and one collection.add.
+MEMORY_DUPLICATE_SIMILARITY = float(os.getenv("MEMORY_DUPLICATE_SIMILARITY", "0.95"))
+MEMORY_MERGE_SIMILARITY = float(os.getenv("MEMORY_MERGE_SIMILARITY", "0.88"))
+MEMORY_NOVELTY_NEIGHBORS = 3
+MEMORY_BATCH_WINDOW_MS = int(os.getenv("MEMORY_BATCH_WINDOW_MS", "250"))
+MEMORY_BATCH_MAX = 32
+
+# Bulk writes (add_many): documents are embedded in chunks of the provider's
+# batch limit, MEMORY_EMBED_CONCURRENCY chunks at a time, and each chunk is one Chroma write.
+EMBED_BATCH_SIZE = int(os.getenv("MEMORY_EMBED_BATCH_SIZE", "128"))
+EMBED_CONCURRENCY = int(os.getenv("MEMORY_EMBED_CONCURRENCY", "4"))
+
+# Chroma calls go through the async HTTP client's pooled keep-alive connections (core/lifespan.py)
+# and are bounded per operation, so a stalled Chroma fails the call instead of hanging the request.
+# At most CHROMA_MAX_CONNECTIONS calls are in flight; the rest wait here rather than in httpx's
+# pool, whose queue gets expensive to schedule when hundreds of requests pile up in it.
+CHROMA_QUERY_TIMEOUT = float(os.getenv("CHROMA_QUERY_TIMEOUT", "5"))
+CHROMA_WRITE_TIMEOUT = float(os.getenv("CHROMA_WRITE_TIMEOUT", "30"))
+CHROMA_DELETE_TIMEOUT = float(os.getenv("CHROMA_DELETE_TIMEOUT", "10"))
+
+ADDED, MERGED, SKIPPED = "added", "merged", "skipped"
+
+# The event loop only holds weak references to tasks; a flush nobody references could be
+# garbage-collected mid-write and lose its batch
+_flush_tasks: "set[asyncio.Task]" = set()
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _flush_tasks.add(task)
+    task.add_done_callback(_flush_tasks.discard)
+    return task
+
+@dataclass
+class _PendingMemory:
+    text: str
+    user_id: str
+    metadata: Dict[str, Any]
+    future: asyncio.Future
+
+@dataclass
+class _Candidate:
+    id: str
+    embedding: np.ndarray
+    metadata: Dict[str, Any]
+
+def _unit(vectors) -> np.ndarray:
+    arr = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.where(norms == 0, 1, norms)
+
 class MemoryStore:
     def __init__(self):
-        self.client = chroma_client
+        self.client = None
+        self.collection: Optional[AsyncCollection] = None
         self.collection_name = "memory"
         
         voyage_api_key = os.getenv("CHROMA_VOYAGE_API_KEY") or os.getenv("VOYAGE_API_KEY")
@@ -26,61 +87,265 @@ class MemoryStore:
                 api_key=voyage_api_key,
                 model_name="voyage-3"
             )
+        # Every embedding this store needs goes through the shared content-hash cache
+        self.embedder = CachedEmbedder("voyage-3", lambda: self.embedding_fn)
 
-        try:
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                embedding_function=self.embedding_fn
-            )
-            print(f"✅ Connected to ChromaDB collection: '{self.collection_name}'")
-        except Exception as e:
-            logger.error(f"❌ Failed to get collection '{self.collection_name}': {e}")
-            self.collection = None
+        self._collection_lock: Optional[asyncio.Lock] = None
+        self._chroma_slots = asyncio.Semaphore(CHROMA_MAX_CONNECTIONS)
+        self._pending: List[_PendingMemory] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_batch_size: Optional[int] = None
+
+    async def _get_collection(self) -> Optional[AsyncCollection]:
+        """
+        Opens the collection on first use (the async client needs a running loop).
+        Returns None while Chroma is unreachable; the next call tries again.
+        """
+        if self.collection is not None:
+            return self.collection
+        if self._collection_lock is None:
+            self._collection_lock = asyncio.Lock()
+        async with self._collection_lock:
+            if self.collection is None:
+                try:
+                    self.client = await get_chroma_client()
+                    self.collection = await self._chroma(
+                        self.client.get_or_create_collection(
+                            name=self.collection_name,
+                            embedding_function=self.embedding_fn
+                        ),
+                        CHROMA_QUERY_TIMEOUT,
+                    )
+                    print(f"✅ Connected to ChromaDB collection: '{self.collection_name}'")
+                except Exception as e:
+                    logger.error(f"❌ Failed to get collection '{self.collection_name}': {e}")
+        return self.collection
+
+    async def _chroma(self, call: Awaitable, timeout: float):
+        """Awaits one Chroma request once a pooled connection is free, failing after timeout."""
+        async with self._chroma_slots:
+            return await asyncio.wait_for(call, timeout)
 
     async def add(self, text: str, user_id: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
         Adds a text memory asynchronously.
-        Uses asyncio.to_thread to prevent blocking the event loop.
         """
-        if not self.collection:
+        ids = await self.add_many([text], user_id, [metadata or {}])
+        return ids[0] if ids else None
+
+    async def add_many(self, texts: List[str], user_id: str, metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """
+        Adds many memories with chunked, concurrent embedding and bulk writes.
+        Returns the ids that were written; a failed chunk is logged and left out.
+        """
+        ids = [str(uuid.uuid4()) for _ in texts]
+        return await self._write_many(ids, texts, user_id, metadatas)
+
+    async def _embed(self, texts: List[str]) -> Optional[List[Any]]:
+        """Embeds in chunks of EMBED_BATCH_SIZE. None lets the collection embed on write."""
+        if not self.embedding_fn:
             return None
+        embeddings = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            embeddings.extend(await self.embedder.aembed(texts[start:start + EMBED_BATCH_SIZE]))
+        return embeddings
+
+    async def _chunk_size(self) -> int:
+        if self._write_batch_size is None:
+            try:
+                self._write_batch_size = await self._chroma(self.client.get_max_batch_size(), CHROMA_QUERY_TIMEOUT)
+            except Exception:
+                self._write_batch_size = 5000
+        return max(1, min(EMBED_BATCH_SIZE, self._write_batch_size))
+
+    async def _write_many(self, ids: List[str], texts: List[str], user_id: str,
+                          metadatas: Optional[List[Dict[str, Any]]]) -> List[str]:
+        if not texts or not await self._get_collection():
+            return []
 
-        mem_id = str(uuid.uuid4())
         timestamp = int(time.time())
-        
-        final_metadata = {
-            "user_id": user_id,
-            "created_at": timestamp
-        }
-        if metadata:
-            final_metadata.update(metadata)
+        final_metadatas = []
+        for metadata in metadatas or [{}] * len(texts):
+            final_metadata = {"user_id": user_id, "created_at": timestamp}
+            final_metadata.update(metadata or {})
+            final_metadatas.append(final_metadata)
 
-        try:
-            await asyncio.to_thread(
-                self.collection.add,
-                ids=[mem_id],
-                documents=[text],
-                metadatas=[final_metadata]
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        size = await self._chunk_size()
+
+        async def write_chunk(start: int, embeddings: Optional[List[Any]]):
+            end = start + size
+            await self._chroma(
+                self.collection.add(
+                    ids=ids[start:end],
+                    documents=texts[start:end],
+                    metadatas=final_metadatas[start:end],
+                    **({"embeddings": embeddings} if embeddings is not None else {}),
+                ),
+                CHROMA_WRITE_TIMEOUT,
             )
-            return mem_id
-        except Exception as e:
-            logger.error(f"Error adding memory: {e}")
+
+        async def run_chunk(start: int) -> List[str]:
+            async with semaphore:
+                try:
+                    embeddings = await self._embed(texts[start:start + size])
+                    await write_chunk(start, embeddings)
+                    return ids[start:start + size]
+                except Exception as e:
+                    logger.error(f"Error writing memories {start}-{start + size}: {e}")
+                    metrics.incr("memory.bulk.error")
+                    return []
+
+        started_at = time.perf_counter()
+        written = [mid for chunk in await asyncio.gather(*[run_chunk(start) for start in range(0, len(texts), size)]) for mid in chunk]
+        metrics.incr("memory.bulk.add", len(written))
+        metrics.observe("memory.bulk.add_ms", (time.perf_counter() - started_at) * 1000)
+        return written
+
+    async def remember(self, text: str, user_id: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Stores an automatic memory unless the user already has it (see the novelty gate above).
+        Returns {"status": added|merged|skipped, "id": ..., "similarity": ...}.
+        Raises if the batch could not be written, so the caller's job is retried.
+        """
+        if not self.embedding_fn or not await self._get_collection():
             return None
 
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_PendingMemory(text=text, user_id=user_id, metadata=metadata or {}, future=future))
+        if len(self._pending) >= MEMORY_BATCH_MAX:
+            self._flush_now()
+        elif self._flush_task is None:
+            self._flush_task = _spawn(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(MEMORY_BATCH_WINDOW_MS / 1000)
+        self._flush_task = None
+        await self._flush(self._take_batch())
+
+    def _flush_now(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        _spawn(self._flush(self._take_batch()))
+
+    def _take_batch(self) -> List[_PendingMemory]:
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def _flush(self, batch: List[_PendingMemory]):
+        if not batch:
+            return
+        started_at = time.perf_counter()
+        try:
+            embeddings = _unit(await self._embed([item.text for item in batch]))
+            outcomes = await self._write_batch(batch, embeddings)
+        except Exception as e:
+            logger.error(f"Error writing memory batch: {e}")
+            metrics.incr("memory.batch.error")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        finally:
+            metrics.observe("memory.batch.flush_ms", (time.perf_counter() - started_at) * 1000)
+
+        metrics.observe("memory.batch.size", len(batch))
+        for item, outcome in zip(batch, outcomes):
+            metrics.incr(f"memory.novelty.{outcome['status']}")
+            if not item.future.done():
+                item.future.set_result(outcome)
+
+    async def _nearest(self, user_id: str, embeddings: np.ndarray) -> List[List[_Candidate]]:
+        """The user's stored memories closest to each embedding (one query for the whole group)."""
+        results = await self._chroma(
+            self.collection.query(
+                query_embeddings=embeddings.tolist(),
+                n_results=MEMORY_NOVELTY_NEIGHBORS,
+                where={"user_id": user_id},
+                include=["embeddings", "metadatas"],
+            ),
+            CHROMA_QUERY_TIMEOUT,
+        )
+        neighbours = []
+        for ids, embs, metas in zip(results["ids"], results["embeddings"], results["metadatas"]):
+            unit = _unit(embs) if len(ids) else []
+            neighbours.append([_Candidate(id=mid, embedding=unit[i], metadata=metas[i] or {}) for i, mid in enumerate(ids)])
+        return neighbours
+
+    async def _write_batch(self, batch: List[_PendingMemory], embeddings: np.ndarray) -> List[Dict[str, Any]]:
+        timestamp = int(time.time())
+
+        by_user: Dict[str, List[int]] = {}
+        for i, item in enumerate(batch):
+            by_user.setdefault(item.user_id, []).append(i)
+
+        outcomes: List[Dict[str, Any]] = [None] * len(batch)
+        inserts: Dict[str, Dict[str, Any]] = {}   # id -> row for collection.add
+        updates: Dict[str, Dict[str, Any]] = {}   # id -> row for collection.update
+        for user_id, indices in by_user.items():
+            stored = await self._nearest(user_id, embeddings[indices])
+            accepted: List[_Candidate] = []        # this batch's new memories, so repeats within it merge too
+            known: Dict[str, _Candidate] = {}       # one object per stored id, so merges within the batch stack
+            for i, neighbours in zip(indices, stored):
+                neighbours = [known.setdefault(c.id, c) for c in neighbours]
+                item, embedding = batch[i], embeddings[i]
+                best, similarity = None, -1.0
+                for candidate in neighbours + accepted:
+                    score = float(candidate.embedding @ embedding)
+                    if score > similarity:
+                        best, similarity = candidate, score
+
+                if best is not None and similarity >= MEMORY_DUPLICATE_SIMILARITY:
+                    outcomes[i] = {"status": SKIPPED, "id": best.id, "similarity": similarity}
+                    continue
+
+                if best is not None and similarity >= MEMORY_MERGE_SIMILARITY:
+                    metadata = {**best.metadata, "updated_at": timestamp, "mentions": int(best.metadata.get("mentions", 1)) + 1}
+                    row = {"document": item.text, "embedding": embedding, "metadata": metadata}
+                    (inserts if best.id in inserts else updates)[best.id] = row
+                    best.embedding, best.metadata = embedding, metadata
+                    outcomes[i] = {"status": MERGED, "id": best.id, "similarity": similarity}
+                    continue
+
+                mem_id = str(uuid.uuid4())
+                metadata = {**item.metadata, "user_id": user_id, "created_at": timestamp}
+                inserts[mem_id] = {"document": item.text, "embedding": embedding, "metadata": metadata}
+                accepted.append(_Candidate(id=mem_id, embedding=embedding, metadata=metadata))
+                outcomes[i] = {"status": ADDED, "id": mem_id, "similarity": max(similarity, 0.0)}
+
+        for write, rows in ((self.collection.add, inserts), (self.collection.update, updates)):
+            if rows:
+                await self._chroma(
+                    self.collection.add(
+                        ids=list(rows),
+                        documents=[r["document"] for r in rows.values()],
+                        embeddings=[r["embedding"].tolist() for r in rows.values()],
+                        metadatas=[r["metadata"] for r in rows.values()],
+                    ),
+                    CHROMA_WRITE_TIMEOUT,
+                )
+        return outcomes
+
     async def search(self, query: str, user_id: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Semantic search asynchronously.
         """
-        if not self.collection:
+        if not await self._get_collection():
             return []
 
         try:
-            # Run the blocking sync call in a thread
-            results = await asyncio.to_thread(
-                self.collection.query,
-                query_texts=[query],
-                n_results=limit,
-                where={"user_id": user_id}
+            # Repeated searches reuse the cached query embedding
+            embeddings = await self._embed([query])
+            query_input = {"query_embeddings": embeddings} if embeddings is not None else {"query_texts": [query]}
+            results = await self._chroma(
+                self.collection.query(
+                    n_results=limit,
+                    where={"user_id": user_id},
+                    **query_input
+                ),
+                CHROMA_QUERY_TIMEOUT,
             )
 
             formatted_results = []
@@ -107,14 +372,16 @@ class MemoryStore:
         """
         Deletes a memory asynchronously.
         """
-        if not self.collection:
+        if not await self._get_collection():
             return False
 
         try:
-            await asyncio.to_thread(
-                self.collection.delete,
-                ids=[memory_id],
-                where={"user_id": user_id}
+            await self._chroma(
+                self.collection.delete(
+                    ids=[memory_id],
+                    where={"user_id": user_id}
+                ),
+                CHROMA_DELETE_TIMEOUT,
             )
             return True
         except Exception as e:
@@ -0,0 +1,173 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import os
+import json
+import time
+import signal
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict
+
+from core.lifespan import db, redis, redis_raw
+from services.job_queue import job_queue, JobQueue, Job, JOB_MAX_ATTEMPTS, WORKER_METRICS_PREFIX, consumer_name
+from services.llm_scheduler import llm_scheduler, WORKER_QUOTA_SHARE
+from app.chains.summarizer import summarize_and_store
+from app.chains.conversation_summary import update_summary
+from utils.metrics import metrics
+
+# Background job worker: `python -m app.worker` (the `jobs` service in docker-compose).
+# Runs the post-response work the API enqueues (services/job_queue.py) with at most
+# JOB_CONCURRENCY jobs in flight. Several workers can share the stream; each job goes to one.
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_BLOCK_MS = 5000
+JOB_CLAIM_INTERVAL = 5.0        # seconds between sweeps for failed / orphaned jobs
+JOB_REPORT_INTERVAL = 15.0      # seconds between metric publishes
+JOB_SHUTDOWN_GRACE = float(os.getenv("JOB_SHUTDOWN_GRACE", "30"))
+THROUGHPUT_WINDOW = 60.0
+
+JOB_HANDLERS: Dict[str, Callable[..., Awaitable]] = {
+    "summarize_and_store": summarize_and_store,
+    "update_summary": update_summary,
+}
+
+class JobWorker:
+    def __init__(self, handlers: Dict[str, Callable[..., Awaitable]] = JOB_HANDLERS,
+                 queue: JobQueue = job_queue, concurrency: int = JOB_CONCURRENCY, consumer: str = None):
+        self.handlers = handlers
+        self.queue = queue
+        self.concurrency = concurrency
+        self.consumer = consumer or consumer_name()
+        self.in_flight: set = set()
+        self.finished_at: deque = deque()
+        self.stopping = asyncio.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def _report_throughput(self):
+        cutoff = time.monotonic() - THROUGHPUT_WINDOW
+        while self.finished_at and self.finished_at[0] < cutoff:
+            self.finished_at.popleft()
+        metrics.gauge("jobs.throughput_per_min", len(self.finished_at) * 60 / THROUGHPUT_WINDOW)
+        metrics.gauge("jobs.in_flight", len(self.in_flight))
+
+    async def process(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            print(f"⚠️ [Jobs] No handler for {job.kind!r}, dead-lettering {job.id}")
+            await self.queue.dead_letter(job, "no handler")
+            return
+
+        started_at = time.perf_counter()
+        if job.attempts == 1:
+            # Time spent waiting in the stream before a worker picked it up
+            metrics.observe(f"jobs.{job.kind}.lag_ms", max(0, time.time() * 1000 - job.enqueued_at_ms))
+        try:
+            await handler(**job.payload)
+        except Exception as e:
+            metrics.incr(f"jobs.failed.{job.kind}")
+            if job.attempts >= JOB_MAX_ATTEMPTS:
+                print(f"❌ [Jobs] {job.kind} {job.id} failed {job.attempts} times, dead-lettering: {e}")
+                await self.queue.dead_letter(job, f"{type(e).__name__}: {e}")
+            else:
+                # Left pending; claim_stale hands it out again once it has been idle long enough
+                print(f"⚠️ [Jobs] {job.kind} {job.id} failed (attempt {job.attempts}/{JOB_MAX_ATTEMPTS}): {e}")
+                metrics.incr(f"jobs.retried.{job.kind}")
+            return
+        finally:
+            metrics.observe(f"jobs.{job.kind}.run_ms", (time.perf_counter() - started_at) * 1000)
+
+        await self.queue.ack(job)
+        metrics.incr(f"jobs.done.{job.kind}")
+        self.finished_at.append(time.monotonic())
+
+    def _start(self, job: Job):
+        async def guarded():
+            try:
+                await self.process(job)
+            except Exception as e:
+                # ack / dead-letter failed (Redis hiccup); the job stays pending and is re-claimed
+                print(f"⚠️ [Jobs] Could not settle {job.id}: {e}")
+
+        task = asyncio.create_task(guarded())
+        self.in_flight.add(task)
+        task.add_done_callback(self.in_flight.discard)
+
+    async def _next_jobs(self, count: int, claim: bool):
+        if claim:
+            jobs = await self.queue.claim_stale(self.consumer, count)
+            if jobs:
+                return jobs
+        return await self.queue.read(self.consumer, count, JOB_BLOCK_MS)
+
+    async def _publish_metrics(self):
+        while True:
+            try:
+                self._report_throughput()
+                for name, value in (await self.queue.stats()).items():
+                    metrics.gauge(f"jobs.{name}", value)
+                await redis.set(f"{WORKER_METRICS_PREFIX}{self.consumer}", json.dumps(metrics.snapshot()), ex=int(JOB_REPORT_INTERVAL * 4))
+            except Exception as e:
+                print(f"⚠️ [Jobs] Could not publish metrics: {e}")
+            await asyncio.sleep(JOB_REPORT_INTERVAL)
+
+    async def run(self):
+        await self.queue.ensure_group()
+        print(f"👷 [Jobs] Worker {self.consumer} started (concurrency {self.concurrency})")
+        reporter = asyncio.create_task(self._publish_metrics())
+        last_claim = 0.0
+        try:
+            while not self.stopping.is_set():
+                if len(self.in_flight) >= self.concurrency:
+                    await asyncio.wait(self.in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                claim = time.monotonic() - last_claim >= JOB_CLAIM_INTERVAL
+                if claim:
+                    last_claim = time.monotonic()
+                try:
+                    jobs = await self._next_jobs(self.concurrency - len(self.in_flight), claim)
+                except Exception as e:
+                    print(f"⚠️ [Jobs] Could not read jobs: {e}")
+                    await asyncio.sleep(1)
+                    continue
+                for job in jobs:
+                    self._start(job)
+                self._report_throughput()
+        finally:
+            reporter.cancel()
+            if self.in_flight:
+                print(f"⏳ [Jobs] Waiting for {len(self.in_flight)} running job(s)")
+                # Anything still running after the grace period stays pending and is re-claimed
+                await asyncio.wait(self.in_flight, timeout=JOB_SHUTDOWN_GRACE)
+
+async def main():
+    # Background work only gets the worker's share of each provider's limits; with nothing
+    # interactive in this process, none of that share is held back for interactive calls
+    llm_scheduler.configure(share=WORKER_QUOTA_SHARE, background_reserve=0.0)
+    print(f"🚦 [Jobs] LLM quota share {WORKER_QUOTA_SHARE:.0%}")
+    await db.connect()
+    print("✅ Database connected")
+    await redis.ping()
+    print("✅ Redis connected")
+
+    worker = JobWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await db.disconnect()
+        print("❌ Database disconnected")
+        await redis.close()
+        await redis_raw.close()
+        print("❌ Redis disconnected")
+
+if __name__ == "__main__":
+    asyncio.run(main())
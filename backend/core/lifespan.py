@@ -1,9 +1,13 @@
 import os
+import asyncio
 from contextlib import asynccontextmanager
+from typing import Optional
 from prisma import Prisma
 from redis.asyncio import Redis
 from .firebase import initialize_firebase
 import chromadb
+from chromadb.config import Settings
+from chromadb.api import AsyncClientAPI
 
 db = Prisma()
 
@@ -14,11 +18,40 @@ redis = Redis(
     decode_responses=True
 )
 
-chroma_client = chromadb.HttpClient(
-    host=os.getenv("CHROMA_HOST", "localhost"), 
-    port=int(os.getenv("CHROMA_PORT", 8001))
+# Same server, raw bytes in/out (serialized graph checkpoints, packed vectors)
+redis_raw = Redis(
+    host=os.getenv("REDIS_HOST", "localhost"),
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=0,
+    decode_responses=False
 )
 
+# Async Chroma HTTP client over one pooled keep-alive httpx connection pool.
+# It has to be created inside the running event loop, so it is opened on first use
+# (the API's lifespan, or the job worker's first memory write).
+CHROMA_MAX_CONNECTIONS = int(os.getenv("CHROMA_MAX_CONNECTIONS", "32"))
+CHROMA_KEEPALIVE_SECS = float(os.getenv("CHROMA_KEEPALIVE_SECS", "60"))
+
+_chroma_client: Optional[AsyncClientAPI] = None
+_chroma_lock = asyncio.Lock()
+
+async def get_chroma_client() -> AsyncClientAPI:
+    global _chroma_client
+    if _chroma_client is None:
+        async with _chroma_lock:
+            if _chroma_client is None:
+                _chroma_client = await chromadb.AsyncHttpClient(
+                    host=os.getenv("CHROMA_HOST", "localhost"),
+                    port=int(os.getenv("CHROMA_PORT", 8001)),
+                    settings=Settings(
+                        anonymized_telemetry=False,
+                        chroma_http_keepalive_secs=CHROMA_KEEPALIVE_SECS,
+                        chroma_http_max_connections=CHROMA_MAX_CONNECTIONS,
+                        chroma_http_max_keepalive_connections=CHROMA_MAX_CONNECTIONS,
+                    ),
+                )
+    return _chroma_client
+
 @asynccontextmanager
 async def lifespan(app):
     """
@@ -32,7 +65,8 @@ async def lifespan(app):
     print("✅ Redis connected")
     
     try:
-        chroma_client.heartbeat()
+        chroma = await get_chroma_client()
+        await chroma.heartbeat()
         print(f"✅ ChromaDB connected")
     except Exception as e:
         print(f"❌ ChromaDB failed. Error: {e}")
@@ -47,6 +81,7 @@ async def lifespan(app):
     print("❌ Database disconnected")
 
     await redis.close()
+    await redis_raw.close()
     print("❌ Redis disconnected")
 
-__all__ = ["db", "lifespan", "redis"]
\ No newline at end of file
+__all__ = ["db", "lifespan", "redis", "redis_raw", "get_chroma_client"]
\ No newline at end of file
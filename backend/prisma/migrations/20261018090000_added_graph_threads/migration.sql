@@ -0,0 +1,17 @@
+-- CreateTable
+CREATE TABLE "GraphThread" (
+    "id" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "checkpointNs" TEXT NOT NULL DEFAULT '',
+    "checkpointId" TEXT NOT NULL,
+    "payload" TEXT NOT NULL,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "GraphThread_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "GraphThread_userId_checkpointNs_key" ON "GraphThread"("userId", "checkpointNs");
+
+-- AddForeignKey
+ALTER TABLE "GraphThread" ADD CONSTRAINT "GraphThread_userId_fkey" FOREIGN KEY ("userId") REFERENCES "User"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,15 @@
+-- CreateTable
+CREATE TABLE "ConversationSummary" (
+    "id" TEXT NOT NULL,
+    "userId" TEXT NOT NULL,
+    "summary" TEXT NOT NULL,
+    "updatedAt" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "ConversationSummary_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "ConversationSummary_userId_key" ON "ConversationSummary"("userId");
+
+-- AddForeignKey
+ALTER TABLE "ConversationSummary" ADD CONSTRAINT "ConversationSummary_userId_fkey" FOREIGN KEY ("userId") REFERENCES "User"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "ConversationSummary" ADD COLUMN     "lastTurnAt" BIGINT;
@@ -0,0 +1,2 @@
+-- AlterTable
+ALTER TABLE "GraphThread" ADD COLUMN     "writes" TEXT;
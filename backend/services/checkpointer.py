@@ -0,0 +1,305 @@
+import os
+import json
+import base64
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from redis.exceptions import LockError
+
+from core.lifespan import db, redis, redis_raw
+from utils.metrics import metrics
+
+# LangGraph checkpointer for per-user conversation threads.
+# Only the latest checkpoint of each thread is kept: Redis serves the hot path (with a TTL),
+# Postgres gets an asynchronous, coalesced write-through so a thread survives Redis eviction.
+# The write-through includes the checkpoint's pending writes, which hold a paused turn's interrupt.
+
+CHECKPOINT_TTL = int(os.getenv("CHECKPOINT_TTL", str(7 * 24 * 3600)))
+PERSIST_ENABLED = os.getenv("CHECKPOINT_PERSIST_ENABLED", "true").lower() == "true"
+# A user's turns share one thread and run one at a time (see thread_lock)
+THREAD_LOCK_TIMEOUT = int(os.getenv("THREAD_LOCK_TIMEOUT", "120"))  # held at most this long (s)
+THREAD_LOCK_WAIT = float(os.getenv("THREAD_LOCK_WAIT", "30"))       # a second turn waits this long (s)
+
+STATE_PREFIX = "graph_state:"
+WRITES_PREFIX = "graph_writes:"
+LOCK_PREFIX = "graph_lock:"
+
+class ThreadBusyError(Exception):
+    """Another turn of the same user still holds the thread."""
+
+@asynccontextmanager
+async def thread_lock(user_id: str):
+    """
+    Runs one turn of a user's thread at a time. Two concurrent runs would each
+    write their own checkpoint over the other's. The lock lives in Redis, so it
+    also holds across processes; its timeout frees it if a holder dies.
+    """
+    lock = redis.lock(f"{LOCK_PREFIX}{user_id}", timeout=THREAD_LOCK_TIMEOUT, blocking_timeout=THREAD_LOCK_WAIT)
+    waited_at = asyncio.get_running_loop().time()
+    if not await lock.acquire():
+        metrics.incr("checkpoint.lock_timeout")
+        raise ThreadBusyError(user_id)
+    metrics.observe("checkpoint.lock_wait_ms", (asyncio.get_running_loop().time() - waited_at) * 1000)
+    try:
+        yield
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            # Held past THREAD_LOCK_TIMEOUT; it has already expired
+            metrics.incr("checkpoint.lock_expired")
+
+def thread_config(user_id: str, turn_id: Optional[str] = None) -> RunnableConfig:
+    """Graph config for a user's thread. Tools read user_id; the checkpointer keys on it too.
+    turn_id is copied into checkpoint metadata, which lets /query/continue check it resumes the right turn."""
+    configurable = {"user_id": user_id, "thread_id": user_id}
+    if turn_id:
+        configurable["turn_id"] = turn_id
+    return {"configurable": configurable}
+
+def _pack(typed: Tuple[str, bytes]) -> bytes:
+    return typed[0].encode() + b"|" + typed[1]
+
+def _unpack(raw: bytes) -> Tuple[str, bytes]:
+    type_, _, data = raw.partition(b"|")
+    return type_.decode(), data
+
+class RedisCheckpointSaver(BaseCheckpointSaver):
+    def __init__(self, ttl: int = CHECKPOINT_TTL):
+        super().__init__()
+        self.ttl = ttl
+        # Write-through state: latest unsaved snapshot per thread + the task flushing it
+        self._pending: Dict[Tuple[str, str], Tuple[str, Dict[bytes, bytes]]] = {}
+        self._flushing: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    # --- Keys ---
+
+    @staticmethod
+    def _thread(config: RunnableConfig) -> Tuple[str, str]:
+        conf = config.get("configurable", {})
+        return str(conf.get("user_id") or conf["thread_id"]), conf.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _state_key(user_id: str, ns: str) -> str:
+        return f"{STATE_PREFIX}{user_id}:{ns}"
+
+    @staticmethod
+    def _writes_key(user_id: str, ns: str, checkpoint_id: str) -> str:
+        return f"{WRITES_PREFIX}{user_id}:{ns}:{checkpoint_id}"
+
+    @staticmethod
+    def _config(user_id: str, ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {"user_id": user_id, "thread_id": user_id, "checkpoint_ns": ns, "checkpoint_id": checkpoint_id}}
+
+    # --- Read ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        user_id, ns = self._thread(config)
+        data = await redis_raw.hgetall(self._state_key(user_id, ns))
+        if data:
+            metrics.incr("checkpoint.redis_hit")
+        else:
+            data = await self._load_persisted(user_id, ns)
+            if not data:
+                metrics.incr("checkpoint.miss")
+                return None
+            metrics.incr("checkpoint.postgres_hit")
+
+        checkpoint_id = data[b"id"].decode()
+        wanted = get_checkpoint_id(config)
+        if wanted and wanted != checkpoint_id:
+            # Only the latest checkpoint is kept; older ones can't be replayed
+            return None
+
+        parent = data.get(b"parent", b"").decode()
+        writes = await redis_raw.hgetall(self._writes_key(user_id, ns, checkpoint_id))
+        pending = []
+        for field in sorted(writes, key=lambda f: (f.rsplit(b":", 1)[0], int(f.rsplit(b":", 1)[1]))):
+            task_id, channel, value = self.serde.loads_typed(_unpack(writes[field]))
+            pending.append((task_id, channel, value))
+
+        return CheckpointTuple(
+            config=self._config(user_id, ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed(_unpack(data[b"checkpoint"])),
+            metadata=self.serde.loads_typed(_unpack(data[b"metadata"])),
+            parent_config=self._config(user_id, ns, parent) if parent else None,
+            pending_writes=pending,
+        )
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config is None or limit == 0:
+            return
+        latest = await self.aget_tuple(config)
+        if latest and not (filter and any(latest.metadata.get(k) != v for k, v in filter.items())):
+            yield latest
+
+    # --- Write ---
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        user_id, ns = self._thread(config)
+        parent = config["configurable"].get("checkpoint_id") or ""
+        mapping = {
+            b"id": checkpoint["id"].encode(),
+            b"parent": parent.encode(),
+            b"checkpoint": _pack(self.serde.dumps_typed(checkpoint)),
+            b"metadata": _pack(self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))),
+        }
+
+        key = self._state_key(user_id, ns)
+        async with redis_raw.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            if parent:
+                # Pending writes of the previous step are folded into this checkpoint
+                pipe.delete(self._writes_key(user_id, ns, parent))
+            await pipe.execute()
+        metrics.incr("checkpoint.put")
+
+        if PERSIST_ENABLED:
+            self._schedule_persist(user_id, ns, checkpoint["id"], mapping)
+        return self._config(user_id, ns, checkpoint["id"])
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        user_id, ns = self._thread(config)
+        key = self._writes_key(user_id, ns, config["configurable"]["checkpoint_id"])
+        async with redis_raw.pipeline(transaction=True) as pipe:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                field = f"{task_id}:{write_idx}"
+                packed = _pack(self.serde.dumps_typed((task_id, channel, value)))
+                # Special channels (errors, interrupts) overwrite; regular writes are idempotent
+                if write_idx < 0:
+                    pipe.hset(key, field, packed)
+                else:
+                    pipe.hsetnx(key, field, packed)
+            pipe.expire(key, self.ttl)
+            await pipe.execute()
+
+        if PERSIST_ENABLED:
+            self._schedule_persist(user_id, ns, config["configurable"]["checkpoint_id"])
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        keys = [k async for k in redis_raw.scan_iter(match=f"{WRITES_PREFIX}{thread_id}:*")]
+        keys += [k async for k in redis_raw.scan_iter(match=f"{STATE_PREFIX}{thread_id}:*")]
+        if keys:
+            await redis_raw.delete(*keys)
+        if PERSIST_ENABLED:
+            await db.graphthread.delete_many(where={"userId": thread_id})
+
+    # --- Postgres write-through ---
+
+    def _schedule_persist(self, user_id: str, ns: str, checkpoint_id: str, mapping: Optional[Dict[bytes, bytes]] = None) -> None:
+        """
+        Queues a write-through. mapping is a new checkpoint; without one, only the
+        pending writes of checkpoint_id changed.
+        """
+        # A turn produces several checkpoints; only the newest one per thread is written
+        key = (user_id, ns)
+        queued = self._pending.get(key)
+        if mapping is None:
+            if queued and queued[0] != checkpoint_id:
+                return # writes of a checkpoint that is already superseded
+            mapping = queued[1] if queued else None
+        self._pending[key] = (checkpoint_id, mapping)
+        if key not in self._flushing:
+            self._flushing[key] = asyncio.create_task(self._flush(key))
+
+    @staticmethod
+    def _encode(mapping: Dict[bytes, bytes]) -> str:
+        return json.dumps({k.decode(): base64.b64encode(v).decode() for k, v in mapping.items()})
+
+    async def _flush(self, key: Tuple[str, str]) -> None:
+        user_id, ns = key
+        try:
+            while key in self._pending:
+                checkpoint_id, mapping = self._pending.pop(key)
+                try:
+                    # Pending writes are read at flush time, so every write so far goes in one statement
+                    writes = self._encode(await redis_raw.hgetall(self._writes_key(user_id, ns, checkpoint_id)))
+                    if mapping is None:
+                        # Only new writes; they belong to the checkpoint already stored
+                        await db.graphthread.update_many(
+                            where={"userId": user_id, "checkpointNs": ns, "checkpointId": checkpoint_id},
+                            data={"writes": writes},
+                        )
+                        metrics.incr("checkpoint.writes_persisted")
+                        continue
+                    payload = self._encode(mapping)
+                    await db.graphthread.upsert(
+                        where={"userId_checkpointNs": {"userId": user_id, "checkpointNs": ns}},
+                        data={
+                            "create": {"userId": user_id, "checkpointNs": ns, "checkpointId": checkpoint_id, "payload": payload, "writes": writes},
+                            "update": {"checkpointId": checkpoint_id, "payload": payload, "writes": writes},
+                        }
+                    )
+                    metrics.incr("checkpoint.persisted")
+                except Exception as e:
+                    print(f"⚠️ [Checkpoint] Postgres write-through failed for {user_id}: {e}")
+                    metrics.incr("checkpoint.persist_error")
+        finally:
+            self._flushing.pop(key, None)
+
+    async def _load_persisted(self, user_id: str, ns: str) -> Optional[Dict[bytes, bytes]]:
+        if not PERSIST_ENABLED:
+            return None
+        try:
+            row = await db.graphthread.find_unique(
+                where={"userId_checkpointNs": {"userId": user_id, "checkpointNs": ns}}
+            )
+        except Exception as e:
+            print(f"⚠️ [Checkpoint] Postgres read failed for {user_id}: {e}")
+            return None
+        if not row:
+            return None
+
+        mapping = {k.encode(): base64.b64decode(v) for k, v in json.loads(row.payload).items()}
+        writes = {k.encode(): base64.b64decode(v) for k, v in json.loads(row.writes or "{}").items()}
+        # Re-warm Redis so the rest of the conversation stays off Postgres
+        key = self._state_key(user_id, ns)
+        writes_key = self._writes_key(user_id, ns, row.checkpointId)
+        async with redis_raw.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, self.ttl)
+            if writes:
+                # A paused turn's interrupt lives here; without it /query/continue can't resume
+                pipe.hset(writes_key, mapping=writes)
+                pipe.expire(writes_key, self.ttl)
+            await pipe.execute()
+        if writes:
+            metrics.incr("checkpoint.writes_restored")
+        return mapping
+
+checkpointer = RedisCheckpointSaver()
@@ -0,0 +1,157 @@
+import os
+import time
+import hashlib
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from core.lifespan import redis_raw
+from utils.metrics import metrics
+from utils.token_budget import count_tokens
+
+# Content-addressed embedding cache shared by every embedding client (MemoryStore, ToolRetriever)
+# and every process. Key: model (+ input type, where the provider embeds queries and documents
+# differently) + SHA-256 of the text, so the same text is embedded once no matter who asks.
+# Vectors are stored as float16 bytes (2 KB for voyage-3's 1024 dims).
+# A sorted set of last-access times gives LRU eviction at EMBEDDING_CACHE_MAX_ENTRIES; the TTL
+# only cleans up after entries the sorted set lost track of.
+# Cache errors never fail an embedding call, they just fall through to the provider.
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", str(30 * 24 * 3600)))
+
+KEY_PREFIX = "emb:"
+LRU_KEY = "emb:lru"
+
+Vector = List[float]
+
+def cache_key(model: str, text: str) -> str:
+    return f"{KEY_PREFIX}{model}:{hashlib.sha256(text.encode()).hexdigest()}"
+
+def pack(vector) -> bytes:
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+def unpack(raw: bytes) -> Vector:
+    return np.frombuffer(raw, dtype=np.float16).astype(np.float32).tolist()
+
+class EmbeddingCache:
+    def __init__(self, client=redis_raw, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES, ttl: int = EMBEDDING_CACHE_TTL):
+        self.redis = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    async def get_many(self, keys: List[str]) -> List[Optional[Vector]]:
+        raws = await self.redis.mget(keys)
+        hits = [k for k, raw in zip(keys, raws) if raw]
+        if hits:
+            # Touch for LRU; refresh the TTL of entries still in use
+            now = time.time()
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.zadd(LRU_KEY, {k: now for k in hits})
+                for k in hits:
+                    pipe.expire(k, self.ttl)
+                await pipe.execute()
+        return [unpack(raw) if raw else None for raw in raws]
+
+    async def put_many(self, items: Dict[str, Vector]):
+        now = time.time()
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, vector in items.items():
+                pipe.set(key, pack(vector), ex=self.ttl)
+            pipe.zadd(LRU_KEY, {k: now for k in items})
+            pipe.zcard(LRU_KEY)
+            size = (await pipe.execute())[-1]
+
+        excess = size - self.max_entries
+        if excess > 0:
+            evicted = [m.decode() if isinstance(m, bytes) else m for m, _ in await self.redis.zpopmin(LRU_KEY, excess)]
+            if evicted:
+                await self.redis.delete(*evicted)
+                metrics.incr("embedding_cache.evicted", len(evicted))
+
+    async def embed(self, model: str, texts: List[str],
+                    compute: Callable[[List[str]], Awaitable[List[Vector]]]) -> Tuple[List[Vector], List[bool]]:
+        """Returns (vectors, hit flags). compute() is only called for texts not in the cache, once per distinct text."""
+        if not texts:
+            return [], []
+        if not EMBEDDING_CACHE_ENABLED:
+            return [list(v) for v in await compute(texts)], [False] * len(texts)
+
+        keys = [cache_key(model, t) for t in texts]
+        try:
+            cached = await self.get_many(keys)
+        except Exception as e:
+            print(f"⚠️ [EmbeddingCache] Lookup failed: {e}")
+            metrics.incr("embedding_cache.error")
+            cached = [None] * len(texts)
+
+        hits = [v is not None for v in cached]
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        computed: Dict[str, Vector] = {}
+        if missing:
+            computed = {t: list(map(float, v)) for t, v in zip(missing, await compute(missing))}
+            try:
+                await self.put_many({cache_key(model, t): v for t, v in computed.items()})
+            except Exception as e:
+                print(f"⚠️ [EmbeddingCache] Store failed: {e}")
+                metrics.incr("embedding_cache.error")
+
+        hit_count = sum(hits)
+        metrics.incr("embedding_cache.hit", hit_count)
+        metrics.incr("embedding_cache.miss", len(texts) - hit_count)
+        # Provider tokens not paid for (approximate, same estimate as the prompt budgets)
+        metrics.incr("embedding_cache.saved_tokens", sum(count_tokens(t) for t, hit in zip(texts, hits) if hit))
+        metrics.gauge("embedding_cache.hit_rate", round(metrics.ratio("embedding_cache.hit", "embedding_cache.miss"), 4))
+
+        vectors = [v if v is not None else computed[t] for t, v in zip(texts, cached)]
+        return vectors, hits
+
+embedding_cache = EmbeddingCache()
+
+class CachedEmbedder:
+    """
+    Async, cached front for a sync Chroma embedding function (MemoryStore). Chroma's Voyage
+    function sends no input type, so queries and documents share entries.
+    get_fn is looked up on every call, so swapping the store's embedding function takes effect.
+    """
+    def __init__(self, model: str, get_fn: Callable[[], Callable[[List[str]], List]], cache: EmbeddingCache = embedding_cache):
+        self.model = model
+        self.get_fn = get_fn
+        self.cache = cache
+
+    async def aembed(self, texts: List[str]) -> List[Vector]:
+        vectors, _ = await self.cache.embed(self.model, texts, lambda missing: asyncio.to_thread(self.get_fn(), missing))
+        return vectors
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper (ToolRetriever). The async methods go through the cache;
+    the sync ones call the wrapped client directly, since the Redis client is async-only.
+    """
+    def __init__(self, inner: Embeddings, model: str, cache: EmbeddingCache = embedding_cache):
+        self.inner = inner
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[Vector]:
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str) -> Vector:
+        return self.inner.embed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[Vector]:
+        vectors, _ = await self.cache.embed(f"{self.model}/document", texts, self.inner.aembed_documents)
+        return vectors
+
+    async def aembed_query_with_hit(self, text: str) -> Tuple[Vector, bool]:
+        async def compute(missing: List[str]) -> List[Vector]:
+            return [await self.inner.aembed_query(missing[0])]
+        vectors, hits = await self.cache.embed(f"{self.model}/query", [text], compute)
+        return vectors[0], hits[0]
+
+    async def aembed_query(self, text: str) -> Vector:
+        vector, _ = await self.aembed_query_with_hit(text)
+        return vector
@@ -0,0 +1,131 @@
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from langchain_core.messages import BaseMessage, message_chunk_to_message
+from langchain_core.runnables import Runnable
+
+from services.llm_scheduler import llm_scheduler, NonRetryableError
+from utils.metrics import metrics
+
+# Hedged LLM requests (opt-in per node via HEDGE_NODES, e.g. "brain,map_action").
+# The primary model streams; if it hasn't produced its first token after the node's
+# observed p95 time-to-first-token, the same prompt goes to a fallback model.
+# The first of the two to produce a token wins and the other is cancelled, so only one
+# of them ever streams into the user's answer. A stream that fails after its first token
+# is not retried (the retry would repeat text the user has already seen).
+# A primary beaten by the fallback still counts towards its TTFT percentile, with the time
+# it had been waiting when cancelled (a lower bound). Without those slow samples the p95
+# would only see calls faster than the hedge delay and drift down with every hedge.
+
+HEDGE_NODES = {n.strip() for n in os.getenv("HEDGE_NODES", "").split(",") if n.strip()}
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_DEFAULT_DELAY_MS = float(os.getenv("HEDGE_DEFAULT_DELAY_MS", "3000"))
+HEDGE_MIN_DELAY_MS = 200
+HEDGE_MIN_SAMPLES = 20 # below this, the percentile isn't trusted yet
+
+@dataclass
+class Contender:
+    provider: str   # llm_scheduler provider
+    llm: Runnable
+    tokens: int = 0 # estimated prompt size, also what a cancelled request costs
+
+def hedging_enabled(node: str) -> bool:
+    return node in HEDGE_NODES
+
+def hedge_delay(node: str) -> float:
+    """Seconds to wait for the primary's first token before hedging."""
+    name = f"hedge.{node}.ttft_ms"
+    if metrics.count(name) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY_MS / 1000
+    return max(HEDGE_MIN_DELAY_MS, metrics.percentile(name, HEDGE_PERCENTILE)) / 1000
+
+def _succeeded(task: asyncio.Task) -> bool:
+    return task.done() and not task.cancelled() and task.exception() is None
+
+async def _stream(node: str, role: str, contender: Contender, messages: List[BaseMessage],
+                  first_token: asyncio.Event, on_first_token: Callable[[str], None]):
+    started_at = time.perf_counter()
+
+    async def call():
+        final = None
+        try:
+            async for chunk in contender.llm.astream(messages):
+                if not first_token.is_set():
+                    first_token.set()
+                    # No await in between: the other contender is cancelled before it can run again
+                    on_first_token(role)
+                    metrics.observe(f"hedge.{node}.{'ttft_ms' if role == 'primary' else 'fallback_ttft_ms'}", (time.perf_counter() - started_at) * 1000)
+                final = chunk if final is None else final + chunk
+        except Exception as e:
+            if first_token.is_set():
+                metrics.incr(f"hedge.{node}.interrupted")
+                raise NonRetryableError(str(e)) from e
+            raise
+        return message_chunk_to_message(final)
+
+    try:
+        return await llm_scheduler.run(contender.provider, call, tokens=contender.tokens)
+    except NonRetryableError as e:
+        raise e.__cause__
+
+async def hedged_invoke(node: str, messages: List[BaseMessage], primary: Contender, fallback: Optional[Contender] = None):
+    if fallback is None or not hedging_enabled(node):
+        return await llm_scheduler.run(primary.provider, lambda: primary.llm.ainvoke(messages), tokens=primary.tokens)
+
+    contenders = {"primary": primary, "fallback": fallback}
+    first = {role: asyncio.Event() for role in contenders}
+    tasks = {}
+    started_at = time.perf_counter()
+
+    def claim(role: str):
+        # Called from inside the first contender to stream, at its first token
+        if role == "fallback" and not tasks["primary"].done():
+            # Censored sample: the primary's real TTFT is at least this
+            metrics.observe(f"hedge.{node}.ttft_ms", (time.perf_counter() - started_at) * 1000)
+            metrics.incr(f"hedge.{node}.ttft_censored")
+        for other, task in tasks.items():
+            if other != role:
+                task.cancel()
+
+    tasks["primary"] = asyncio.create_task(_stream(node, "primary", primary, messages, first["primary"], claim))
+    watchers = {"primary": asyncio.create_task(first["primary"].wait())}
+
+    try:
+        await asyncio.wait([tasks["primary"], watchers["primary"]], timeout=hedge_delay(node), return_when=asyncio.FIRST_COMPLETED)
+        if first["primary"].is_set() or _succeeded(tasks["primary"]):
+            metrics.incr(f"hedge.{node}.not_fired")
+            return await tasks["primary"]
+
+        # Slow (or failed) before its first token: race the fallback
+        metrics.incr(f"hedge.{node}.fired")
+        print(f"🏇 [Hedge] {node}: no first token after {hedge_delay(node):.2f}s, firing fallback")
+        tasks["fallback"] = asyncio.create_task(_stream(node, "fallback", fallback, messages, first["fallback"], claim))
+        watchers["fallback"] = asyncio.create_task(first["fallback"].wait())
+
+        winner = None
+        while winner is None:
+            live = [t for role in tasks for t in (tasks[role], watchers[role]) if not tasks[role].done() and not t.done()]
+            if not live:
+                # Both failed; surface the primary's error
+                return await tasks["primary"]
+            await asyncio.wait(live, return_when=asyncio.FIRST_COMPLETED)
+            for role in contenders:
+                if first[role].is_set() or _succeeded(tasks[role]):
+                    winner = role
+                    break
+
+        loser = "fallback" if winner == "primary" else "primary"
+        metrics.incr(f"hedge.{node}.{winner}_win")
+        # The loser's prompt is paid for even though its answer is thrown away
+        metrics.incr(f"hedge.{node}.extra_tokens", contenders[loser].tokens)
+        tasks[loser].cancel() # already cancelled by claim() unless the winner finished without streaming
+        return await tasks[winner]
+    finally:
+        for task in (*tasks.values(), *watchers.values()):
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception() # mark a loser's error as handled
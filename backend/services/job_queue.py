@@ -0,0 +1,152 @@
+import os
+import json
+import time
+import socket
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from redis.exceptions import ResponseError
+
+from core.lifespan import redis
+from utils.metrics import metrics
+
+# Durable queue for post-response work (memory extraction, rolling summary).
+# The API only XADDs jobs to a Redis stream; the worker process (app/worker.py) reads them
+# through a consumer group and XACKs + XDELs each one once its handler succeeded, so the stream
+# only ever holds unfinished jobs.
+# A job whose handler failed, or whose worker died, stays pending in the group and is re-claimed
+# (XAUTOCLAIM) once it has been idle for JOB_RETRY_IDLE_MS. After JOB_MAX_ATTEMPTS deliveries it
+# moves to the dead-letter stream.
+
+JOB_STREAM = os.getenv("JOB_STREAM", "jobs:post_response")
+JOB_GROUP = os.getenv("JOB_GROUP", "workers")
+DEAD_STREAM = f"{JOB_STREAM}:dead"
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "4"))
+JOB_RETRY_IDLE_MS = int(os.getenv("JOB_RETRY_IDLE_MS", "30000"))
+JOB_STREAM_MAXLEN = 100_000 # approximate cap, only reached if the worker is down for a long time
+DEAD_STREAM_MAXLEN = 10_000
+
+WORKER_METRICS_PREFIX = "metrics:worker:"
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int = 1 # deliveries so far, including this one
+
+    @property
+    def enqueued_at_ms(self) -> int:
+        # Stream ids are "<unix ms>-<seq>"
+        return int(self.id.split("-")[0])
+
+def consumer_name() -> str:
+    return os.getenv("JOB_CONSUMER") or f"{socket.gethostname()}-{os.getpid()}"
+
+def _job(entry_id: str, fields: Dict[str, str], attempts: int = 1) -> Job:
+    try:
+        payload = json.loads(fields.get("payload") or "{}")
+    except json.JSONDecodeError:
+        payload = {}
+    return Job(id=entry_id, kind=fields.get("kind", ""), payload=payload, attempts=attempts)
+
+class JobQueue:
+    def __init__(self, client=redis, stream: str = JOB_STREAM, group: str = JOB_GROUP):
+        self.redis = client
+        self.stream = stream
+        self.group = group
+        self.dead_stream = f"{stream}:dead"
+
+    async def enqueue(self, kind: str, **payload) -> Optional[str]:
+        """Adds a job for the worker. Never raises: a lost summary must not fail the user's turn."""
+        try:
+            job_id = await self.redis.xadd(
+                self.stream,
+                {"kind": kind, "payload": json.dumps(payload)},
+                maxlen=JOB_STREAM_MAXLEN,
+                approximate=True,
+            )
+            metrics.incr(f"jobs.enqueued.{kind}")
+            return job_id
+        except Exception as e:
+            print(f"⚠️ [Jobs] Could not enqueue {kind}: {e}")
+            metrics.incr("jobs.enqueue_error")
+            return None
+
+    async def ensure_group(self):
+        try:
+            # id="0": a fresh group also picks up jobs enqueued before the first worker started
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+            print(f"✅ [Jobs] Created consumer group {self.group} on {self.stream}")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(self, consumer: str, count: int, block_ms: int) -> List[Job]:
+        """New jobs for this consumer; blocks up to block_ms when there are none."""
+        response = await self.redis.xreadgroup(self.group, consumer, {self.stream: ">"}, count=count, block=block_ms)
+        return [_job(entry_id, fields) for _, entries in (response or []) for entry_id, fields in entries]
+
+    async def claim_stale(self, consumer: str, count: int) -> List[Job]:
+        """Takes over jobs that failed or whose worker died, once idle for JOB_RETRY_IDLE_MS."""
+        response = await self.redis.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=JOB_RETRY_IDLE_MS, start_id="0-0", count=count
+        )
+        entries = [(entry_id, fields) for entry_id, fields in response[1] if fields is not None]
+        jobs = []
+        for entry_id, fields in entries:
+            pending = await self.redis.xpending_range(self.stream, self.group, min=entry_id, max=entry_id, count=1)
+            attempts = pending[0]["times_delivered"] if pending else 1
+            jobs.append(_job(entry_id, fields, attempts))
+        if jobs:
+            metrics.incr("jobs.claimed", len(jobs))
+        return jobs
+
+    async def ack(self, job: Job):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, job.id)
+            pipe.xdel(self.stream, job.id)
+            await pipe.execute()
+
+    async def dead_letter(self, job: Job, error: str):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xadd(
+                self.dead_stream,
+                {"kind": job.kind, "payload": json.dumps(job.payload), "attempts": job.attempts, "error": error[:500], "job_id": job.id},
+                maxlen=DEAD_STREAM_MAXLEN,
+                approximate=True,
+            )
+            pipe.xack(self.stream, self.group, job.id)
+            pipe.xdel(self.stream, job.id)
+            await pipe.execute()
+        metrics.incr(f"jobs.dead.{job.kind or 'unknown'}")
+
+    async def stats(self) -> Dict[str, Any]:
+        """Backlog and lag as seen in Redis, so the API can report them without the worker's help."""
+        try:
+            backlog = await self.redis.xlen(self.stream)
+            oldest = await self.redis.xrange(self.stream, count=1)
+            pending = 0
+            for group in await self.redis.xinfo_groups(self.stream):
+                if group["name"] == self.group:
+                    pending = group["pending"]
+            dead = await self.redis.xlen(self.dead_stream)
+        except ResponseError:
+            # Stream not created yet (no job enqueued, no worker started)
+            return {"backlog": 0, "pending": 0, "oldest_age_ms": 0, "dead": 0}
+
+        oldest_age_ms = 0
+        if oldest:
+            oldest_age_ms = max(0, int(time.time() * 1000) - int(oldest[0][0].split("-")[0]))
+        return {"backlog": backlog, "pending": pending, "oldest_age_ms": oldest_age_ms, "dead": dead}
+
+    async def worker_snapshots(self) -> Dict[str, Any]:
+        """Metrics each live worker published (see app/worker.py), keyed by consumer name."""
+        snapshots = {}
+        async for key in self.redis.scan_iter(match=f"{WORKER_METRICS_PREFIX}*"):
+            raw = await self.redis.get(key)
+            if raw:
+                snapshots[key[len(WORKER_METRICS_PREFIX):]] = json.loads(raw)
+        return snapshots
+
+job_queue = JobQueue()
@@ -0,0 +1,238 @@
+import os
+import re
+import time
+import random
+import asyncio
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from utils.metrics import metrics
+
+# Shared gate for every LLM call (agent nodes and chains).
+# Each provider has a concurrency cap, request/token buckets (RPM/TPM) and two queues:
+# interactive turns are always served before background work, and background work can
+# neither take the last slots nor drain the buckets below a reserve.
+# A 429 pauses the whole provider for its retry-after, so queued calls don't pile on.
+# The SDK clients run with max_retries=0; retrying is done here.
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+BASE_BACKOFF = float(os.getenv("LLM_BASE_BACKOFF", "1.0"))
+MAX_BACKOFF = 30.0
+# Share of each provider's slots and buckets only interactive calls may use
+BACKGROUND_RESERVE = float(os.getenv("LLM_BACKGROUND_RESERVE", "0.25"))
+# The job worker (app/worker.py) is a separate process with its own scheduler, so the
+# provider limits are split between the two: the worker gets this share for background work,
+# the API keeps the rest for interactive turns. Together they stay within the provider quota,
+# and background work can never take the API's share.
+WORKER_QUOTA_SHARE = float(os.getenv("LLM_WORKER_QUOTA_SHARE", "0.25"))
+
+T = TypeVar("T")
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    max_concurrency: int
+    rpm: float
+    tpm: float
+
+def _limits(env_prefix: str, max_concurrency: int, rpm: int, tpm: int) -> ProviderLimits:
+    return ProviderLimits(
+        max_concurrency=int(os.getenv(f"{env_prefix}_MAX_CONCURRENCY", str(max_concurrency))),
+        rpm=float(os.getenv(f"{env_prefix}_RPM", str(rpm))),
+        tpm=float(os.getenv(f"{env_prefix}_TPM", str(tpm))),
+    )
+
+PROVIDER_LIMITS: Dict[str, ProviderLimits] = {
+    "groq": _limits("GROQ", 8, 300, 300_000),
+    "gemini": _limits("GEMINI", 8, 1000, 1_000_000),
+}
+
+def scaled(limits: Dict[str, ProviderLimits], share: float) -> Dict[str, ProviderLimits]:
+    return {
+        name: ProviderLimits(max_concurrency=max(1, round(l.max_concurrency * share)), rpm=l.rpm * share, tpm=l.tpm * share)
+        for name, l in limits.items()
+    }
+
+RATE_LIMIT_TEXT = re.compile(r"\b429\b|rate.?limit|resource.?exhausted|quota", re.IGNORECASE)
+TRANSIENT_STATUS = {500, 502, 503, 504}
+
+def _status(error: BaseException) -> Optional[int]:
+    for err in (error, error.__cause__):
+        if err is None:
+            continue
+        status = getattr(err, "status_code", None) or getattr(err, "code", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+def is_rate_limit(error: BaseException) -> bool:
+    return _status(error) == 429 or bool(RATE_LIMIT_TEXT.search(str(error)))
+
+def is_transient(error: BaseException) -> bool:
+    if _status(error) in TRANSIENT_STATUS:
+        return True
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or any(
+        word in type(error).__name__ for word in ("Timeout", "Connection")
+    )
+
+class NonRetryableError(Exception):
+    """Raised by a call() that must not run again, e.g. a stream that already emitted tokens. The cause is the real error."""
+
+def retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second, holding at most a minute's worth."""
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def take(self, amount: float, reserve: float = 0.0):
+        floor = self.capacity * reserve
+        # A single oversized request must still get through eventually
+        amount = min(amount, self.capacity - floor)
+        while True:
+            self._refill()
+            if self.level - amount >= floor:
+                self.level -= amount
+                return
+            await asyncio.sleep((amount + floor - self.level) / self.rate)
+
+    def debit(self, amount: float):
+        """Charges usage known only after the call (completion tokens); may go negative."""
+        self._refill()
+        self.level -= amount
+
+class ProviderGate:
+    def __init__(self, name: str, limits: ProviderLimits, background_reserve: float = BACKGROUND_RESERVE):
+        self.name = name
+        self.limits = limits
+        self.background_reserve = background_reserve
+        self.in_flight = 0
+        self.background_slots = max(1, int(limits.max_concurrency * (1 - background_reserve)))
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {p: deque() for p in PRIORITIES}
+        self.requests = TokenBucket(limits.rpm)
+        self.tokens = TokenBucket(limits.tpm)
+        self.paused_until = 0.0
+
+    def _can_start(self, priority: str) -> bool:
+        cap = self.limits.max_concurrency if priority == INTERACTIVE else self.background_slots
+        return self.in_flight < cap
+
+    def _report(self):
+        for priority in PRIORITIES:
+            metrics.gauge(f"llm_scheduler.{self.name}.queue.{priority}", len(self.waiters[priority]))
+        metrics.gauge(f"llm_scheduler.{self.name}.in_flight", self.in_flight)
+
+    async def acquire(self, priority: str):
+        ahead = self.waiters[INTERACTIVE] if priority == INTERACTIVE else (self.waiters[INTERACTIVE] or self.waiters[BACKGROUND])
+        if not ahead and self._can_start(priority):
+            self.in_flight += 1
+            self._report()
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(waiter)
+        self._report()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in self.waiters[priority]:
+                self.waiters[priority].remove(waiter)
+                self._report()
+            elif waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled
+                self.release()
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        # Interactive waiters first; background only once none are left
+        for priority in PRIORITIES:
+            queue = self.waiters[priority]
+            while queue and self._can_start(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.in_flight += 1
+                waiter.set_result(None)
+            if queue:
+                break
+        self._report()
+
+    async def wait_for_budget(self, priority: str, tokens: int):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        reserve = self.background_reserve if priority == BACKGROUND else 0.0
+        await self.requests.take(1, reserve)
+        if tokens:
+            await self.tokens.take(tokens, reserve)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class LLMScheduler:
+    def __init__(self, limits: Dict[str, ProviderLimits] = PROVIDER_LIMITS, share: float = 1.0,
+                 background_reserve: float = BACKGROUND_RESERVE):
+        self.configure(limits, share, background_reserve)
+
+    def configure(self, limits: Dict[str, ProviderLimits] = PROVIDER_LIMITS, share: float = 1.0,
+                  background_reserve: float = BACKGROUND_RESERVE):
+        """Sizes every provider gate to `share` of its limits. Call before the first LLM request."""
+        self.share = share
+        self.gates = {name: ProviderGate(name, l, background_reserve) for name, l in scaled(limits, share).items()}
+
+    async def run(self, provider: str, call: Callable[[], Awaitable[T]],
+                  priority: str = INTERACTIVE, tokens: int = 0) -> T:
+        """
+        Runs call() (a fresh LLM request per attempt) once the provider has capacity.
+        tokens is the estimated prompt size, charged against the provider's TPM bucket.
+        """
+        gate = self.gates[provider]
+        queued_at = time.perf_counter()
+        for attempt in range(MAX_RETRIES + 1):
+            await gate.acquire(priority)
+            backoff = 0.0
+            try:
+                await gate.wait_for_budget(priority, tokens)
+                if attempt == 0:
+                    metrics.observe(f"llm_scheduler.{provider}.{priority}.wait_ms", (time.perf_counter() - queued_at) * 1000)
+                result = await call()
+                usage = getattr(result, "usage_metadata", None) or {}
+                if usage.get("output_tokens"):
+                    gate.tokens.debit(usage["output_tokens"])
+                return result
+            except Exception as e:
+                if attempt == MAX_RETRIES or isinstance(e, NonRetryableError) or not (is_rate_limit(e) or is_transient(e)):
+                    raise
+                backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * (0.5 + random.random() / 2)
+                if is_rate_limit(e):
+                    backoff = retry_after(e) or backoff
+                    # Everyone waiting on this provider backs off, not just this call
+                    gate.pause(backoff)
+                    metrics.incr(f"llm_scheduler.{provider}.rate_limited")
+                metrics.incr(f"llm_scheduler.{provider}.retries")
+                print(f"🚦 [LLM] {provider} {type(e).__name__}, retry {attempt + 1}/{MAX_RETRIES} in {backoff:.1f}s")
+            finally:
+                gate.release()
+            await asyncio.sleep(backoff)
+
+# The API's share; app/worker.py reconfigures its own copy to WORKER_QUOTA_SHARE
+llm_scheduler = LLMScheduler(share=1 - WORKER_QUOTA_SHARE)
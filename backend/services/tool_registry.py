@@ -1,53 +1,313 @@
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
 from langchain_voyageai import VoyageAIEmbeddings
 from langchain_core.tools import BaseTool
-from typing import List, Dict
+from typing import List, Dict, Optional
+from collections import Counter
+from pathlib import Path
+import asyncio
+import hashlib
+import math
+import shutil
+import faiss
+import json
+import time
+import re
 import os
 
 # Import your tool lists
-from app.agents.tools import ALL_TOOLS
+from app.agents.tools import ALL_TOOLS, DOMAIN_TOOL_NAMES
+from services.embedding_cache import CachedEmbeddings
+from utils.lru import LRUCache
+from utils.metrics import metrics
+
+EMBEDDING_MODEL = "voyage-3"
+
+# Persisted, content-addressed index: <TOOL_INDEX_DIR>/<fingerprint>/
+INDEX_DIR = Path(os.getenv("TOOL_INDEX_DIR", Path(__file__).resolve().parent.parent / ".cache" / "tool_index"))
+# Other fingerprints may belong to a release that is still running (rolling deploy, shared volume);
+# they are only pruned once no process has loaded them for this long
+INDEX_RETENTION_SECS = float(os.getenv("TOOL_INDEX_RETENTION_DAYS", "7")) * 24 * 3600
+
+# Query-side caches: exact (query, k) -> tool names, then text -> embedding
+# (local LRU, then the shared embedding cache in services.embedding_cache)
+QUERY_CACHE_SIZE = int(os.getenv("TOOL_QUERY_CACHE_SIZE", "512"))
+
+# Hybrid retrieval: lexical BM25 is always available; the vector side is optional
+EMBED_TIMEOUT = float(os.getenv("TOOL_EMBED_TIMEOUT", "1.5"))
+# A vector index that failed to build is retried in the background, at most this often
+INDEX_RETRY_SECS = float(os.getenv("TOOL_INDEX_RETRY_SECS", "60"))
+RRF_K = 60
+
+STOPWORDS = {
+    "a", "an", "the", "to", "of", "for", "in", "on", "at", "by", "and", "or", "is", "it", "be", "as",
+    "this", "that", "with", "when", "use", "user", "says", "wants", "my", "me", "i", "do", "not", "e", "g",
+}
+
+def tools_fingerprint(tools: List[BaseTool]) -> str:
+    """Changes whenever a tool is added/removed/renamed or its description changes."""
+    payload = json.dumps({"model": EMBEDDING_MODEL, "tools": [[t.name, t.description] for t in tools]}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in re.findall(r"[a-z0-9]+", text.lower().replace("_", " ")):
+        if token in STOPWORDS:
+            continue
+        # Cheap stemming so "tasks"/"task" and "logging"/"log" meet
+        if len(token) > 4 and token.endswith("ing"):
+            token = token[:-3]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+class LexicalToolIndex:
+    """
+    BM25 over tool names, descriptions and argument schemas.
+    ~40 short documents, so scoring every tool is well under a millisecond.
+    """
+    def __init__(self, tools: List[BaseTool], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.names = [t.name for t in tools]
+        self.docs = [Counter(tokenize(self._document(t))) for t in tools]
+        self.lengths = [sum(d.values()) for d in self.docs]
+        self.avg_length = sum(self.lengths) / max(len(self.docs), 1)
+
+        df = Counter(term for d in self.docs for term in d)
+        n = len(self.docs)
+        self.idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    @staticmethod
+    def _document(tool: BaseTool) -> str:
+        # Name is repeated so an exact tool-name mention dominates
+        parts = [tool.name, tool.name, tool.description or ""]
+        for arg, schema in (tool.args or {}).items():
+            parts.append(arg)
+            parts.append(schema.get("description", ""))
+        return " ".join(parts)
+
+    def rank(self, query: str) -> List[str]:
+        terms = set(tokenize(query))
+        scores = []
+        for name, doc, length in zip(self.names, self.docs, self.lengths):
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term)
+                if not tf:
+                    continue
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / self.avg_length))
+                score += self.idf[term] * norm
+            if score > 0:
+                scores.append((score, name))
+        scores.sort(key=lambda x: -x[0])
+        return [name for _, name in scores]
+
+def reciprocal_rank_fusion(*rankings: List[str], k: int = RRF_K) -> List[str]:
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, name in enumerate(ranking):
+            fused[name] = fused.get(name, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused, key=lambda name: -fused[name])
 
 class ToolRetriever:
     def __init__(self, tools: List[BaseTool]):
         self.tools = tools
         self.tool_map: Dict[str, BaseTool] = {t.name: t for t in tools}
         self.vector_store = None
-        self._build_index()
+        self._index_retry_at = 0.0
+        self._index_task: Optional[asyncio.Task] = None
+        self._result_cache = LRUCache(QUERY_CACHE_SIZE)
+        self._embedding_cache = LRUCache(QUERY_CACHE_SIZE)
+        self.lexical = LexicalToolIndex(tools)
+        self.domain_tools: Dict[str, List[BaseTool]] = self._pin_domains(DOMAIN_TOOL_NAMES)
+        try:
+            self._build_index()
+        except Exception as e:
+            # Slow/down embedding API must not take the whole app down; aquery() retries the build
+            print(f"⚠️ Vector tool index unavailable, using lexical retrieval only: {e}")
+            self.vector_store = None
+
+    def _pin_domains(self, domains: Dict[str, List[str]]) -> Dict[str, List[BaseTool]]:
+        unknown = {n for names in domains.values() for n in names} - self.tool_map.keys()
+        if unknown:
+            raise ValueError(f"DOMAIN_TOOL_NAMES references unknown tools: {sorted(unknown)}")
+        return {domain: [self.tool_map[n] for n in names] for domain, names in domains.items()}
 
     def _build_index(self):
         """
-        Converts tool descriptions into vectors using Voyage AI API.
+        Loads the tool index from disk when the tool set is unchanged.
+        Only calls the Voyage AI API when descriptions changed (or on first run).
         """
-        print(f"⚙️ Indexing {len(self.tools)} tools with Voyage AI...")
-        
         tool_texts = [f"{t.name}: {t.description}" for t in self.tools]
         metadatas = [{"tool_name": t.name} for t in self.tools]
-        
+
         voyage_api_key = os.getenv("CHROMA_VOYAGE_API_KEY") or os.getenv("VOYAGE_API_KEY")
-        embeddings = VoyageAIEmbeddings(
-            voyage_api_key=voyage_api_key,
-            model="voyage-3"
+        self.embeddings = CachedEmbeddings(
+            VoyageAIEmbeddings(voyage_api_key=voyage_api_key, model=EMBEDDING_MODEL),
+            model=EMBEDDING_MODEL
         )
-        
-        self.vector_store = FAISS.from_texts(
-            texts=tool_texts,
-            embedding=embeddings,
+
+        index_path = INDEX_DIR / tools_fingerprint(self.tools)
+        if (index_path / "index.faiss").exists():
+            try:
+                self.vector_store = self._load_index(index_path, tool_texts, metadatas)
+                print(f"✅ Tool Index loaded from disk ({index_path.name}, no embedding calls).")
+                return
+            except Exception as e:
+                print(f"⚠️ Stored tool index unreadable, rebuilding: {e}")
+
+        print(f"⚙️ Indexing {len(self.tools)} tools with Voyage AI...")
+        vectors = self.embeddings.embed_documents(tool_texts)
+
+        self.vector_store = FAISS.from_embeddings(
+            text_embeddings=list(zip(tool_texts, vectors)),
+            embedding=self.embeddings,
             metadatas=metadatas
         )
+        self._save_index(index_path)
         print("✅ Tool Indexing Complete (Zero-Weight).")
 
-    def query(self, user_query: str, k: int = 5) -> List[BaseTool]:
+    def _load_index(self, index_path: Path, tool_texts: List[str], metadatas: List[dict]) -> FAISS:
+        # Memory-map instead of reading the whole index into each worker
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            index = faiss.read_index(str(index_path / "index.faiss"), flag)
+        except RuntimeError:
+            index = faiss.read_index(str(index_path / "index.faiss"))
+
+        if index.ntotal != len(tool_texts):
+            raise ValueError(f"index has {index.ntotal} vectors, expected {len(tool_texts)}")
+        self._mark_in_use(index_path)
+
+        # The fingerprint guarantees the row order matches self.tools
+        docstore = InMemoryDocstore({
+            str(i): Document(page_content=text, metadata=meta)
+            for i, (text, meta) in enumerate(zip(tool_texts, metadatas))
+        })
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id={i: str(i) for i in range(len(tool_texts))}
+        )
+
+    def _save_index(self, index_path: Path):
+        """
+        Writes to a temp dir and renames it into place, so concurrent uvicorn
+        workers never see a half-written index. Fingerprints unused for
+        INDEX_RETENTION_SECS are pruned.
+        """
+        tmp_path = index_path.with_name(f".{index_path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.mkdir(parents=True, exist_ok=True)
+            faiss.write_index(self.vector_store.index, str(tmp_path / "index.faiss"))
+            (tmp_path / "manifest.json").write_text(json.dumps({
+                "model": EMBEDDING_MODEL,
+                "tools": [t.name for t in self.tools]
+            }))
+
+            if not index_path.exists():
+                os.replace(tmp_path, index_path)
+            self._mark_in_use(index_path)
+
+            cutoff = time.time() - INDEX_RETENTION_SECS
+            for stale in INDEX_DIR.iterdir():
+                if stale.is_dir() and stale.name != index_path.name and not stale.name.startswith("."):
+                    if stale.stat().st_mtime < cutoff:
+                        shutil.rmtree(stale, ignore_errors=True)
+        except OSError as e:
+            # Another worker won the race or the disk is read-only; the in-memory index still works
+            print(f"⚠️ Could not persist tool index: {e}")
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+    @staticmethod
+    def _mark_in_use(index_path: Path):
+        # The directory's mtime is when a process last loaded it; pruning goes by that
+        try:
+            os.utime(index_path)
+        except OSError:
+            pass # read-only volume: nothing gets pruned from it either
+
+    def _retry_index(self):
+        """Rebuilds a missing vector index off the event loop; queries stay lexical until it lands."""
+        if self._index_task is not None or time.monotonic() < self._index_retry_at:
+            return
+
+        async def rebuild():
+            try:
+                await asyncio.to_thread(self._build_index)
+                metrics.incr("tool_retriever.index_rebuilt")
+            except Exception as e:
+                print(f"⚠️ Vector tool index rebuild failed, retrying in {INDEX_RETRY_SECS:.0f}s: {e}")
+                metrics.incr("tool_retriever.index_rebuild_failed")
+                self._index_retry_at = time.monotonic() + INDEX_RETRY_SECS
+            finally:
+                self._index_task = None
+
+        self._index_task = asyncio.create_task(rebuild())
+
+    def _record(self, hit: bool, started_at: float):
+        metrics.incr("tool_retriever.cache_hit" if hit else "tool_retriever.cache_miss")
+        metrics.gauge("tool_retriever.hit_rate", metrics.ratio("tool_retriever.cache_hit", "tool_retriever.cache_miss"))
+        metrics.observe("tool_retriever.query_ms", (time.perf_counter() - started_at) * 1000)
+
+    def _to_tools(self, names: List[str]) -> List[BaseTool]:
+        return [self.tool_map[n] for n in names if n in self.tool_map]
+
+    def _search(self, vector: List[float], k: int) -> List[str]:
+        docs = self.vector_store.similarity_search_by_vector(vector, k=k)
+        return [doc.metadata["tool_name"] for doc in docs]
+
+    async def _embed_query(self, user_query: str) -> tuple:
+        """Returns (vector, cache_hit). Local LRU -> shared embedding cache (Redis) -> Voyage API."""
+        vector = self._embedding_cache.get(user_query)
+        if vector is not None:
+            return vector, True
+
+        vector, hit = await self.embeddings.aembed_query_with_hit(user_query)
+        self._embedding_cache.put(user_query, vector)
+        return vector, hit
+
+    def _fuse(self, user_query: str, vector: Optional[List[float]], k: int) -> List[str]:
+        lexical = self.lexical.rank(user_query)
+        if vector is None:
+            return lexical[:k]
+        # Rank every tool on the vector side so fusion sees the full ordering
+        return reciprocal_rank_fusion(self._search(vector, len(self.tools)), lexical)[:k]
+
+    async def aquery(self, user_query: str, k: int = 5) -> List[BaseTool]:
         """
         Returns the top K tools relevant to the user's query.
+        Repeated queries (same domain expansion) cost zero network calls.
+        Falls back to lexical-only ranking if embeddings are slow or down.
         """
-        docs = self.vector_store.similarity_search(user_query, k=k)
-        
-        selected_tools = []
-        for doc in docs:
-            tool_name = doc.metadata["tool_name"]
-            if tool_name in self.tool_map:
-                selected_tools.append(self.tool_map[tool_name])
-                
-        return selected_tools
-
-tool_retriever = ToolRetriever(ALL_TOOLS)
\ No newline at end of file
+        started_at = time.perf_counter()
+
+        names = self._result_cache.get((user_query, k))
+        if names is not None:
+            self._record(True, started_at)
+            return self._to_tools(names)
+
+        vector, hit = None, False
+        if self.vector_store is None:
+            self._retry_index()
+        else:
+            try:
+                vector, hit = await asyncio.wait_for(self._embed_query(user_query), timeout=EMBED_TIMEOUT)
+            except Exception as e:
+                print(f"⚠️ [ToolRetriever] Embedding unavailable ({type(e).__name__}), lexical fallback")
+
+        names = self._fuse(user_query, vector, k)
+        if vector is None:
+            metrics.incr("tool_retriever.lexical_fallback")
+        else:
+            # Don't pin a degraded (lexical-only) answer in the cache
+            self._result_cache.put((user_query, k), names)
+        self._record(hit, started_at)
+        return self._to_tools(names)
+
+tool_retriever = ToolRetriever(ALL_TOOLS)
@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+import numpy as np
+import chromadb
+from core.lifespan import get_chroma_client, CHROMA_MAX_CONNECTIONS
+from app.services.memory_store import memory_store, CHROMA_QUERY_TIMEOUT
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+# Compares PARALLEL_SEARCHES concurrent similarity searches through
+#   before: the sync HttpClient, one asyncio.to_thread per call (the old MemoryStore path)
+#   after:  the pooled async client from core/lifespan.py, through MemoryStore's connection slots
+# Queries use random vectors, so neither Voyage nor Redis is needed; only a running Chroma.
+CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
+CHROMA_PORT = int(os.getenv("CHROMA_PORT", 8001))
+COLLECTION = "bench_chroma_search"
+BENCH_USER_ID = "bench_chroma_search_user"
+SEED_DOCS = 2000
+PARALLEL_SEARCHES = 100
+ROUNDS = 5
+DIM = 1024
+
+def random_vectors(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, DIM)).astype(np.float32)
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist()
+
+def summarize(label: str, walls, latencies):
+    lat = np.array(latencies)
+    wall = np.median(walls)
+    print(f"   {label:<28} wall {wall * 1000:7.1f} ms  ({PARALLEL_SEARCHES / wall:,.0f} searches/sec)"
+          f"  p50 {np.percentile(lat, 50):6.1f} ms  p99 {np.percentile(lat, 99):6.1f} ms")
+
+async def timed(search):
+    start = time.perf_counter()
+    await search()
+    return (time.perf_counter() - start) * 1000
+
+async def run_round(make_search, queries):
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[timed(make_search(q)) for q in queries])
+    return time.perf_counter() - start, latencies
+
+async def run_benchmark():
+    print(f"\n⏱️ CHROMA PARALLEL SEARCH BENCHMARK")
+    print(f"   {CHROMA_HOST}:{CHROMA_PORT} docs={SEED_DOCS} parallel={PARALLEL_SEARCHES} rounds={ROUNDS} pool={CHROMA_MAX_CONNECTIONS}")
+    print("===========================================")
+
+    sync_client = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
+    async_client = await get_chroma_client()
+
+    try:
+        await async_client.delete_collection(COLLECTION)
+    except Exception:
+        pass
+    seeded = await async_client.create_collection(COLLECTION, embedding_function=None)
+    batch = await async_client.get_max_batch_size()
+    vectors = random_vectors(SEED_DOCS, 0)
+    for start in range(0, SEED_DOCS, batch):
+        end = min(start + batch, SEED_DOCS)
+        await seeded.add(
+            ids=[f"doc-{i}" for i in range(start, end)],
+            embeddings=vectors[start:end],
+            documents=[f"bench document {i}" for i in range(start, end)],
+            metadatas=[{"user_id": BENCH_USER_ID} for _ in range(start, end)],
+        )
+
+    sync_collection = sync_client.get_collection(COLLECTION, embedding_function=None)
+    async_collection = await async_client.get_collection(COLLECTION, embedding_function=None)
+
+    def before(q):
+        return lambda: asyncio.to_thread(sync_collection.query, query_embeddings=[q], n_results=5, where={"user_id": BENCH_USER_ID})
+
+    def after(q):
+        return lambda: memory_store._chroma(
+            async_collection.query(query_embeddings=[q], n_results=5, where={"user_id": BENCH_USER_ID}), CHROMA_QUERY_TIMEOUT
+        )
+
+    try:
+        for label, make_search in (("before (sync + to_thread)", before), ("after (async, pooled)", after)):
+            # Warm-up round opens the connections
+            await run_round(make_search, random_vectors(PARALLEL_SEARCHES, 1))
+            walls, latencies = [], []
+            for r in range(ROUNDS):
+                wall, lat = await run_round(make_search, random_vectors(PARALLEL_SEARCHES, 100 + r))
+                walls.append(wall)
+                latencies.extend(lat)
+            summarize(label, walls, latencies)
+    finally:
+        await async_client.delete_collection(COLLECTION)
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
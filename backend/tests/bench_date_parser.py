@@ -0,0 +1,35 @@
+import time
+from utils.date_parser import parse_client_timestamp, annotate
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+ITERATIONS = 20000
+NOW = parse_client_timestamp("Sun Oct 18 2026 14:30:00 GMT+0530 (India Standard Time)")
+
+# Realistic mix: most queries carry no date at all
+QUERIES = [
+    "call mom tomorrow at 5pm",
+    "add task submit report by next friday",
+    "remind me in 2 hours to stretch",
+    "what are my tasks",
+    "I spent 500 on lunch",
+    "log 250ml water",
+    "meeting on 25 dec at 10:30 am",
+    "play some music on spotify",
+]
+
+def run_benchmark():
+    print(f"\n⏱️ DATE PARSER BENCHMARK ({ITERATIONS} queries)")
+    print("===========================================")
+
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        annotate(QUERIES[i % len(QUERIES)], NOW)
+    elapsed = time.perf_counter() - start
+
+    print(f"   Throughput: {ITERATIONS / elapsed:,.0f} queries/sec")
+    print(f"   Latency:    {elapsed / ITERATIONS * 1e6:.1f} µs/query")
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,67 @@
+import os
+import time
+import asyncio
+import numpy as np
+from app.services.memory_store import memory_store, EMBED_BATCH_SIZE, EMBED_CONCURRENCY
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+BENCH_USER_ID = "bench_memory_store_user"
+SIZES = [1000, 10000]
+# The one-at-a-time baseline is only run on a sample; it is extrapolated to docs/sec
+BASELINE_SAMPLE = 100
+# BENCH_FAKE_EMBEDDINGS=1 measures the batching + Chroma path without paying for Voyage calls
+FAKE_EMBEDDINGS = os.getenv("BENCH_FAKE_EMBEDDINGS", "0") == "1"
+FAKE_DIM = 1024
+
+TOPICS = ["python", "running", "coffee", "budget", "sleep", "movies", "travel", "guitar"]
+
+def make_docs(n: int):
+    return [f"User note #{i}: thinking about {TOPICS[i % len(TOPICS)]} again, variant {i * 7919 % 1000}." for i in range(n)]
+
+def fake_embed(texts):
+    rng = np.random.default_rng(len(texts))
+    vectors = rng.standard_normal((len(texts), FAKE_DIM)).astype(np.float32)
+    return list(vectors / np.linalg.norm(vectors, axis=1, keepdims=True))
+
+async def cleanup():
+    await memory_store._get_collection()
+    await memory_store.collection.delete(where={"$and": [{"user_id": BENCH_USER_ID}, {"source": "bench"}]})
+
+async def run_benchmark():
+    if FAKE_EMBEDDINGS:
+        # Open the collection with the real embedding function first; only our own calls use the fake
+        await memory_store._get_collection()
+        memory_store.embedding_fn = fake_embed
+
+    print(f"\n⏱️ MEMORY STORE BULK WRITE BENCHMARK")
+    print(f"   embeddings={'fake' if FAKE_EMBEDDINGS else 'voyage'} batch={EMBED_BATCH_SIZE} concurrency={EMBED_CONCURRENCY}")
+    print("===========================================")
+    await cleanup()
+
+    docs = make_docs(BASELINE_SAMPLE)
+    start = time.perf_counter()
+    for doc in docs:
+        await memory_store.add(doc, BENCH_USER_ID, {"source": "bench"})
+    baseline = BASELINE_SAMPLE / (time.perf_counter() - start)
+    print(f"\n   add() one by one ({BASELINE_SAMPLE} docs): {baseline:,.0f} docs/sec")
+    await cleanup()
+
+    for n in SIZES:
+        docs = make_docs(n)
+        start = time.perf_counter()
+        ids = await memory_store.add_many(docs, BENCH_USER_ID, [{"source": "bench"}] * n)
+        elapsed = time.perf_counter() - start
+        print(f"   add_many() {n:>6,} docs: {len(ids) / elapsed:,.0f} docs/sec ({elapsed:.2f}s, {len(ids)} written, {len(ids) / elapsed / baseline:.1f}x)")
+        await cleanup()
+
+        # Same texts again: every embedding now comes from the shared embedding cache
+        start = time.perf_counter()
+        ids = await memory_store.add_many(docs, BENCH_USER_ID, [{"source": "bench"}] * n)
+        elapsed = time.perf_counter() - start
+        print(f"   add_many() {n:>6,} docs, warm embedding cache: {len(ids) / elapsed:,.0f} docs/sec")
+        await cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(run_benchmark())
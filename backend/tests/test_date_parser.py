@@ -0,0 +1,133 @@
+from utils.date_parser import parse_client_timestamp, resolve, annotate
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+# What the phone sends: new Date().toString() -> Sunday, 14:30 IST
+NOW = parse_client_timestamp("Sun Oct 18 2026 14:30:00 GMT+0530 (India Standard Time)")
+LATE = parse_client_timestamp("Sun Oct 18 2026 23:30:00 GMT+0530 (India Standard Time)")
+EARLY = parse_client_timestamp("Sun Oct 18 2026 08:00:00 GMT+0530 (India Standard Time)")
+FRIDAY = parse_client_timestamp("Fri Oct 23 2026 09:00:00 GMT+0530 (India Standard Time)")
+
+# (query, now, expected "YYYY-MM-DD[ HH:MM]" or None)
+CASES = [
+    # Relative days
+    ("study dva tomorrow", NOW, "2026-10-19"),
+    ("what did I eat yesterday", NOW, "2026-10-17"),
+    ("day after tomorrow", NOW, "2026-10-20"),
+    ("remind me tonight", NOW, "2026-10-18 21:00"),
+    ("tonight at 10", NOW, "2026-10-18 22:00"),
+    # Small hours at night are the early morning after
+    ("tonight at 1", NOW, "2026-10-19 01:00"),
+    ("tonight at 12", NOW, "2026-10-19 00:00"),
+    ("tomorrow night at 2", NOW, "2026-10-20 02:00"),
+    ("tomorrow night at 11", NOW, "2026-10-19 23:00"),
+    ("friday night at 1am", NOW, "2026-10-24 01:00"),
+    # Date + time in either order
+    ("call mom tomorrow at 5pm", NOW, "2026-10-19 17:00"),
+    ("5pm tomorrow", NOW, "2026-10-19 17:00"),
+    ("noon tomorrow", NOW, "2026-10-19 12:00"),
+    ("tomorrow morning", NOW, "2026-10-19 09:00"),
+    ("tomorrow evening at 7", NOW, "2026-10-19 19:00"),
+    ("meet at 12 tomorrow", NOW, "2026-10-19 12:00"),
+    ("call mom at 6 tomorrow", NOW, "2026-10-19 18:00"),
+    ("tomorrow 9", NOW, "2026-10-19 09:00"),
+    ("at 5 in the evening", NOW, "2026-10-18 17:00"),
+    ("meeting on 25 dec at 10:30 am", NOW, "2026-12-25 10:30"),
+    # Weekdays
+    ("monday", NOW, "2026-10-19"),
+    ("next friday at 9:30", NOW, "2026-10-23 09:30"),
+    ("friday", FRIDAY, "2026-10-23"),
+    ("next friday", FRIDAY, "2026-10-30"),
+    ("last friday", NOW, "2026-10-16"),
+    ("this weekend", NOW, "2026-10-24"),
+    ("last week", NOW, "2026-10-11"),
+    ("last month", NOW, "2026-09-18"),
+    # Offsets
+    ("in 2 hours", NOW, "2026-10-18 16:30"),
+    ("in half an hour", NOW, "2026-10-18 15:00"),
+    ("in 2 hours", LATE, "2026-10-19 01:30"),
+    ("in a week", NOW, "2026-10-25"),
+    ("in 1.5 hours", NOW, "2026-10-18 16:00"),
+    ("in 1.5 months", NOW, "2026-12-03"),
+    ("1.5 months ago", NOW, "2026-09-03"),
+    ("in 1.5 days", LATE, "2026-10-20"),
+    ("in 1.5 years", NOW, "2028-04-18"),
+    ("in a few days", NOW, "2026-10-21"),
+    ("3 days ago", NOW, "2026-10-15"),
+    ("2 weeks from now", NOW, "2026-11-01"),
+    ("next month", NOW, "2026-11-18"),
+    # Absolute dates
+    ("Oct 20", NOW, "2026-10-20"),
+    ("20th October 2026", NOW, "2026-10-20"),
+    ("jan 5", NOW, "2027-01-05"),
+    ("on 20/10", NOW, "2026-10-20"),
+    ("due 2026-11-02", NOW, "2026-11-02"),
+    # Bare times roll forward to their next occurrence
+    ("remind me at 9am", NOW, "2026-10-19 09:00"),
+    ("at 5", NOW, "2026-10-18 17:00"),
+    ("by 9", NOW, "2026-10-19 09:00"),
+    ("at 17:45", NOW, "2026-10-18 17:45"),
+    ("midnight", NOW, "2026-10-19 00:00"),
+    ("remind me at 5 to call mom", NOW, "2026-10-18 17:00"),
+    ("remind me in the morning", NOW, "2026-10-19 09:00"),
+    # ... but past-tense queries mean the last one
+    ("I had lunch at 1", NOW, "2026-10-18 13:00"),
+    ("what did i eat at 1pm", NOW, "2026-10-18 13:00"),
+    ("I woke up at 7", NOW, "2026-10-18 07:00"),
+    ("I slept at 11pm", NOW, "2026-10-17 23:00"),
+    ("what did i eat at 16:45", NOW, "2026-10-17 16:45"),
+    ("what did i eat at 1pm", EARLY, "2026-10-17 13:00"),
+    # A part of the day stays on today, or the last one in past-tense queries
+    ("what did i eat this morning", NOW, "2026-10-18 09:00"),
+    ("this morning at 8", NOW, "2026-10-18 08:00"),
+    ("what did i do in the evening", NOW, "2026-10-17 18:00"),
+    ("what did i do in the morning", NOW, "2026-10-18 09:00"),
+    ("what did i do in the morning", EARLY, "2026-10-17 09:00"),
+    # Not temporal
+    ("I drank 500ml water", NOW, None),
+    ("I sat at 3 tables", NOW, None),
+    ("log 2 glasses", NOW, None),
+    ("by 2 km", NOW, None),
+    ("I scored 8/10", NOW, None),
+    ("rate it 4/5", NOW, None),
+]
+
+def test_client_timestamp():
+    assert NOW.isoformat() == "2026-10-18T14:30:00+05:30"
+    assert parse_client_timestamp("2026-10-18T09:00:00Z").utcoffset().total_seconds() == 0
+    assert parse_client_timestamp("garbage").tzinfo is not None
+    assert parse_client_timestamp(None).tzinfo is not None
+
+def test_resolve_cases():
+    failures = []
+    for query, now, expected in CASES:
+        match = resolve(query, now)
+        got = str(match) if match else None
+        if got != expected:
+            failures.append(f"{query!r}: expected {expected}, got {got}")
+    assert not failures, "\n".join(failures)
+
+def test_annotate():
+    assert annotate("call mom tomorrow at 5pm", NOW) == "call mom tomorrow at 5pm (2026-10-19 17:00)"
+    assert annotate("log 250ml water", NOW) == "log 250ml water"
+    # ISO dates are already explicit
+    assert annotate("due 2026-11-02", NOW) == "due 2026-11-02"
+    assert annotate("remind me at 5 to call mom", NOW) == "remind me at 5 (2026-10-18 17:00) to call mom"
+    assert annotate("tomorrow 9", NOW) == "tomorrow 9 (2026-10-19 09:00)"
+    assert annotate("I scored 8/10", NOW) == "I scored 8/10"
+    assert annotate("I had lunch at 1", NOW) == "I had lunch at 1 (2026-10-18 13:00)"
+
+if __name__ == "__main__":
+    print(f"\n📅 DATE PARSER TEST ({len(CASES)} cases)")
+    print("===========================================")
+    passed = 0
+    for query, now, expected in CASES:
+        match = resolve(query, now)
+        got = str(match) if match else None
+        ok = got == expected
+        passed += ok
+        print(f"   {'✅' if ok else '❌'} {query:35} -> {got}" + ("" if ok else f" (expected {expected})"))
+    test_client_timestamp()
+    test_annotate()
+    print(f"\n🏁 {passed}/{len(CASES)} passed")
@@ -0,0 +1,66 @@
+from app.agents.fast_path import match
+from utils.date_parser import parse_client_timestamp
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+NOW = parse_client_timestamp("Sun Oct 18 2026 14:30:00 GMT+0530 (India Standard Time)")
+
+# (query, expected tool, expected args subset)
+HITS = [
+    ("call mom", "client_call_contact", {"name": "mom"}),
+    ("open spotify", "client_open_app", {"app_name": "spotify"}),
+    ("open the spotify app", "client_open_app", {"app_name": "spotify"}),
+    ("play let it be", "client_play_media", {"song_name": "let it be"}),
+    ("I spent 200 on lunch", "add_transaction", {"amount": 200, "payee": "Lunch", "category": "Food"}),
+    ("received 5k as salary", "add_transaction", {"amount": 5000, "payee": "Salary", "type": "income"}),
+    ("add task gym by 7 tomorrow", "create_task", {"title": "Gym", "due_date": "2026-10-19", "due_time": "07:00"}),
+    ("set a timer for 10 minutes", "client_set_timer", {"duration": "10 minutes"}),
+]
+
+# Ordinary speech that must reach the graph instead of causing a side effect
+MISSES = [
+    "call mom tomorrow about the rent",
+    "call it a day",
+    "call me back later",
+    "open the door",
+    "open a new task for groceries",
+    "play chess with me later",
+    "I spent 200 on lunch yesterday",
+    "i paid 500 for rent last month",
+    "call my friend from college who moved away",
+    # No title to play: the LLM picks something
+    "play it again",
+    "play music",
+    "play some music",
+    # Nothing to log, or more than a payee
+    "I spent 0 on food",
+    "I spent 200 on food for mom",
+    "received 500 from mom for dinner",
+    # No stop words, but too long to trust as a contact name
+    "call ravi kumar sharma junior",
+]
+
+def test_hits():
+    failures = []
+    for query, tool, args in HITS:
+        hit = match(query, NOW)
+        if not hit or hit.tool_name != tool or any(hit.args.get(k) != v for k, v in args.items()):
+            failures.append(f"{query!r}: expected {tool} {args}, got {hit and (hit.tool_name, hit.args)}")
+    assert not failures, "\n".join(failures)
+
+def test_misses():
+    failures = [f"{q!r} -> {hit.tool_name} {hit.args}" for q in MISSES if (hit := match(q, NOW))]
+    assert not failures, "\n".join(failures)
+
+if __name__ == "__main__":
+    print(f"\n⚡ FAST PATH TEST ({len(HITS)} hits, {len(MISSES)} misses)")
+    print("===========================================")
+    for query, tool, _ in HITS:
+        hit = match(query, NOW)
+        print(f"   {'✅' if hit and hit.tool_name == tool else '❌'} {query:45} -> {hit and hit.args}")
+    for query in MISSES:
+        hit = match(query, NOW)
+        print(f"   {'✅' if not hit else '❌'} {query:45} -> {hit and (hit.tool_name, hit.args)}")
+    test_hits()
+    test_misses()
@@ -0,0 +1,32 @@
+from app.chains.summarizer import trivial_reason
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+# (user query, tools the turn ran, expected skip reason or None)
+CASES = [
+    ("ok", [], "short"),
+    ("thanks a lot", [], "small_talk"),
+    ("open spotify", ["client_open_app"], "tools"),
+    ("what are my tasks", ["get_tasks"], "tools"),
+    # A fact rides along with the command: the summarizer has to see it
+    ("play something calm, I failed my exam", ["client_play_media"], None),
+    ("what's my gym code? btw I moved to Pune last week", ["search_memory"], None),
+    ("I started a new job at Acme today", [], None),
+]
+
+def test_trivial_reason():
+    failures = []
+    for query, tools, expected in CASES:
+        got = trivial_reason(query, tools)
+        if got != expected:
+            failures.append(f"{query!r}: expected {expected}, got {got}")
+    assert not failures, "\n".join(failures)
+
+if __name__ == "__main__":
+    print(f"\n🗑️ SUMMARIZER FILTER TEST ({len(CASES)} cases)")
+    print("===========================================")
+    for query, tools, expected in CASES:
+        got = trivial_reason(query, tools)
+        print(f"   {'✅' if got == expected else '❌'} {query:55} -> {got}")
+    test_trivial_reason()
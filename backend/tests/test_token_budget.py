@@ -0,0 +1,40 @@
+from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from utils.token_budget import count_tokens, message_text, truncate_to_tokens, fit_messages
+
+# ---------------------------------------------------------
+# CONFIGURATION
+# ---------------------------------------------------------
+BUDGET = 500
+PER_MESSAGE = 300
+
+def sizes(messages):
+    return [count_tokens(message_text(m)) for m in messages]
+
+def test_truncate():
+    assert truncate_to_tokens("short", 10) == "short"
+    assert truncate_to_tokens("abc def ghi", 2) == "abc def…"
+
+def test_long_answer_is_capped():
+    # A long task list from the previous turn must not blow up the next prompt
+    messages = [HumanMessage(content="show my tasks"), AIMessage(content="- task\n" * 2000), HumanMessage(content="and the second one?")]
+    fitted = fit_messages(messages, BUDGET, PER_MESSAGE)
+    assert len(fitted) == 3
+    assert max(sizes(fitted)) <= PER_MESSAGE + 1
+    assert fitted[-1].content == "and the second one?"
+
+def test_oldest_dropped_first():
+    messages = [HumanMessage(content="old " * 300), AIMessage(content="older answer " * 100), HumanMessage(content="now")]
+    fitted = fit_messages(messages, 200, PER_MESSAGE)
+    assert sum(sizes(fitted)) <= 200
+    assert fitted[-1].content == "now"
+
+def test_last_message_always_kept():
+    fitted = fit_messages([ToolMessage(content="row " * 5000, tool_call_id="1")], 100, 1000)
+    assert len(fitted) == 1 and sizes(fitted)[0] <= 101
+
+if __name__ == "__main__":
+    print("\n✂️ TOKEN BUDGET TEST")
+    print("===========================================")
+    for test in (test_truncate, test_long_answer_is_capped, test_oldest_dropped_first, test_last_message_always_kept):
+        test()
+        print(f"   ✅ {test.__name__}")
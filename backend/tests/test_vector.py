@@ -28,10 +28,11 @@ async def run_stress_test():
 
     # 1. SEED DATA
     print(f"\n[Step 1] Seeding {len(COMPLEX_DATA)} tricky memories...")
-    ids = []
-    for item in COMPLEX_DATA:
-        mid = memory_store.add(item["text"], TEST_USER_ID, item["meta"])
-        if mid: ids.append(mid)
+    ids = await memory_store.add_many(
+        [item["text"] for item in COMPLEX_DATA],
+        TEST_USER_ID,
+        [item["meta"] for item in COMPLEX_DATA]
+    )
     
     # Allow indexing time
     time.sleep(1)
@@ -74,7 +75,7 @@ async def run_stress_test():
         print(f"\n🔎 TEST: {scen['name']}")
         print(f"   Query: \"{scen['query']}\"")
         
-        results = memory_store.search(scen['query'], TEST_USER_ID, limit=1)
+        results = await memory_store.search(scen['query'], TEST_USER_ID, limit=1)
         
         if not results:
             print("   ❌ FAILED: No results found.")
@@ -97,7 +98,7 @@ async def run_stress_test():
     # 3. CLEANUP
     print(f"\n[Step 3] Cleaning up {len(ids)} memories...")
     for mid in ids:
-        memory_store.delete(mid, TEST_USER_ID)
+        await memory_store.delete(mid, TEST_USER_ID)
     print("✅ Cleanup complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,381 @@
+import re
+import calendar
+from dataclasses import dataclass, replace
+from datetime import datetime, date, time, timedelta, timezone
+from typing import List, Optional
+from zoneinfo import ZoneInfo
+
+# Deterministic natural-language date/time resolver.
+# Everything is computed relative to the user's own clock (QueryRequest.timestamp),
+# so "tomorrow 5pm" means tomorrow in *their* timezone, not the server's.
+
+DEFAULT_TZ = ZoneInfo("Asia/Kolkata")
+
+MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8,
+    "sep": 9, "sept": 9, "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11,
+    "dec": 12, "december": 12,
+}
+WEEKDAYS = {
+    "monday": 0, "tuesday": 1, "wednesday": 2, "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6,
+    "tues": 1, "thurs": 3,
+}
+NUMBERS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "couple of": 2, "few": 3,
+    "a couple of": 2, "a few": 3,
+}
+# Default clock time and hint for bare hours in parts of the day
+PARTS_OF_DAY = {
+    "morning": (time(9, 0), "am"),
+    "afternoon": (time(14, 0), "pm"),
+    "evening": (time(18, 0), "pm"),
+    "night": (time(21, 0), "night"),
+    "tonight": (time(21, 0), "night"),
+}
+PART_HINTS = ("am", "pm", "night")
+# At night, hours before this are the early morning after ("tonight at 1" is 01:00 tomorrow)
+NIGHT_ENDS = time(5, 0)
+
+_MONTH = "|".join(sorted(MONTHS, key=len, reverse=True))
+_WEEKDAY = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+_NUMBER = r"\d+(?:\.\d+)?|" + "|".join(sorted(NUMBERS, key=len, reverse=True))
+_UNIT = r"min(?:ute)?s?|hours?|hrs?|days?|weeks?|months?|years?"
+_RELATIVE_DAY = r"today|tonight|tomorrow|tmrw|tmr"
+# Words that may follow a bare hour ("at 5 tomorrow", "at 5 to call mom"); anything else is
+# probably a count ("at 3 tables", "by 2 km")
+_AFTER_HOUR = rf"o'?clock|sharp|to|and|or|for|on|in|with|so|then|if|please|this|next|{_RELATIVE_DAY}|{_WEEKDAY}|morning|afternoon|evening|night"
+# Yearless "a/b" is only a date after one of these ("on 20/10"); otherwise it's a score ("8/10")
+_DATE_PREP = r"on|by|due|before|after|until|till|from|since|dated"
+# Past tense: a time without a date means the last one, not the next one
+PAST_TENSE = re.compile(r"\b(?:did|was|were|had|ate|drank|went|spent|paid|slept|woke|met|saw|got|made|took|felt|walked|ran)\b")
+
+# JS Date.toString(): "Sun Oct 18 2026 14:30:00 GMT+0530 (India Standard Time)"
+JS_TIMESTAMP = re.compile(
+    r"^\w{3} (?P<mon>\w{3}) (?P<day>\d{1,2}) (?P<year>\d{4}) (?P<h>\d{2}):(?P<m>\d{2}):(?P<s>\d{2}) "
+    r"GMT(?P<sign>[+-])(?P<oh>\d{2}):?(?P<om>\d{2})"
+)
+
+DATE_PATTERNS = [
+    ("iso", re.compile(r"\b(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})\b")),
+    ("numeric", re.compile(rf"\b(?:(?P<prep>{_DATE_PREP}) )?(?P<a>\d{{1,2}})/(?P<b>\d{{1,2}})(?:/(?P<y>\d{{2}}|\d{{4}}))?\b")),
+    ("day_month", re.compile(rf"\b(?P<d>\d{{1,2}})(?:st|nd|rd|th)?(?: of)? (?P<mon>{_MONTH})\b(?:,? (?P<y>\d{{4}})\b)?")),
+    ("month_day", re.compile(rf"\b(?P<mon>{_MONTH}) (?P<d>\d{{1,2}})(?:st|nd|rd|th)?\b(?:,? (?P<y>\d{{4}})\b)?")),
+    ("relative_day", re.compile(r"\b(?:the )?(?P<word>day after tomorrow|day before yesterday|today|tonight|tomorrow|tmrw|tmr|yesterday)\b")),
+    ("weekday", re.compile(rf"\b(?:(?P<mod>this|next|last|coming) )?(?P<wd>{_WEEKDAY})\b")),
+    ("next_period", re.compile(r"\b(?P<mod>next|this|last) (?P<period>weekend|week|month|year)\b")),
+    ("offset", re.compile(rf"\b(?:in (?P<n1>half an|{_NUMBER}) (?P<u1>{_UNIT})|(?P<n2>{_NUMBER}) (?P<u2>{_UNIT}) (?P<dir>from now|later|ago))\b")),
+]
+TIME_PATTERNS = [
+    ("meridiem", re.compile(r"\b(?P<h>\d{1,2})(?:[:.](?P<m>[0-5]\d))?\s*(?P<ampm>a\.?m\.?|p\.?m\.?)(?=\W|$)")),
+    ("clock", re.compile(r"\b(?P<h>[01]?\d|2[0-3]):(?P<m>[0-5]\d)\b")),
+    ("named", re.compile(r"\b(?P<name>noon|midday|midnight)\b")),
+    ("part_of_day", re.compile(r"\b(?P<pre>this|in the) (?P<part>morning|afternoon|evening)\b")),
+    # "at 5", "by 9", and an hour right after a day word ("tomorrow 9")
+    ("bare_hour", re.compile(
+        rf"\b(?:(?:at|by|@)|(?P<day>{_RELATIVE_DAY}|{_WEEKDAY})) (?P<h>\d{{1,2}})\b"
+        rf"(?=\s*(?:$|[,;!?)]|\.(?!\d)|(?:{_AFTER_HOUR})\b))"
+    )),
+]
+# What may sit between a date and a time that belong to one expression ("tomorrow at 5pm")
+JOINER = re.compile(r"^\s*(?:,|at|on|by|@)?\s*$")
+PART_SUFFIX = re.compile(r"\s+(?:in the )?(?P<part>morning|afternoon|evening|night)\b")
+
+@dataclass
+class DateMatch:
+    text: str
+    start: int
+    end: int
+    date: Optional[date] = None
+    time: Optional[time] = None
+    hint: Optional[str] = None  # "am"/"pm" from a part of day, for bare hours
+
+    @property
+    def date_str(self) -> Optional[str]:
+        return self.date.strftime("%Y-%m-%d") if self.date else None
+
+    @property
+    def time_str(self) -> Optional[str]:
+        return self.time.strftime("%H:%M") if self.time else None
+
+    def __str__(self) -> str:
+        return " ".join(p for p in (self.date_str, self.time_str) if p)
+
+# --- Clock ---
+
+def parse_client_timestamp(value: Optional[str], default_tz=DEFAULT_TZ) -> datetime:
+    """
+    Turns the phone's timestamp into an aware datetime in the user's timezone.
+    Accepts JS Date.toString() and ISO 8601; anything else falls back to now in default_tz.
+    """
+    if value:
+        m = JS_TIMESTAMP.match(value.strip())
+        if m and m["mon"].lower() in MONTHS:
+            offset = timedelta(hours=int(m["oh"]), minutes=int(m["om"]))
+            tz = timezone(offset if m["sign"] == "+" else -offset)
+            try:
+                return datetime(int(m["year"]), MONTHS[m["mon"].lower()], int(m["day"]),
+                                int(m["h"]), int(m["m"]), int(m["s"]), tzinfo=tz)
+            except ValueError:
+                pass
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=default_tz)
+        except ValueError:
+            pass
+    return datetime.now(default_tz)
+
+# --- Helpers ---
+
+def _number(word: str) -> float:
+    word = word.lower()
+    if word == "half an":
+        return 0.5
+    return float(word) if word[0].isdigit() else NUMBERS[word]
+
+def _add_months(d: date, months: int) -> date:
+    month_index = d.month - 1 + months
+    year, month = d.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+def _nearest_year(month: int, day: int, today: date) -> Optional[date]:
+    # No year given: pick the occurrence closest to today ("Jan 5" in October is next January)
+    candidates = []
+    for year in (today.year - 1, today.year, today.year + 1):
+        try:
+            candidates.append(date(year, month, day))
+        except ValueError:
+            continue
+    return min(candidates, key=lambda c: abs((c - today).days)) if candidates else None
+
+def _full_year(y: Optional[str]) -> Optional[int]:
+    if not y:
+        return None
+    return int(y) + 2000 if len(y) == 2 else int(y)
+
+def _safe_date(year: int, month: int, day: int) -> Optional[date]:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+def _bare_hour(hour: int, hint: Optional[str]) -> Optional[time]:
+    if hour > 23:
+        return None
+    if hint == "night" and (hour == 12 or hour < NIGHT_ENDS.hour):
+        return time(hour % 12, 0)
+    if hint in ("pm", "night") and hour < 12:
+        return time(hour + 12, 0)
+    if hint == "am" or hour == 0 or hour >= 12:
+        return time(hour % 24, 0)
+    # No context: 1-6 is afternoon/evening ("at 5"), 7-11 is morning ("by 9")
+    return time(hour + 12 if hour <= 6 else hour, 0)
+
+# --- Pattern handlers ---
+
+def _resolve_date(kind: str, m: re.Match, now: datetime, text: str) -> Optional[DateMatch]:
+    today = now.date()
+    g = m.groupdict()
+    out = DateMatch(text=m.group(0), start=m.start(), end=m.end())
+
+    if kind == "iso":
+        out.date = _safe_date(int(g["y"]), int(g["m"]), int(g["d"]))
+    elif kind == "numeric":
+        if not g["y"] and not g["prep"]:
+            return None
+        out.start = m.start("a")
+        out.text = text[out.start:out.end]
+        a, b = int(g["a"]), int(g["b"])
+        # Day-first (en-IN); fall back to month-first only when day-first is impossible
+        day, month = (a, b) if b <= 12 else (b, a)
+        year = _full_year(g["y"])
+        out.date = _safe_date(year, month, day) if year else _nearest_year(month, day, today)
+    elif kind in ("day_month", "month_day"):
+        month, day, year = MONTHS[g["mon"]], int(g["d"]), _full_year(g["y"])
+        out.date = _safe_date(year, month, day) if year else _nearest_year(month, day, today)
+    elif kind == "relative_day":
+        word = g["word"]
+        offsets = {"today": 0, "tonight": 0, "tomorrow": 1, "tmrw": 1, "tmr": 1, "yesterday": -1,
+                   "day after tomorrow": 2, "day before yesterday": -2}
+        out.date = today + timedelta(days=offsets[word])
+        if word == "tonight":
+            out.time, out.hint = PARTS_OF_DAY["tonight"]
+    elif kind == "weekday":
+        target, mod = WEEKDAYS[g["wd"]], g["mod"]
+        ahead = (target - today.weekday()) % 7
+        if mod in ("next", "coming") and ahead == 0:
+            ahead = 7
+        elif mod == "last":
+            ahead = ahead - 7 if ahead else -7
+        out.date = today + timedelta(days=ahead)
+    elif kind == "next_period":
+        period, mod = g["period"], g["mod"]
+        step = -1 if mod == "last" else 1
+        if period == "weekend":
+            saturday = today + timedelta(days=(5 - today.weekday()) % 7)
+            out.date = saturday + timedelta(days={"next": 7, "last": -7}.get(mod, 0))
+        elif mod == "this":
+            return None
+        elif period == "week":
+            out.date = today + timedelta(days=7 * step)
+        elif period == "month":
+            out.date = _add_months(today, step)
+        else:
+            out.date = _add_months(today, 12 * step)
+    elif kind == "offset":
+        amount = _number(g["n1"] or g["n2"])
+        unit = (g["u1"] or g["u2"])[:2]
+        if g["dir"] == "ago":
+            amount = -amount
+        if unit in ("mi", "ho", "hr"):
+            minutes = amount * (60 if unit != "mi" else 1)
+            moment = now + timedelta(minutes=minutes)
+            out.date, out.time = moment.date(), moment.time().replace(second=0, microsecond=0)
+        elif unit in ("da", "we"):
+            # Through the clock, so "in 1.5 days" lands on the right day
+            out.date = (now + timedelta(days=amount * (7 if unit == "we" else 1))).date()
+        else:
+            months = amount * (12 if unit == "ye" else 1)
+            whole = int(months)
+            # "in 1.5 months": the fraction counts as days of a 30-day month
+            out.date = _add_months(today, whole) + timedelta(days=round((months - whole) * 30))
+
+    if not out.date:
+        return None
+    # "tomorrow morning", "friday evening": the part of day sets a default time and an am/pm hint
+    suffix = PART_SUFFIX.match(text, out.end) if not out.time else None
+    if suffix:
+        out.end = suffix.end()
+        out.time, out.hint = PARTS_OF_DAY[suffix["part"]]
+    return out
+
+def _resolve_time(kind: str, m: re.Match, now: datetime, text: str) -> Optional[DateMatch]:
+    g = m.groupdict()
+    out = DateMatch(text=m.group(0), start=m.start(), end=m.end())
+
+    if kind == "meridiem":
+        hour, minute = int(g["h"]), int(g["m"] or 0)
+        if not 1 <= hour <= 12:
+            return None
+        pm = g["ampm"].startswith("p")
+        out.time = time(hour % 12 + (12 if pm else 0), minute)
+    elif kind == "clock":
+        hour, minute = int(g["h"]), int(g["m"])
+        if len(g["h"]) == 1 and 1 <= hour <= 11:
+            # "at 5:30" reads like a bare hour; "05:30" and "17:30" are literal
+            hour = _bare_hour(hour, None).hour
+        out.time = time(hour, minute)
+    elif kind == "named":
+        out.time = time(0, 0) if g["name"] == "midnight" else time(12, 0)
+    elif kind == "part_of_day":
+        out.time, out.hint = PARTS_OF_DAY[g["part"]]
+        today = now.date()
+        if g["pre"] == "this":
+            # "this morning" is today's, even once it is over
+            out.date = today
+        elif PAST_TENSE.search(text):
+            # "what did i do in the evening": the most recent one
+            out.date = today if out.time <= now.time().replace(tzinfo=None) else today - timedelta(days=1)
+        # Otherwise ("remind me in the morning") it rolls forward like a bare time
+    elif kind == "bare_hour":
+        if g["day"]:
+            # Only the hour; the day word is matched (and merged back in) as a date
+            out.start = m.start("h")
+            out.text = text[out.start:out.end]
+        out.time = _bare_hour(int(g["h"]), None)
+        out.hint = "bare"
+
+    return out if out.time else None
+
+def _scan(text: str, now: datetime) -> List[DateMatch]:
+    found: List[DateMatch] = []
+    taken = [False] * len(text)
+
+    def claim(match: Optional[DateMatch]):
+        if match and not any(taken[match.start:match.end]):
+            for i in range(match.start, match.end):
+                taken[i] = True
+            found.append(match)
+
+    # Pattern order is priority: specific forms claim their span before looser ones
+    for kind, pattern in DATE_PATTERNS:
+        for m in pattern.finditer(text):
+            claim(_resolve_date(kind, m, now, text))
+    for kind, pattern in TIME_PATTERNS:
+        for m in pattern.finditer(text):
+            claim(_resolve_time(kind, m, now, text))
+    return sorted(found, key=lambda d: d.start)
+
+def _explicit_time(match: DateMatch) -> bool:
+    # Part-of-day times are only defaults; a clock time next to them wins
+    return match.time is not None and match.hint not in PART_HINTS
+
+def _mergeable(a: DateMatch, b: DateMatch) -> bool:
+    return not (a.date and b.date) and not (_explicit_time(a) and _explicit_time(b))
+
+def _merge(text: str, a: DateMatch, b: DateMatch) -> DateMatch:
+    timed = b if _explicit_time(b) else a if _explicit_time(a) else None
+    context = a if a.hint in PART_HINTS else b if b.hint in PART_HINTS else None
+    clock = timed.time if timed else (a.time or b.time)
+    if timed and timed.hint == "bare" and context:
+        clock = _bare_hour(int(re.search(r"\d+", timed.text).group()), context.hint)
+    day = a.date or b.date
+    if day and context and context.hint == "night" and clock < NIGHT_ENDS:
+        day += timedelta(days=1)
+    return DateMatch(text=text[a.start:b.end], start=a.start, end=b.end, date=day, time=clock,
+                     hint=context.hint if context else None)
+
+# --- Public API ---
+
+def find_dates(text: str, now: datetime) -> List[DateMatch]:
+    """
+    Every temporal expression in text, resolved against the user's clock `now`.
+    Adjacent date and time parts ("next friday at 9:30", "5pm tomorrow") come back as one match.
+    """
+    lowered = text.lower()
+    matches = _scan(lowered, now)
+
+    merged: List[DateMatch] = []
+    for match in matches:
+        prev = merged[-1] if merged else None
+        if prev and JOINER.match(lowered[prev.end:match.start]) and _mergeable(prev, match):
+            merged[-1] = _merge(lowered, prev, match)
+        else:
+            merged.append(match)
+
+    past = bool(PAST_TENSE.search(lowered))
+    today, current = now.date(), now.time().replace(tzinfo=None)
+    results = []
+    for match in merged:
+        if match.time and not match.date:
+            # A bare time means its next occurrence, or its last one when the query is in the past tense
+            if past:
+                day = today if match.time <= current else today - timedelta(days=1)
+            else:
+                day = today if match.time > current else today + timedelta(days=1)
+            match = replace(match, date=day)
+        if match.hint == "bare":
+            match = replace(match, hint=None)
+        results.append(replace(match, text=text[match.start:match.end]))
+    return results
+
+def resolve(text: str, now: datetime) -> Optional[DateMatch]:
+    """The first temporal expression in text, or None."""
+    matches = find_dates(text, now)
+    return matches[0] if matches else None
+
+def annotate(text: str, now: datetime) -> str:
+    """
+    Inlines resolved values after each expression so the LLMs copy them instead of doing date math:
+    "call mom tomorrow at 5pm" -> "call mom tomorrow at 5pm (2026-10-19 17:00)".
+    """
+    out, cursor = [], 0
+    for match in find_dates(text, now):
+        if re.fullmatch(r"\d{4}-\d{1,2}-\d{1,2}", match.text):
+            continue
+        out.append(text[cursor:match.end])
+        out.append(f" ({match})")
+        cursor = match.end
+    out.append(text[cursor:])
+    return "".join(out)
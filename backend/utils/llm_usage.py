@@ -0,0 +1,26 @@
+from typing import Any
+from utils.metrics import metrics
+
+# Per-call token accounting. Both Gemini and Groq report cached prompt tokens in
+# usage_metadata.input_token_details.cache_read, which is what the static prompt prefixes buy us.
+
+def record_usage(prefix: Any, message: Any) -> None:
+    """Logs prompt/cached/completion tokens of one LLM call under its prompt prefix (app.prompts)."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    if not usage:
+        metrics.incr(f"llm.{prefix.name}.no_usage")
+        return
+
+    prompt = usage.get("input_tokens", 0)
+    cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+    completion = usage.get("output_tokens", 0)
+
+    metrics.incr(f"llm.{prefix.name}.calls")
+    metrics.incr(f"llm.{prefix.name}.prompt_tokens", prompt)
+    metrics.incr(f"llm.{prefix.name}.cached_tokens", cached)
+    metrics.incr(f"llm.{prefix.name}.completion_tokens", completion)
+    total_prompt = metrics.counter(f"llm.{prefix.name}.prompt_tokens")
+    if total_prompt:
+        metrics.gauge(f"llm.{prefix.name}.cached_ratio", metrics.counter(f"llm.{prefix.name}.cached_tokens") / total_prompt)
+
+    print(f"📊 [Tokens] {prefix.tag} prompt={prompt} cached={cached} completion={completion}")
@@ -0,0 +1,65 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict, Any
+
+# Keep the last N samples per timing series (enough for stable p50/p99)
+MAX_SAMPLES = 2048
+
+class Metrics:
+    """
+    Tiny in-process counter/timing registry.
+    Exposed through GET /metrics so we can see what each optimization absorbs.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, deque] = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] += value
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value_ms: float) -> None:
+        with self._lock:
+            self._timings[name].append(value_ms)
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return len(self._timings.get(name, ()))
+
+    def counter(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def percentile(self, name: str, p: float) -> float:
+        with self._lock:
+            samples = sorted(self._timings.get(name, ()))
+        if not samples:
+            return 0.0
+        idx = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[idx]
+
+    def ratio(self, hits: str, misses: str) -> float:
+        total = self.counter(hits) + self.counter(misses)
+        return self.counter(hits) / total if total else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            names = list(self._timings.keys())
+
+        timings = {}
+        for name in names:
+            timings[name] = {
+                "count": len(self._timings[name]),
+                "p50": round(self.percentile(name, 50), 2),
+                "p99": round(self.percentile(name, 99), 2),
+            }
+        return {"counters": counters, "gauges": gauges, "timings": timings}
+
+metrics = Metrics()
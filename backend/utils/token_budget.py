@@ -0,0 +1,44 @@
+from typing import List
+from langchain_core.messages import BaseMessage
+
+# Cheap token estimates (~4 characters per token for English text).
+# Close enough to keep prompts bounded without shipping a tokenizer for each model.
+CHARS_PER_TOKEN = 4
+
+def message_text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, list):
+        # Gemini can return content parts
+        return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+    return content or ""
+
+def count_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to roughly max_tokens, on a word boundary when there is one."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(max_tokens, 0) * CHARS_PER_TOKEN]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + "…"
+
+def fit_messages(messages: List[BaseMessage], budget: int, per_message: int) -> List[BaseMessage]:
+    """
+    Caps every message at per_message tokens, then drops the oldest ones until the
+    total fits in budget. The last message (the current query or tool output) is always kept.
+    """
+    fitted = []
+    for message in messages:
+        text = message_text(message)
+        short = truncate_to_tokens(text, per_message)
+        fitted.append(message if short == text else message.model_copy(update={"content": short}))
+
+    sizes = [count_tokens(message_text(m)) for m in fitted]
+    while len(fitted) > 1 and sum(sizes) > budget:
+        fitted.pop(0)
+        sizes.pop(0)
+    if sizes and sizes[0] > budget:
+        fitted[0] = fitted[0].model_copy(update={"content": truncate_to_tokens(message_text(fitted[0]), budget)})
+    return fitted
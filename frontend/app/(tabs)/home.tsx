@@ -343,19 +343,6 @@ export default function ChatScreen() {
       };
       setMessages((prev) => [...prev, initialResponse]);
 
-      // @ts-ignore
-      const es = new EventSource(`${backendUrl}/query/query`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-        body: JSON.stringify({
-          query: queryText,
-          timestamp: new Date().toString(),
-        }),
-      });
-
       // Helper to update the last message text and state
       const updateLastMessage = (
         updater: (prevText: string) => string,
@@ -375,68 +362,154 @@ export default function ChatScreen() {
         });
       };
 
-      // @ts-ignore
-      es.addEventListener("open", () => {
-        console.log("SSE Connection Opened");
-      });
+      // Answer text streamed so far via "delta" events
+      let streamedText = "";
 
-      // @ts-ignore
-      es.addEventListener("message", (event: any) => {
-        if (!event.data) return;
+      // Opens an SSE stream; /query/continue resumes a turn paused on client actions
+      const openStream = (path: string, payload: object) => {
+        // Client actions of a paused turn, run together once "await_client" arrives
+        const pendingActions: { action: string; data: any; tool_call_id: string }[] = [];
 
-        try {
-          const data = JSON.parse(event.data);
-
-          switch (data.type) {
-            case "status":
-              // Replace previous text entirely with new status
-              updateLastMessage(() => data.content);
-              break;
-
-            case "tool_start":
-              // Replace with tool usage
-              updateLastMessage(() => `Using ${data.tool}...`);
-              break;
-
-            case "tool_end":
-              // Optional: maybe briefly show checked? Or just wait for next.
-              // Let's just keep the "Using Tool..." until response comes.
-              break;
-
-            case "response":
-              setIsTyping(false);
-              // Switch to Markdown mode and show final text ONLY
-              updateLastMessage(() => data.response, true);
-              es.close();
-              break;
-
-            case "CLIENT_ACTION":
-              setIsTyping(false);
-              es.close();
-              updateLastMessage(() => `Executing ${data.action}...`, true); // Keep as markdown for action
-
-              // Execute locally
-              IntentHandler.handleClientAction(data.action, data.data).then(
-                (res) => {
-                  // Append result to the action log
-                  updateLastMessage(
-                    (prev) => prev + "\n\n" + res.message,
-                    true,
-                  );
-                },
-              );
-              break;
+        // @ts-ignore
+        const es = new EventSource(`${backendUrl}${path}`, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+          },
+          body: JSON.stringify(payload),
+        });
+
+        // @ts-ignore
+        es.addEventListener("open", () => {
+          console.log("SSE Connection Opened");
+        });
+
+        // @ts-ignore
+        es.addEventListener("message", (event: any) => {
+          if (!event.data) return;
+
+          try {
+            const data = JSON.parse(event.data);
+
+            switch (data.type) {
+              case "status":
+                // Replace previous text entirely with new status
+                updateLastMessage(() => data.content);
+                break;
+
+              case "delta": {
+                // Render tokens as Markdown while the answer is still generating
+                streamedText += data.content;
+                const text = streamedText;
+                updateLastMessage(() => text, true);
+                break;
+              }
+
+              case "delta_reset":
+                // Streamed text turned out to be a routing step, not the answer
+                streamedText = "";
+                updateLastMessage(() => "Thinking...");
+                break;
+
+              case "tool_start":
+                // Replace with tool usage
+                updateLastMessage(() => `Using ${data.tool}...`);
+                break;
+
+              case "tool_end":
+                // Optional: maybe briefly show checked? Or just wait for next.
+                // Let's just keep the "Using Tool..." until response comes.
+                break;
+
+              case "response":
+                setIsTyping(false);
+                // Switch to Markdown mode and show final text ONLY
+                updateLastMessage(() => data.response, true);
+                es.close();
+                break;
+
+              case "CLIENT_ACTION":
+                if (data.run_id) {
+                  // The turn may pause on several actions; wait for "await_client"
+                  pendingActions.push({
+                    action: data.action,
+                    data: data.data,
+                    tool_call_id: data.tool_call_id,
+                  });
+                  updateLastMessage(() => `Executing ${data.action}...`, true);
+                  break;
+                }
+
+                setIsTyping(false);
+                es.close();
+                updateLastMessage(() => `Executing ${data.action}...`, true); // Keep as markdown for action
+
+                // Execute locally
+                IntentHandler.handleClientAction(data.action, data.data).then(
+                  (res) => {
+                    // Append result to the action log
+                    updateLastMessage(
+                      (prev) => prev + "\n\n" + res.message,
+                      true,
+                    );
+                  },
+                );
+                break;
+
+              case "await_client": {
+                setIsTyping(false);
+                es.close();
+                const runId = data.run_id;
+                const actions = pendingActions.filter((a) =>
+                  data.tool_call_ids.includes(a.tool_call_id),
+                );
+
+                // Run them one at a time, then hand all results back together
+                // so the paused turn finishes server-side
+                (async () => {
+                  const results = [];
+                  for (const a of actions) {
+                    updateLastMessage(() => `Executing ${a.action}...`, true);
+                    let res;
+                    try {
+                      res = await IntentHandler.handleClientAction(
+                        a.action,
+                        a.data,
+                      );
+                    } catch (e) {
+                      // Still report it, or the turn stays paused
+                      res = { success: false, message: `Couldn't run ${a.action}.` };
+                    }
+                    results.push({
+                      tool_call_id: a.tool_call_id,
+                      result: res.message,
+                      success: res.success,
+                    });
+                  }
+                  setIsTyping(true);
+                  streamedText = "";
+                  openStream("/query/continue", { run_id: runId, results });
+                })();
+                break;
+              }
+            }
+          } catch (e) {}
+        });
+
+        // @ts-ignore
+        es.addEventListener("error", (event: any) => {
+          setIsTyping(false);
+          if (event.type === "error" || event.message) {
+            updateLastMessage((prev) => prev + "\n❌ Connection failed.");
           }
-        } catch (e) {}
-      });
+          es.close();
+        });
+      };
 
-      // @ts-ignore
-      es.addEventListener("error", (event: any) => {
-        setIsTyping(false);
-        if (event.type === "error" || event.message) {
-          updateLastMessage((prev) => prev + "\n❌ Connection failed.");
-        }
-        es.close();
+      openStream("/query/query", {
+        query: queryText,
+        timestamp: new Date().toString(),
       });
     } catch (error) {
       setIsTyping(false);